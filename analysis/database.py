@@ -1,5 +1,18 @@
+import threading
+import time
+import weakref
+from contextlib import contextmanager
+from itertools import islice
+import sys
+import os
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
 import mysql.connector
 from mysql.connector import Error
+from mysql.connector import pooling
+from mysql.connector.errors import PoolError
+from analysis.product_cache import product_cache, split_ingredients
+from analysis.ingredient_normalizer import canonical_ingredient_name
+from analysis.minhash_index import minhash_signature, signature_to_bytes, get_product_index
 
 DB_CONFIG = {
     'host': 'localhost',
@@ -8,9 +21,126 @@ DB_CONFIG = {
     'password': ''
 }
 
+# Settings for the pooled mode of DatabaseManager
+POOL_CONFIG = {
+    'pool_name': 'skincare_pool',
+    'pool_size': 5,
+    'pool_reset_session': False,  # queries leave no session state behind; a reset costs a round trip per return
+    'checkout_timeout': 10.0,  # seconds to wait for a free connection
+    'ping_idle': 30.0,         # a kept connection is only pinged after sitting unused this long
+    'ping_attempts': 3,
+    'ping_delay': 1
+}
+
+# Rows written per executemany/commit by the bulk insert methods
+BULK_CHUNK_SIZE = 1000
+
+# Length of ingredients.name; longer names are indexed by their first INGREDIENT_NAME_LENGTH characters
+INGREDIENT_NAME_LENGTH = 255
+
+PRODUCT_FIELDS = ('barcode', 'name', 'ingredient_list', 'safety_rating')
+SIMILARITY_FIELDS = ('product_id1', 'product_id2', 'similarity_score')
+
+# Shared by product_similarity and the staging table a full rebuild is written to
+CREATE_SIMILARITY_TABLE_QUERY = """
+CREATE TABLE IF NOT EXISTS {table} (
+    id INT AUTO_INCREMENT PRIMARY KEY,
+    product_id1 INT,
+    product_id2 INT,
+    similarity_score FLOAT,
+    FOREIGN KEY (product_id1) REFERENCES products(id),
+    FOREIGN KEY (product_id2) REFERENCES products(id),
+    UNIQUE KEY uq_similarity_pair (product_id1, product_id2),
+    KEY idx_similarity_top (product_id1, similarity_score),
+    KEY idx_similarity_top_reverse (product_id2, similarity_score),
+    created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+)
+"""
+
+def _chunked(iterable, size):
+    """Yield lists of at most size items from iterable without materializing it."""
+    iterator = iter(iterable)
+    while True:
+        chunk = list(islice(iterator, size))
+        if not chunk:
+            return
+        yield chunk
+
+def _ingredient_key(name):
+    """
+    The name an ingredient is interned under: its canonical name, cut to the column length.
+    The cut is right-stripped because the column ignores trailing spaces when comparing.
+    Names without a letter or digit (stray punctuation) have no key and return ''.
+    """
+    if not name or not any(character.isalnum() for character in name):
+        return ''
+    return canonical_ingredient_name(name)[:INGREDIENT_NAME_LENGTH].rstrip()
+
+def _canonical_ingredients(ingredient_list):
+    """
+    Key and de-duplicate an ingredient_list with canonical_ingredient_name, keeping each name's
+    first position. This is the key the similarity engine and the MinHash signatures use, so
+    synonyms such as Aqua and Water are one ingredient in the index too.
+    """
+    seen = {}
+    for ingredient in split_ingredients(ingredient_list):
+        name = _ingredient_key(ingredient)
+        if name and name not in seen:
+            seen[name] = len(seen)
+    return list(seen)
+
+def _placeholders(values):
+    return ', '.join(['%s'] * len(values))
+
+def _as_row(item, fields):
+    """Accept a dict or a sequence and return a tuple ordered like fields."""
+    if isinstance(item, dict):
+        return tuple(item.get(field) for field in fields)
+    row = tuple(item)
+    if len(row) != len(fields):
+        raise ValueError(f"Expected {len(fields)} values ({', '.join(fields)}), got {len(row)}")
+    return row
+
+def _return_connection(connection):
+    """Hand a pooled connection back, ignoring errors from a connection that is already broken."""
+    try:
+        connection.close()
+    except Error:
+        pass
+
+class _ThreadConnection:
+    """
+    A pooled connection kept by one thread. It is handed back to the pool when
+    release_thread_connection is called or, failing that, when the thread exits and
+    its thread-local storage (the only reference to this holder) is dropped.
+    """
+    def __init__(self, connection):
+        self.connection = connection
+        self.last_used = time.monotonic()
+        self.release = weakref.finalize(self, _return_connection, connection)
+
 class DatabaseManager:
-    def __init__(self):
-        self.connection = self.create_connection()
+    def __init__(self, pooled=False, pool_size=None, per_thread=False, cache=product_cache):
+        """
+        Parameters:
+            pooled (bool): Borrow connections from a shared pool instead of using a single connection.
+            pool_size (int): Number of connections in the pool (defaults to POOL_CONFIG['pool_size']).
+            per_thread (bool): In pooled mode, keep one checked-out connection per thread
+                instead of checking one out for every call.
+            cache (ProductCache): Read-through cache for barcode lookups, or None to disable it.
+        """
+        self.cache = cache
+        self.pool = None
+        self.per_thread = per_thread
+        self._local = threading.local()
+        # Serializes use of the single shared connection across threads
+        self._lock = threading.RLock()
+        if pooled:
+            self.pool = self.create_pool(pool_size or POOL_CONFIG['pool_size'])
+            self.connection = None
+        else:
+            self.connection = self.create_connection()
+        self._last_used = time.monotonic()
     
     def create_connection(self):
         """Create and return a database connection."""
@@ -22,9 +152,83 @@ class DatabaseManager:
             print(f"Error: '{e}'")
             return None
 
+    def create_pool(self, pool_size):
+        """Create and return a connection pool."""
+        try:
+            pool = pooling.MySQLConnectionPool(
+                pool_name=POOL_CONFIG['pool_name'],
+                pool_size=pool_size,
+                pool_reset_session=POOL_CONFIG['pool_reset_session'],
+                **DB_CONFIG
+            )
+            print(f"Database connection pool created with {pool_size} connections")
+            return pool
+        except Error as e:
+            print(f"Error: '{e}'")
+            return None
+
+    def _checkout(self):
+        """Take a connection from the pool, waiting up to checkout_timeout for one to be released."""
+        deadline = time.monotonic() + POOL_CONFIG['checkout_timeout']
+        while True:
+            try:
+                return self.pool.get_connection()
+            except PoolError:
+                if time.monotonic() >= deadline:
+                    raise
+                time.sleep(0.05)
+
+    def _ensure_alive(self, connection, last_used):
+        """
+        Ping the connection and reconnect it if the socket has gone stale, but only once it
+        has sat unused for POOL_CONFIG['ping_idle'] seconds; a busy connection is trusted.
+        """
+        if time.monotonic() - last_used >= POOL_CONFIG['ping_idle']:
+            connection.ping(reconnect=True, attempts=POOL_CONFIG['ping_attempts'], delay=POOL_CONFIG['ping_delay'])
+        return connection
+
+    @contextmanager
+    def borrow_connection(self):
+        """
+        Provide a healthy connection for the duration of a with block.
+        In pooled mode the connection is checked out per call (and returned afterwards)
+        or kept per thread; otherwise the single shared connection is used.
+        """
+        if self.pool is None:
+            with self._lock:
+                if self.connection is None:
+                    self.connection = self.create_connection()
+                    self._last_used = time.monotonic()
+                try:
+                    yield self._ensure_alive(self.connection, self._last_used)
+                finally:
+                    self._last_used = time.monotonic()
+        elif self.per_thread:
+            holder = getattr(self._local, 'holder', None)
+            if holder is None:
+                holder = self._local.holder = _ThreadConnection(self._checkout())
+            try:
+                yield self._ensure_alive(holder.connection, holder.last_used)
+            finally:
+                holder.last_used = time.monotonic()
+        else:
+            # The pool already checks (and reconnects) a connection when handing it out
+            connection = self._checkout()
+            try:
+                yield connection
+            finally:
+                # Closing a pooled connection hands it back to the pool
+                connection.close()
+
+    def release_thread_connection(self):
+        """Return the calling thread's connection to the pool (per_thread mode)."""
+        holder = getattr(self._local, 'holder', None)
+        if holder is not None:
+            holder.release()
+            self._local.holder = None
+
     def create_table(self):
         """Create tables in the database."""
-        cursor = self.connection.cursor()
         create_product_table_query = """
         CREATE TABLE IF NOT EXISTS products (
             id INT AUTO_INCREMENT PRIMARY KEY,
@@ -35,82 +239,875 @@ class DatabaseManager:
             created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
         )
         """
-        cursor.execute(create_product_table_query)
-        create_similarity_table_query = """
-        CREATE TABLE IF NOT EXISTS product_similarity (
+        with self.borrow_connection() as connection:
+            cursor = connection.cursor()
+            cursor.execute(create_product_table_query)
+            cursor.execute(CREATE_SIMILARITY_TABLE_QUERY.format(table='product_similarity'))
+            self._migrate_similarity_pairs(cursor)
+            self._create_ingredient_tables(cursor)
+            self._create_similarity_tracking(cursor)
+            connection.commit()
+            cursor.close()
+        print("Tables created successfully")
+
+    def _table_indexes(self, cursor, table):
+        """Return the names of the indexes defined on table."""
+        cursor.execute(
+            "SELECT DISTINCT index_name FROM information_schema.statistics "
+            "WHERE table_schema = DATABASE() AND table_name = %s",
+            (table,)
+        )
+        return {row[0] for row in cursor.fetchall()}
+
+    def _migrate_similarity_pairs(self, cursor):
+        """
+        Add uq_similarity_pair to a product_similarity table created before it existed, so the
+        upserts in insert_similarities_bulk update pairs instead of appending duplicates.
+        Duplicate rows already written are removed first, keeping the newest row of each pair.
+        """
+        if 'uq_similarity_pair' in self._table_indexes(cursor, 'product_similarity'):
+            return
+        delete_duplicates_query = """
+        DELETE older FROM product_similarity older
+        JOIN product_similarity newer
+            ON newer.product_id1 = older.product_id1
+            AND newer.product_id2 = older.product_id2
+            AND newer.id > older.id
+        """
+        cursor.execute(delete_duplicates_query)
+        if cursor.rowcount:
+            print(f"Removed {cursor.rowcount} duplicate similarity rows")
+        cursor.execute("ALTER TABLE product_similarity ADD UNIQUE KEY uq_similarity_pair (product_id1, product_id2)")
+
+    def _create_ingredient_tables(self, cursor):
+        """Create the interned ingredient table, the product/ingredient inverted index and the MinHash signatures."""
+        create_ingredient_table_query = """
+        CREATE TABLE IF NOT EXISTS ingredients (
             id INT AUTO_INCREMENT PRIMARY KEY,
-            product_id1 INT,
-            product_id2 INT,
-            similarity_score FLOAT,
-            FOREIGN KEY (product_id1) REFERENCES products(id),
-            FOREIGN KEY (product_id2) REFERENCES products(id),
-            created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+            name VARCHAR(255) CHARACTER SET utf8mb4 COLLATE utf8mb4_bin NOT NULL,
+            UNIQUE KEY uq_ingredient_name (name)
         )
         """
-        cursor.execute(create_similarity_table_query)
-        self.connection.commit()
-        print("Tables created successfully")
+        create_product_ingredient_table_query = """
+        CREATE TABLE IF NOT EXISTS product_ingredients (
+            product_id INT NOT NULL,
+            ingredient_id INT NOT NULL,
+            position SMALLINT NOT NULL,
+            PRIMARY KEY (product_id, ingredient_id),
+            KEY idx_ingredient_product (ingredient_id, product_id),
+            FOREIGN KEY (product_id) REFERENCES products(id) ON DELETE CASCADE,
+            FOREIGN KEY (ingredient_id) REFERENCES ingredients(id)
+        )
+        """
+        create_minhash_table_query = """
+        CREATE TABLE IF NOT EXISTS product_minhash (
+            product_id INT PRIMARY KEY,
+            signature VARBINARY(1024) NOT NULL,
+            FOREIGN KEY (product_id) REFERENCES products(id) ON DELETE CASCADE
+        )
+        """
+        cursor.execute(create_ingredient_table_query)
+        self._migrate_ingredient_collation(cursor)
+        cursor.execute(create_product_ingredient_table_query)
+        cursor.execute(create_minhash_table_query)
+
+    def _migrate_ingredient_collation(self, cursor):
+        """
+        Switch ingredients.name to a binary collation if the table predates it. Under an
+        accent-insensitive collation 'glycérine' and 'glycerine' share one row, so the name
+        MySQL returns would not match the name that was interned. Tightening the collation
+        cannot create duplicates.
+        """
+        cursor.execute(
+            "SELECT collation_name FROM information_schema.columns "
+            "WHERE table_schema = DATABASE() AND table_name = 'ingredients' AND column_name = 'name'"
+        )
+        row = cursor.fetchone()
+        if row is not None and row[0] is not None and row[0] != 'utf8mb4_bin':
+            cursor.execute("ALTER TABLE ingredients MODIFY name VARCHAR(255) CHARACTER SET utf8mb4 COLLATE utf8mb4_bin NOT NULL")
+
+    def _create_similarity_tracking(self, cursor):
+        """
+        Create the similarity change log and add the top-k indexes to a product_similarity
+        table created before they existed.
+        """
+        create_change_table_query = """
+        CREATE TABLE IF NOT EXISTS similarity_changes (
+            id BIGINT AUTO_INCREMENT PRIMARY KEY,
+            product_id INT NOT NULL,
+            changed_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+        )
+        """
+        cursor.execute(create_change_table_query)
+        existing = self._table_indexes(cursor, 'product_similarity')
+        for name, column in (('idx_similarity_top', 'product_id1'), ('idx_similarity_top_reverse', 'product_id2')):
+            if name not in existing:
+                cursor.execute(f"ALTER TABLE product_similarity ADD INDEX {name} ({column}, similarity_score)")
+
+    def _intern_ingredients(self, cursor, names):
+        """
+        Make sure every canonical name has a row in ingredients.
+        Returns:
+            dict: A mapping of canonical name to ingredient id.
+        """
+        names = sorted(set(names))
+        ids = {}
+        for chunk in _chunked(names, BULK_CHUNK_SIZE):
+            cursor.executemany("INSERT IGNORE INTO ingredients (name) VALUES (%s)", [(name,) for name in chunk])
+            cursor.execute(f"SELECT id, name FROM ingredients WHERE name IN ({_placeholders(chunk)})", chunk)
+            ids.update((name, ingredient_id) for ingredient_id, name in cursor.fetchall())
+        missing = [name for name in names if name not in ids]
+        if missing:
+            raise ValueError(f"Ingredient names not found after interning: {missing[:5]}")
+        return ids
+
+    def _index_ingredients(self, cursor, products):
+        """
+        Rebuild product_ingredients and product_minhash rows for (product_id, ingredient_list) pairs,
+        refresh the in-memory MinHash index if one is loaded and log the products in similarity_changes.
+        The caller is responsible for committing.
+        """
+        signatures = [(product_id, minhash_signature(split_ingredients(ingredient_list))) for product_id, ingredient_list in products]
+        products = [(product_id, _canonical_ingredients(ingredient_list)) for product_id, ingredient_list in products]
+        if not products:
+            return
+        ingredient_ids = self._intern_ingredients(cursor, [name for _, names in products for name in names])
+        cursor.executemany("DELETE FROM product_ingredients WHERE product_id = %s", [(product_id,) for product_id, _ in products])
+        self._store_signatures(cursor, signatures)
+        cursor.executemany("INSERT INTO similarity_changes (product_id) VALUES (%s)", [(product_id,) for product_id, _ in products])
+        rows = [
+            (product_id, ingredient_ids[name], position)
+            for product_id, names in products
+            for position, name in enumerate(names)
+        ]
+        if rows:
+            cursor.executemany(
+                "INSERT INTO product_ingredients (product_id, ingredient_id, position) VALUES (%s, %s, %s)",
+                rows
+            )
+
+    def _store_signatures(self, cursor, signatures):
+        """Write (product_id, signature) pairs to product_minhash; a None signature removes the row."""
+        stored = [(product_id, signature_to_bytes(signature)) for product_id, signature in signatures if signature is not None]
+        removed = [(product_id,) for product_id, signature in signatures if signature is None]
+        if stored:
+            cursor.executemany("REPLACE INTO product_minhash (product_id, signature) VALUES (%s, %s)", stored)
+        if removed:
+            cursor.executemany("DELETE FROM product_minhash WHERE product_id = %s", removed)
+        index = get_product_index()
+        if index is not None:
+            for product_id, signature in signatures:
+                if signature is None:
+                    index.remove(product_id)
+                else:
+                    index.insert(product_id, signature)
+
+    def migrate_ingredient_index(self, chunk_size=None):
+        """
+        Create the ingredient tables if needed and backfill them from products.ingredient_list.
+        Safe to re-run: each product's index rows are rebuilt from its current ingredient list.
+        Indexes built before ingredients were keyed by canonical name (so 'aqua' and 'water'
+        had separate rows) are upgraded by re-running this once; ingredient rows no product
+        uses any more are then removed. Follow it with a full similarity build
+        (python analysis/similarity_matrix.py), since stored scores used the old keys.
+        Parameters:
+            chunk_size (int): Products indexed per commit (defaults to BULK_CHUNK_SIZE).
+        Returns:
+            int: The number of products indexed.
+        """
+        chunk_size = chunk_size or BULK_CHUNK_SIZE
+        select_chunk_query = """
+        SELECT id, ingredient_list FROM products
+        WHERE id > %s
+        ORDER BY id
+        LIMIT %s
+        """
+        indexed = 0
+        last_id = 0
+        with self.borrow_connection() as connection:
+            cursor = connection.cursor()
+            try:
+                self._create_ingredient_tables(cursor)
+                self._create_similarity_tracking(cursor)
+                connection.commit()
+                while True:
+                    cursor.execute(select_chunk_query, (last_id, chunk_size))
+                    products = cursor.fetchall()
+                    if not products:
+                        break
+                    self._index_ingredients(cursor, products)
+                    connection.commit()
+                    indexed += len(products)
+                    last_id = products[-1][0]
+                cursor.execute(
+                    "DELETE i FROM ingredients i LEFT JOIN product_ingredients pi ON pi.ingredient_id = i.id "
+                    "WHERE pi.ingredient_id IS NULL"
+                )
+                connection.commit()
+            finally:
+                cursor.close()
+        print(f"Ingredient index built for {indexed} products")
+        return indexed
+
+    def iter_ingredient_index(self, chunk_size=None):
+        """
+        Stream the ingredient index one chunk of products at a time.
+        Parameters:
+            chunk_size (int): Products per chunk (defaults to BULK_CHUNK_SIZE).
+        Yields:
+            list: (product_id, ingredient_id, position) rows for a chunk of products, ordered by product id.
+        """
+        chunk_size = chunk_size or BULK_CHUNK_SIZE
+        select_ids_query = "SELECT id FROM products WHERE id > %s ORDER BY id LIMIT %s"
+        select_index_query = """
+        SELECT product_id, ingredient_id, position FROM product_ingredients
+        WHERE product_id BETWEEN %s AND %s
+        ORDER BY product_id, position
+        """
+        last_id = 0
+        with self.borrow_connection() as connection:
+            cursor = connection.cursor()
+            try:
+                while True:
+                    cursor.execute(select_ids_query, (last_id, chunk_size))
+                    product_ids = [row[0] for row in cursor.fetchall()]
+                    if not product_ids:
+                        break
+                    cursor.execute(select_index_query, (product_ids[0], product_ids[-1]))
+                    yield cursor.fetchall()
+                    last_id = product_ids[-1]
+            finally:
+                cursor.close()
+
+    def get_ingredient_index_rows(self, product_ids):
+        """
+        Retrieve the ingredient index rows of some products.
+        Parameters:
+            product_ids (list): Product ids.
+        Returns:
+            list: (product_id, ingredient_id, position) rows.
+        """
+        rows = []
+        with self.borrow_connection() as connection:
+            cursor = connection.cursor()
+            try:
+                for chunk in _chunked(product_ids, BULK_CHUNK_SIZE):
+                    cursor.execute(
+                        f"SELECT product_id, ingredient_id, position FROM product_ingredients WHERE product_id IN ({_placeholders(chunk)})",
+                        chunk
+                    )
+                    rows.extend(cursor.fetchall())
+            finally:
+                cursor.close()
+        return rows
+
+    def get_product_ids_by_ingredients(self, ingredient_ids):
+        """
+        Find the products containing any of some ingredients, through the (ingredient_id, product_id) index.
+        Parameters:
+            ingredient_ids (list): Interned ingredient ids, e.g. from prefix filtering.
+        Returns:
+            list: Product ids, ascending.
+        """
+        product_ids = set()
+        with self.borrow_connection() as connection:
+            cursor = connection.cursor()
+            try:
+                for chunk in _chunked(ingredient_ids, BULK_CHUNK_SIZE):
+                    cursor.execute(
+                        f"SELECT DISTINCT product_id FROM product_ingredients WHERE ingredient_id IN ({_placeholders(chunk)})",
+                        chunk
+                    )
+                    product_ids.update(row[0] for row in cursor.fetchall())
+            finally:
+                cursor.close()
+        return sorted(product_ids)
+
+    def get_ingredient_frequencies(self, ingredient_ids):
+        """
+        Count the indexed products containing each ingredient.
+        Returns:
+            tuple: ({ingredient_id: product count}, number of indexed products).
+        """
+        frequencies = {}
+        with self.borrow_connection() as connection:
+            cursor = connection.cursor()
+            try:
+                for chunk in _chunked(ingredient_ids, BULK_CHUNK_SIZE):
+                    cursor.execute(
+                        f"SELECT ingredient_id, COUNT(*) FROM product_ingredients WHERE ingredient_id IN ({_placeholders(chunk)}) GROUP BY ingredient_id",
+                        chunk
+                    )
+                    frequencies.update(cursor.fetchall())
+                cursor.execute("SELECT COUNT(DISTINCT product_id) FROM product_ingredients")
+                total = cursor.fetchone()[0]
+            finally:
+                cursor.close()
+        return frequencies, total
+
+    def iter_products(self, chunk_size=None):
+        """
+        Stream every product in id order without loading the catalog at once.
+        Parameters:
+            chunk_size (int): Products per chunk (defaults to BULK_CHUNK_SIZE).
+        Yields:
+            list: Product rows as dictionaries.
+        """
+        chunk_size = chunk_size or BULK_CHUNK_SIZE
+        select_chunk_query = """
+        SELECT * FROM products
+        WHERE id > %s
+        ORDER BY id
+        LIMIT %s
+        """
+        last_id = 0
+        with self.borrow_connection() as connection:
+            cursor = connection.cursor(dictionary=True)
+            try:
+                while True:
+                    cursor.execute(select_chunk_query, (last_id, chunk_size))
+                    products = cursor.fetchall()
+                    if not products:
+                        break
+                    yield products
+                    last_id = products[-1]['id']
+            finally:
+                cursor.close()
+
+    def iter_minhash_signatures(self, chunk_size=None):
+        """
+        Stream stored MinHash signatures.
+        Parameters:
+            chunk_size (int): Rows per chunk (defaults to BULK_CHUNK_SIZE).
+        Yields:
+            list: (product_id, signature bytes) rows, ordered by product id.
+        """
+        chunk_size = chunk_size or BULK_CHUNK_SIZE
+        select_chunk_query = """
+        SELECT product_id, signature FROM product_minhash
+        WHERE product_id > %s
+        ORDER BY product_id
+        LIMIT %s
+        """
+        last_id = 0
+        with self.borrow_connection() as connection:
+            cursor = connection.cursor()
+            try:
+                while True:
+                    cursor.execute(select_chunk_query, (last_id, chunk_size))
+                    rows = cursor.fetchall()
+                    if not rows:
+                        break
+                    yield rows
+                    last_id = rows[-1][0]
+            finally:
+                cursor.close()
+
+    def get_products_by_ids(self, product_ids):
+        """
+        Retrieve products by id.
+        Parameters:
+            product_ids (list): Product ids.
+        Returns:
+            list: Product rows as dictionaries (ids that do not exist are skipped).
+        """
+        products = []
+        with self.borrow_connection() as connection:
+            cursor = connection.cursor(dictionary=True)
+            try:
+                for chunk in _chunked(product_ids, BULK_CHUNK_SIZE):
+                    cursor.execute(f"SELECT * FROM products WHERE id IN ({_placeholders(chunk)})", chunk)
+                    products.extend(cursor.fetchall())
+            finally:
+                cursor.close()
+        return products
+
+    def find_products_by_ingredients(self, any_of=None, all_of=None, none_of=None, limit=None):
+        """
+        Find products through the ingredient index.
+        Parameters:
+            any_of (list): Products must contain at least one of these ingredients.
+            all_of (list): Products must contain every one of these ingredients.
+            none_of (list): Products must contain none of these ingredients.
+            limit (int): Maximum number of products to return.
+        Returns:
+            list: Matching product rows as dictionaries, ordered by id; empty if no filter
+            holds a usable ingredient name.
+        """
+        any_of, all_of, none_of = (
+            sorted({_ingredient_key(name) for name in names or []} - {''})
+            for names in (any_of, all_of, none_of)
+        )
+        if not (any_of or all_of or none_of):
+            return []  # no usable filter; never fall through to the whole catalog
+        product_ids_query = """
+        SELECT pi.product_id FROM product_ingredients pi
+        JOIN ingredients i ON i.id = pi.ingredient_id
+        WHERE i.name IN ({})
+        """
+        conditions = []
+        params = []
+        if any_of:
+            conditions.append(f"p.id IN ({product_ids_query.format(_placeholders(any_of))})")
+            params.extend(any_of)
+        if all_of:
+            conditions.append(
+                f"p.id IN ({product_ids_query.format(_placeholders(all_of))}"
+                " GROUP BY pi.product_id HAVING COUNT(*) = %s)"
+            )
+            params.extend(all_of)
+            params.append(len(all_of))
+        if none_of:
+            conditions.append(f"p.id NOT IN ({product_ids_query.format(_placeholders(none_of))})")
+            params.extend(none_of)
+        query = "SELECT p.* FROM products p"
+        if conditions:
+            query += " WHERE " + " AND ".join(conditions)
+        query += " ORDER BY p.id"
+        if limit:
+            query += " LIMIT %s"
+            params.append(limit)
+        with self.borrow_connection() as connection:
+            cursor = connection.cursor(dictionary=True)
+            try:
+                cursor.execute(query, params)
+                return cursor.fetchall()
+            finally:
+                cursor.close()
 
     def insert_product(self, barcode, name, ingredient_list, safety_rating):
         """Insert a new product into the database."""
-        cursor = self.connection.cursor()
         insert_product_query = """
         INSERT INTO products (barcode, name, ingredient_list, safety_rating)
         VALUES (%s, %s, %s, %s)
         """
-        try:
-            cursor.execute(insert_product_query, (barcode, name, ingredient_list, safety_rating))
-            self.connection.commit()
-            print("Product inserted successfully")
-        except Error as e:
-            print(f"Error: '{e}'")
+        with self.borrow_connection() as connection:
+            cursor = connection.cursor()
+            try:
+                cursor.execute(insert_product_query, (barcode, name, ingredient_list, safety_rating))
+                self._index_ingredients(cursor, [(cursor.lastrowid, ingredient_list)])
+                connection.commit()
+                self._invalidate(barcode)
+                print("Product inserted successfully")
+            except Error as e:
+                # The product row and its index rows are written together or not at all
+                connection.rollback()
+                print(f"Error: '{e}'")
+            except Exception:
+                connection.rollback()
+                raise
+            finally:
+                cursor.close()
+
+    def _invalidate(self, barcode):
+        if self.cache is not None:
+            self.cache.invalidate(barcode)
 
     def get_product_by_barcode(self, barcode):
-        """Retrieve a product by barcode."""
-        cursor = self.connection.cursor(dictionary=True)
+        """Retrieve a product by barcode, serving repeated lookups from the product cache."""
+        if self.cache is not None:
+            cached = self.cache.get(barcode)
+            if cached is not None:
+                return cached
         select_product_query = """
         SELECT * FROM products WHERE barcode = %s
         """
-        cursor.execute(select_product_query, (barcode,))
-        result = cursor.fetchone()
+        with self.borrow_connection() as connection:
+            cursor = connection.cursor(dictionary=True)
+            try:
+                cursor.execute(select_product_query, (barcode,))
+                result = cursor.fetchone()
+            finally:
+                cursor.close()
+        if result is not None and self.cache is not None:
+            self.cache.put(barcode, result)
         return result
 
+    def get_ingredients_by_barcode(self, barcode):
+        """
+        Retrieve the split ingredient list of a product by barcode.
+        Parameters:
+            barcode (str): The barcode of the product.
+        Returns:
+            list: The ingredient names, or an empty list if the product does not exist.
+        """
+        if self.cache is not None:
+            ingredients = self.cache.get_ingredients(barcode)
+            if ingredients is not None:
+                return ingredients
+        product = self.get_product_by_barcode(barcode)
+        return split_ingredients(product.get('ingredient_list')) if product else []
+
     def insert_similarity(self, product_id1, product_id2, similarity_score):
         """Insert a similarity record into the database."""
-        cursor = self.connection.cursor()
         insert_similarity_query = """
         INSERT INTO product_similarity (product_id1, product_id2, similarity_score)
         VALUES (%s, %s, %s)
         """
-        try:
-            cursor.execute(insert_similarity_query, (product_id1, product_id2, similarity_score))
-            self.connection.commit()
-            print("Similarity record inserted successfully")
-        except Error as e:
-            print(f"Error: '{e}'")
+        with self.borrow_connection() as connection:
+            cursor = connection.cursor()
+            try:
+                cursor.execute(insert_similarity_query, (product_id1, product_id2, similarity_score))
+                connection.commit()
+                print("Similarity record inserted successfully")
+            except Error as e:
+                print(f"Error: '{e}'")
+            finally:
+                cursor.close()
+
+    def _bulk_write(self, query, items, fields, chunk_size, after_chunk=None):
+        """
+        Stream items into query in chunks with executemany and one commit per chunk.
+        If a chunk fails it is rolled back and replayed row by row so that only the
+        offending rows are reported. after_chunk(cursor, rows), if given, runs on the
+        rows written in each chunk before it is committed.
+        Returns:
+            dict: {'written': int, 'errors': [{'index': int, 'row': tuple, 'error': str}]}
+        """
+        report = {'written': 0, 'errors': []}
+        offset = 0
+        with self.borrow_connection() as connection:
+            cursor = connection.cursor()
+            try:
+                for chunk in _chunked(items, chunk_size or BULK_CHUNK_SIZE):
+                    rows = []
+                    for index, item in enumerate(chunk, start=offset):
+                        try:
+                            rows.append((index, _as_row(item, fields)))
+                        except (TypeError, ValueError) as e:
+                            report['errors'].append({'index': index, 'row': item, 'error': str(e)})
+                    offset += len(chunk)
+                    if not rows:
+                        continue
+                    try:
+                        cursor.executemany(query, [row for _, row in rows])
+                        if after_chunk:
+                            after_chunk(cursor, [row for _, row in rows])
+                        connection.commit()
+                        report['written'] += len(rows)
+                    except Error:
+                        connection.rollback()
+                        written = []
+                        for index, row in rows:
+                            try:
+                                cursor.execute(query, row)
+                                written.append(row)
+                            except Error as e:
+                                report['errors'].append({'index': index, 'row': row, 'error': str(e)})
+                        if after_chunk and written:
+                            after_chunk(cursor, written)
+                        connection.commit()
+                        report['written'] += len(written)
+            except Exception:
+                # Never leave a half-written chunk for the next commit on this connection
+                connection.rollback()
+                raise
+            finally:
+                cursor.close()
+        return report
+
+    def insert_products_bulk(self, products, chunk_size=None):
+        """
+        Insert or update many products, upserting on barcode.
+        Parameters:
+            products (iterable): Dicts or (barcode, name, ingredient_list, safety_rating) tuples.
+            chunk_size (int): Rows per executemany/commit (defaults to BULK_CHUNK_SIZE).
+        Returns:
+            dict: The number of rows written and a per-row error report.
+        """
+        upsert_product_query = """
+        INSERT INTO products (barcode, name, ingredient_list, safety_rating)
+        VALUES (%s, %s, %s, %s)
+        ON DUPLICATE KEY UPDATE
+            name = VALUES(name),
+            ingredient_list = VALUES(ingredient_list),
+            safety_rating = VALUES(safety_rating)
+        """
+        report = self._bulk_write(upsert_product_query, products, PRODUCT_FIELDS, chunk_size, self._index_bulk_products)
+        if self.cache is not None:
+            # Upserted rows may already be cached; drop everything rather than track each barcode
+            self.cache.clear()
+        return report
+
+    def _index_bulk_products(self, cursor, rows):
+        """Refresh the ingredient index for a chunk of upserted (barcode, name, ingredient_list, safety_rating) rows."""
+        ingredient_lists = {row[0]: row[2] for row in rows}
+        barcodes = list(ingredient_lists)
+        cursor.execute(f"SELECT id, barcode FROM products WHERE barcode IN ({_placeholders(barcodes)})", barcodes)
+        self._index_ingredients(cursor, [(product_id, ingredient_lists[barcode]) for product_id, barcode in cursor.fetchall()])
+
+    def insert_similarities_bulk(self, similarities, chunk_size=None):
+        """
+        Insert or update many similarity records, upserting on the (product_id1, product_id2) pair.
+        Parameters:
+            similarities (iterable): Dicts or (product_id1, product_id2, similarity_score) tuples.
+            chunk_size (int): Rows per executemany/commit (defaults to BULK_CHUNK_SIZE).
+        Returns:
+            dict: The number of rows written and a per-row error report.
+        """
+        upsert_similarity_query = """
+        INSERT INTO product_similarity (product_id1, product_id2, similarity_score)
+        VALUES (%s, %s, %s)
+        ON DUPLICATE KEY UPDATE
+            similarity_score = VALUES(similarity_score)
+        """
+        return self._bulk_write(upsert_similarity_query, similarities, SIMILARITY_FIELDS, chunk_size)
+
+    def replace_similarity_table(self, similarities, chunk_size=None):
+        """
+        Replace the whole product_similarity table: rows are written to a staging table that is
+        then swapped in with one atomic RENAME TABLE, so pairs from earlier builds that no longer
+        qualify disappear and readers never see a half-built table.
+        Parameters:
+            similarities (iterable): Dicts or (product_id1, product_id2, similarity_score) tuples.
+            chunk_size (int): Rows per executemany/commit (defaults to BULK_CHUNK_SIZE).
+        Returns:
+            dict: The number of rows written and a per-row error report.
+        """
+        upsert_staging_query = """
+        INSERT INTO product_similarity_staging (product_id1, product_id2, similarity_score)
+        VALUES (%s, %s, %s)
+        ON DUPLICATE KEY UPDATE
+            similarity_score = VALUES(similarity_score)
+        """
+        with self.borrow_connection() as connection:
+            cursor = connection.cursor()
+            try:
+                # Left over from an interrupted build
+                cursor.execute("DROP TABLE IF EXISTS product_similarity_staging")
+                cursor.execute(CREATE_SIMILARITY_TABLE_QUERY.format(table='product_similarity_staging'))
+            finally:
+                cursor.close()
+        report = self._bulk_write(upsert_staging_query, similarities, SIMILARITY_FIELDS, chunk_size)
+        with self.borrow_connection() as connection:
+            cursor = connection.cursor()
+            try:
+                cursor.execute("DROP TABLE IF EXISTS product_similarity_old")
+                cursor.execute(
+                    "RENAME TABLE product_similarity TO product_similarity_old, "
+                    "product_similarity_staging TO product_similarity"
+                )
+                cursor.execute("DROP TABLE product_similarity_old")
+            finally:
+                cursor.close()
+        return report
+
+    def similarity_change_mark(self):
+        """Return the newest similarity change id, or None if the log is empty."""
+        with self.borrow_connection() as connection:
+            cursor = connection.cursor()
+            try:
+                cursor.execute("SELECT MAX(id) FROM similarity_changes")
+                return cursor.fetchone()[0]
+            finally:
+                cursor.close()
+
+    def get_similarity_changes(self):
+        """
+        Read the similarity change log.
+        Returns:
+            tuple: (mark, product_ids) where mark is the newest change id (None if the log is empty)
+            and product_ids are the distinct products changed up to it. Pass mark to
+            clear_similarity_changes once they have been processed.
+        """
+        with self.borrow_connection() as connection:
+            cursor = connection.cursor()
+            try:
+                cursor.execute("SELECT MAX(id) FROM similarity_changes")
+                mark = cursor.fetchone()[0]
+                if mark is None:
+                    return None, []
+                cursor.execute("SELECT DISTINCT product_id FROM similarity_changes WHERE id <= %s ORDER BY product_id", (mark,))
+                return mark, [row[0] for row in cursor.fetchall()]
+            finally:
+                cursor.close()
+
+    def clear_similarity_changes(self, mark):
+        """Delete change log entries up to mark; changes logged after it are kept."""
+        with self.borrow_connection() as connection:
+            cursor = connection.cursor()
+            try:
+                cursor.execute("DELETE FROM similarity_changes WHERE id <= %s", (mark,))
+                connection.commit()
+            finally:
+                cursor.close()
+
+    def replace_similarities(self, product_ids, similarities):
+        """
+        Replace every similarity row involving product_ids with freshly scored pairs, in one transaction.
+        Parameters:
+            product_ids (list): Products whose stored pairs are stale.
+            similarities (iterable): (product_id1, product_id2, similarity_score) tuples.
+        Returns:
+            int: The number of pairs written.
+        """
+        upsert_similarity_query = """
+        INSERT INTO product_similarity (product_id1, product_id2, similarity_score)
+        VALUES (%s, %s, %s)
+        ON DUPLICATE KEY UPDATE
+            similarity_score = VALUES(similarity_score)
+        """
+        written = 0
+        with self.borrow_connection() as connection:
+            cursor = connection.cursor()
+            try:
+                for chunk in _chunked(product_ids, BULK_CHUNK_SIZE):
+                    placeholders = _placeholders(chunk)
+                    cursor.execute(
+                        f"DELETE FROM product_similarity WHERE product_id1 IN ({placeholders}) OR product_id2 IN ({placeholders})",
+                        chunk + chunk
+                    )
+                for chunk in _chunked(similarities, BULK_CHUNK_SIZE):
+                    cursor.executemany(upsert_similarity_query, [_as_row(item, SIMILARITY_FIELDS) for item in chunk])
+                    written += len(chunk)
+                connection.commit()
+            except Error:
+                connection.rollback()
+                raise
+            finally:
+                cursor.close()
+        return written
+
+    def _stored_neighbours(self, product_ids):
+        """
+        Read every stored pair of some products, one query per chunk of products.
+        Returns:
+            list: (product_id, neighbour_id, similarity_score) rows; a pair between two of the
+            products appears once for each.
+        """
+        select_pairs_query = """
+        SELECT product_id1, product_id2, similarity_score FROM product_similarity WHERE product_id1 IN ({0})
+        UNION ALL
+        SELECT product_id2, product_id1, similarity_score FROM product_similarity WHERE product_id2 IN ({0})
+        """
+        neighbours = []
+        with self.borrow_connection() as connection:
+            cursor = connection.cursor()
+            try:
+                for chunk in _chunked(product_ids, BULK_CHUNK_SIZE):
+                    cursor.execute(select_pairs_query.format(_placeholders(chunk)), chunk + chunk)
+                    neighbours.extend(cursor.fetchall())
+            finally:
+                cursor.close()
+        return neighbours
+
+    def get_similarity_partners(self, product_ids):
+        """
+        Find the products holding a stored pair with any of product_ids.
+        Returns:
+            list: Partner product ids, ascending (may include members of product_ids).
+        """
+        return sorted({neighbour_id for _, neighbour_id, _ in self._stored_neighbours(product_ids)})
+
+    def get_neighbour_cutoffs(self, product_ids, k):
+        """
+        Find the k-th best stored neighbour of each product, ranked by score and then by the
+        lower neighbour id, the order the similarity build uses. A pair enters a product's
+        top k if it ranks at or above this neighbour.
+        Parameters:
+            product_ids (list): Products whose neighbour lists are checked.
+            k (int): Neighbours kept per product.
+        Returns:
+            dict: {product_id: (similarity_score, neighbour_id)}; products with fewer than k
+            stored neighbours are left out, since any pair enters their list.
+        """
+        neighbours = {}
+        for product_id, neighbour_id, score in self._stored_neighbours(product_ids):
+            neighbours.setdefault(product_id, []).append((-score, neighbour_id))
+        cutoffs = {}
+        for product_id, ranked in neighbours.items():
+            if len(ranked) >= k:
+                score, neighbour_id = sorted(ranked)[k - 1]
+                cutoffs[product_id] = (-score, neighbour_id)
+        return cutoffs
+
+    def get_similar_product_ids(self, product_id, limit=10):
+        """
+        Retrieve the stored neighbours of a product. Pairs are stored once with product_id1 < product_id2,
+        so this is two backward range reads on (product_id1, similarity_score) and
+        (product_id2, similarity_score), each stopping after limit rows.
+        Returns:
+            list: (product_id, similarity_score) tuples, best first.
+        """
+        select_neighbours_query = """
+        (SELECT product_id2, similarity_score FROM product_similarity
+         WHERE product_id1 = %s ORDER BY similarity_score DESC LIMIT %s)
+        UNION ALL
+        (SELECT product_id1, similarity_score FROM product_similarity
+         WHERE product_id2 = %s ORDER BY similarity_score DESC LIMIT %s)
+        ORDER BY similarity_score DESC
+        LIMIT %s
+        """
+        with self.borrow_connection() as connection:
+            cursor = connection.cursor()
+            try:
+                cursor.execute(select_neighbours_query, (product_id, limit, product_id, limit, limit))
+                return cursor.fetchall()
+            finally:
+                cursor.close()
 
     def update_product_safety_rating(self, barcode, safety_rating):
         """Update the safety rating of a product in the database."""
-        cursor = self.connection.cursor()
         update_query = """
         UPDATE products
         SET safety_rating = %s
         WHERE barcode = %s
         """
-        try:
-            cursor.execute(update_query, (safety_rating, barcode))
-            self.connection.commit()
-            print(f"Safety rating for product with barcode '{barcode}' updated to '{safety_rating}'")
-        except Error as e:
-            print(f"Error: '{e}'")
+        with self.borrow_connection() as connection:
+            cursor = connection.cursor()
+            try:
+                cursor.execute(update_query, (safety_rating, barcode))
+                connection.commit()
+                self._invalidate(barcode)
+                print(f"Safety rating for product with barcode '{barcode}' updated to '{safety_rating}'")
+            except Error as e:
+                print(f"Error: '{e}'")
+            finally:
+                cursor.close()
+
+    def update_safety_ratings_bulk(self, ratings, chunk_size=None):
+        """
+        Update the safety rating of many products in a single transaction.
+        Parameters:
+            ratings (iterable): (barcode, safety_rating) pairs.
+            chunk_size (int): Rows per executemany (defaults to BULK_CHUNK_SIZE).
+        Returns:
+            int: The number of ratings written.
+        """
+        update_query = """
+        UPDATE products
+        SET safety_rating = %s
+        WHERE barcode = %s
+        """
+        barcodes = []
+        with self.borrow_connection() as connection:
+            cursor = connection.cursor()
+            try:
+                for chunk in _chunked(ratings, chunk_size or BULK_CHUNK_SIZE):
+                    cursor.executemany(update_query, [(safety_rating, barcode) for barcode, safety_rating in chunk])
+                    barcodes.extend(barcode for barcode, _ in chunk)
+                connection.commit()
+            except Error as e:
+                connection.rollback()
+                print(f"Error: '{e}'")
+                return 0
+            finally:
+                cursor.close()
+        for barcode in barcodes:
+            self._invalidate(barcode)
+        return len(barcodes)
 
     def close_connection(self):
-        """Close the database connection."""
-        if self.connection.is_connected():
+        """Close the database connection (or release this thread's pooled connection)."""
+        if self.pool is not None:
+            self.release_thread_connection()
+            print("Pooled database connection released")
+        elif self.connection is not None and self.connection.is_connected():
             self.connection.close()
             print("Database connection closed")
 
 if __name__ == "__main__":
     db_manager = DatabaseManager()
     db_manager.create_table()
+    db_manager.migrate_ingredient_index()
     # Further operations can be called on db_manager
@@ -0,0 +1,246 @@
+import hashlib
+import json
+import os
+import threading
+import numpy as np
+
+EMBEDDING_STORE_CONFIG = {
+    'path': os.path.join(os.path.expanduser('~'), '.skincare', 'embeddings'),
+    'ingredient_path': os.path.join(os.path.expanduser('~'), '.skincare', 'ingredient_embeddings'),
+    'grow_by': 1024,         # rows added to the matrix file whenever it fills up
+    'log_compact_ratio': 1.0  # fold index.log into index.json once it holds this many entries per stored row
+}
+
+def text_hash(text):
+    """Short content hash of an embedded text, used to detect changed ingredient lists."""
+    return hashlib.blake2b(text.encode('utf-8'), digest_size=8).hexdigest()
+
+class EmbeddingStore:
+    """
+    Persistent product embeddings: a float32 matrix in a memory-mapped file plus an index of
+    barcode -> (row, text hash, generation). A product is only re-embedded when its text hash
+    changes, and reads are slices of the mapped file. Every put_many call bumps the store's
+    generation and stamps the rows it wrote, so derived structures (e.g. an ANN index) can find
+    rows overwritten in place since they were built. The index is a JSON snapshot (index.json) plus an
+    append-only log of later entries (index.log), so a write costs time proportional to the
+    rows written; the log is folded into the snapshot on close or once it grows past the
+    number of stored rows.
+    """
+    def __init__(self, path=None, dim=None):
+        """
+        Parameters:
+            path (str): Directory holding vectors.f32 and index.json (defaults to EMBEDDING_STORE_CONFIG['path']).
+            dim (int): Embedding size; taken from the first stored vector (or the existing index) if omitted.
+        """
+        self.path = path or EMBEDDING_STORE_CONFIG['path']
+        os.makedirs(self.path, exist_ok=True)
+        self._vectors_path = os.path.join(self.path, 'vectors.f32')
+        self._index_path = os.path.join(self.path, 'index.json')
+        self._log_path = os.path.join(self.path, 'index.log')
+        self._lock = threading.RLock()
+        self._rows = {}
+        self._barcodes = []
+        self.dim = dim
+        self.capacity = 0
+        self.generation = 0
+        self._vectors = None
+        self._generations = np.zeros(0, dtype=np.int64)
+        self._dirty = False
+        self._logged = 0
+        if os.path.exists(self._index_path):
+            with open(self._index_path, 'r', encoding='utf-8') as file:
+                index = json.load(file)
+            if dim is not None and index['dim'] != dim:
+                raise ValueError(f"{self.path} holds {index['dim']}-dimensional embeddings, not {dim}")
+            self.dim = index['dim']
+            # Indexes written before generations were tracked count as generation 0
+            self._rows = {barcode: (*entry[:2], entry[2] if len(entry) > 2 else 0) for barcode, entry in index['rows'].items()}
+            self._replay_log()
+            self._barcodes = [None] * len(self._rows)
+            self._open(max(len(self._rows), 1))
+            for barcode, (row, _, generation) in self._rows.items():
+                self._barcodes[row] = barcode
+                self._generations[row] = generation
+            self.generation = int(self._generations.max(initial=0))
+
+    def _replay_log(self):
+        """Apply the index entries appended since the last snapshot."""
+        if not os.path.exists(self._log_path):
+            return
+        with open(self._log_path, 'r', encoding='utf-8') as file:
+            for line in file:
+                try:
+                    barcode, row, digest, generation = json.loads(line)
+                except ValueError:
+                    break  # a write cut short by a crash; its vector was never acknowledged
+                self._rows[barcode] = (row, digest, generation)
+                self._logged += 1
+
+    def _open(self, rows):
+        """Map the vector file, growing it to hold at least rows rows."""
+        capacity = self.capacity
+        if os.path.exists(self._vectors_path):
+            capacity = os.path.getsize(self._vectors_path) // (self.dim * 4)
+        if capacity < rows:
+            capacity = max(rows, capacity + EMBEDDING_STORE_CONFIG['grow_by'])
+            self._vectors = None
+            with open(self._vectors_path, 'ab') as file:
+                file.truncate(capacity * self.dim * 4)
+        if self._vectors is None or capacity != self.capacity:
+            self._vectors = np.memmap(self._vectors_path, dtype=np.float32, mode='r+', shape=(capacity, self.dim))
+            self.capacity = capacity
+        if len(self._generations) < capacity:
+            self._generations = np.concatenate([self._generations, np.zeros(capacity - len(self._generations), dtype=np.int64)])
+
+    def __len__(self):
+        return len(self._barcodes)
+
+    def __contains__(self, barcode):
+        return barcode in self._rows
+
+    def get(self, barcode, text=None):
+        """
+        Return the stored embedding for barcode, or None if it is missing or was computed
+        from a different text (when text is given).
+        """
+        with self._lock:
+            entry = self._rows.get(barcode)
+            if entry is None or (text is not None and entry[1] != text_hash(text)):
+                return None
+            return np.array(self._vectors[entry[0]])
+
+    def put(self, barcode, text, vector):
+        """Store (or overwrite) the embedding of barcode computed from text."""
+        self.put_many([(barcode, text, vector)])
+
+    def put_many(self, items):
+        """
+        Store many embeddings and persist them, appending only the new index entries.
+        Parameters:
+            items (iterable): (barcode, text, vector) tuples.
+        """
+        with self._lock:
+            entries = []
+            generation = self.generation + 1
+            for barcode, text, vector in items:
+                vector = np.asarray(vector, dtype=np.float32).ravel()
+                if self.dim is None:
+                    self.dim = len(vector)
+                if len(vector) != self.dim:
+                    raise ValueError(f"Expected a {self.dim}-dimensional embedding, got {len(vector)}")
+                entry = self._rows.get(barcode)
+                row = entry[0] if entry else len(self._barcodes)
+                if not entry:
+                    self._open(row + 1)
+                    self._barcodes.append(barcode)
+                self._vectors[row] = vector
+                self._rows[barcode] = (row, text_hash(text), generation)
+                self._generations[row] = generation
+                entries.append((barcode, *self._rows[barcode]))
+            if not entries:
+                return
+            self.generation = generation
+            self._vectors.flush()
+            if not os.path.exists(self._index_path):
+                self._dirty = True
+                self.flush()  # the first snapshot records the dimension
+                return
+            # Vectors are on disk before the index entries that point at them
+            with open(self._log_path, 'a', encoding='utf-8') as file:
+                file.writelines(json.dumps(entry) + '\n' for entry in entries)
+            self._logged += len(entries)
+            if self._logged > EMBEDDING_STORE_CONFIG['log_compact_ratio'] * len(self._barcodes):
+                self._dirty = True
+                self.flush()
+
+    def stale(self, items):
+        """
+        Filter (barcode, text) pairs down to those without an up-to-date embedding.
+        Returns:
+            list: The (barcode, text) pairs that need embedding.
+        """
+        with self._lock:
+            return [
+                (barcode, text) for barcode, text in items
+                if self._rows.get(barcode, (None, None))[1] != text_hash(text)
+            ]
+
+    def rows_written_since(self, generation):
+        """
+        Return the rows (new or overwritten in place) written after generation.
+        Parameters:
+            generation (int): A value previously read from self.generation.
+        Returns:
+            numpy.ndarray: Row numbers, ascending.
+        """
+        with self._lock:
+            return np.flatnonzero(self._generations[:len(self._barcodes)] > generation)
+
+    def matrix(self):
+        """
+        Return (barcodes, vectors) for every stored product; vectors is a read-only view
+        of the mapped file, so no embeddings are copied.
+        """
+        with self._lock:
+            if self._vectors is None:
+                return [], np.empty((0, self.dim or 0), dtype=np.float32)
+            vectors = self._vectors[:len(self._barcodes)].view(np.ndarray)
+            vectors.flags.writeable = False
+            return list(self._barcodes), vectors
+
+    def flush(self):
+        """Write pending vectors and fold the index log into a fresh index.json snapshot."""
+        with self._lock:
+            if not self._dirty and not self._logged:
+                return
+            self._vectors.flush()
+            temporary_path = self._index_path + '.tmp'
+            with open(temporary_path, 'w', encoding='utf-8') as file:
+                json.dump({'dim': self.dim, 'rows': self._rows}, file)
+            os.replace(temporary_path, self._index_path)
+            if os.path.exists(self._log_path):
+                os.remove(self._log_path)
+            self._dirty = False
+            self._logged = 0
+
+    def close(self):
+        with self._lock:
+            if self._vectors is not None:
+                self.flush()
+            self._vectors = None
+
+_shared_stores = {}
+_shared_store_lock = threading.Lock()
+
+def _shared(kind, namespace):
+    with _shared_store_lock:
+        store = _shared_stores.get((kind, namespace))
+        if store is None:
+            path = EMBEDDING_STORE_CONFIG[kind]
+            if namespace is not None:
+                path = os.path.join(path, namespace)
+            store = _shared_stores[(kind, namespace)] = EmbeddingStore(path)
+        return store
+
+def get_embedding_store(namespace=None):
+    """
+    Return the process-wide product EmbeddingStore, opening it on first use.
+    Parameters:
+        namespace (str): Keep a separate store in a subdirectory, e.g. one per encoder backend
+            (vectors from different encoders cannot share a matrix).
+    """
+    return _shared('path', namespace)
+
+def set_embedding_store(store, namespace=None):
+    """Replace a process-wide product store (e.g. with one in a temporary directory for tests)."""
+    with _shared_store_lock:
+        _shared_stores[('path', namespace)] = store
+
+def get_ingredient_embedding_store(namespace=None):
+    """Return the process-wide store of per-ingredient embeddings, keyed by canonical name."""
+    return _shared('ingredient_path', namespace)
+
+def set_ingredient_embedding_store(store, namespace=None):
+    """Replace a process-wide ingredient embedding store."""
+    with _shared_store_lock:
+        _shared_stores[('ingredient_path', namespace)] = store
@@ -0,0 +1,150 @@
+import hashlib
+import os
+import threading
+import numpy as np
+from scipy import sparse
+from sklearn.feature_extraction.text import HashingVectorizer
+
+HASHED_TFIDF_CONFIG = {
+    'ngram_range': (2, 4),  # character n-grams, taken inside word boundaries
+    'n_features': 2 ** 18,  # hashed feature space
+    'components': 256,      # signed random-projection output size; 0 keeps the full hashed vectors
+    'seed': 0,
+    'idf_path': os.path.join(os.path.expanduser('~'), '.skincare', 'hashed_tfidf_idf.npy')
+}
+
+class SentenceEncoder:
+    """
+    Interface for the encoders behind nlp_similarity.embed_sentences. Subclasses set name
+    and implement encode; anything expensive should be deferred until the first encode call.
+    """
+    name = None
+
+    @property
+    def fingerprint(self):
+        """
+        Short hash of any fitted or configured state that changes the vectors (None if there is
+        none). Stored embeddings are kept per encoder name and fingerprint, so a change here
+        starts a fresh store instead of mixing old and new vectors.
+        """
+        return None
+
+    def encode(self, sentences):
+        """
+        Parameters:
+            sentences (list): Texts to embed.
+        Returns:
+            np.ndarray: A (len(sentences), dim) float32 matrix.
+        """
+        raise NotImplementedError
+
+class HashedNgramEncoder(SentenceEncoder):
+    """
+    CPU-only encoder: hashed character n-gram counts with sublinear TF, optional IDF weights
+    fitted on a corpus, L2 normalization and an optional signed random projection (each
+    hashed feature adds +-1 to one output component, as in a count sketch). It needs no
+    model download, loads in milliseconds and tolerates OCR noise in ingredient names.
+    """
+    name = 'hashed_tfidf'
+
+    def __init__(self, ngram_range=None, n_features=None, components=None, seed=None, idf_path=None):
+        config = HASHED_TFIDF_CONFIG
+        self.ngram_range = tuple(ngram_range or config['ngram_range'])
+        self.seed = seed if seed is not None else config['seed']
+        self.n_features = n_features or config['n_features']
+        self.components = components if components is not None else config['components']
+        self.idf_path = idf_path or config['idf_path']
+        self._vectorizer = HashingVectorizer(
+            analyzer='char_wb', ngram_range=self.ngram_range, n_features=self.n_features,
+            alternate_sign=False, norm=None, lowercase=True
+        )
+        self._projection = None
+        if self.components:
+            generator = np.random.RandomState(self.seed)
+            columns = generator.randint(0, self.components, size=self.n_features)
+            signs = generator.choice(np.array([-1.0, 1.0], dtype=np.float32), size=self.n_features)
+            self._projection = sparse.csr_matrix(
+                (signs, (np.arange(self.n_features), columns)), shape=(self.n_features, self.components)
+            )
+        self.idf = np.load(self.idf_path) if os.path.exists(self.idf_path) else None
+        self._fingerprint = None
+
+    @property
+    def dim(self):
+        return self.components or self.n_features
+
+    @property
+    def fingerprint(self):
+        """Hash of the n-gram, hashing and projection settings and of the IDF weights in use."""
+        if self._fingerprint is None:
+            digest = hashlib.blake2b(digest_size=6)
+            digest.update(repr((self.ngram_range, self.n_features, self.components, self.seed)).encode('utf-8'))
+            if self.idf is not None:
+                digest.update(np.ascontiguousarray(self.idf, dtype=np.float32).tobytes())
+            self._fingerprint = digest.hexdigest()
+        return self._fingerprint
+
+    def _weighted(self, sentences):
+        counts = self._vectorizer.transform(sentences).astype(np.float32)
+        counts.data = np.log1p(counts.data)
+        if self.idf is not None:
+            counts = counts.multiply(self.idf).tocsr()
+        norms = np.sqrt(np.asarray(counts.multiply(counts).sum(axis=1)).ravel())
+        norms[norms == 0] = 1
+        return counts.multiply(1 / norms[:, np.newaxis]).tocsr()
+
+    def fit(self, sentences, save=True):
+        """
+        Fit IDF weights on a corpus (e.g. every catalog ingredient list) and optionally save them.
+        Parameters:
+            sentences (iterable): The corpus.
+            save (bool): Write the weights to idf_path so later processes pick them up.
+        """
+        document_frequency = np.zeros(self.n_features, dtype=np.float64)
+        count = 0
+        batch = []
+        for sentence in sentences:
+            batch.append(sentence)
+            if len(batch) == 1024:
+                document_frequency += self._vectorizer.transform(batch).getnnz(axis=0)
+                count += len(batch)
+                batch = []
+        if batch:
+            document_frequency += self._vectorizer.transform(batch).getnnz(axis=0)
+            count += len(batch)
+        self.idf = np.log((1 + count) / (1 + document_frequency)).astype(np.float32) + 1
+        self._fingerprint = None
+        if save:
+            os.makedirs(os.path.dirname(self.idf_path) or '.', exist_ok=True)
+            np.save(self.idf_path, self.idf)
+        return self
+
+    def encode(self, sentences):
+        weighted = self._weighted(list(sentences))
+        if self._projection is None:
+            return weighted.toarray()
+        projected = np.asarray((weighted @ self._projection).toarray(), dtype=np.float32)
+        norms = np.linalg.norm(projected, axis=1, keepdims=True)
+        return projected / np.where(norms == 0, 1, norms)
+
+_ENCODER_FACTORIES = {
+    HashedNgramEncoder.name: HashedNgramEncoder
+}
+_encoders = {}
+_encoders_lock = threading.Lock()
+
+def register_encoder(name, factory):
+    """Make an encoder selectable by name; factory() is called once, on first use."""
+    with _encoders_lock:
+        _ENCODER_FACTORIES[name] = factory
+        _encoders.pop(name, None)
+
+def get_sentence_encoder(name):
+    """Return the process-wide encoder registered under name, creating it on first use."""
+    with _encoders_lock:
+        encoder = _encoders.get(name)
+        if encoder is None:
+            if name not in _ENCODER_FACTORIES:
+                raise ValueError(f"Unknown encoder backend: {name}")
+            encoder = _encoders[name] = _ENCODER_FACTORIES[name]()
+        return encoder
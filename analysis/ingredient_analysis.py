@@ -1,6 +1,7 @@
 import requests
 import mysql.connector
-from difflib import SequenceMatcher
+from concurrent.futures import ThreadPoolExecutor, wait, FIRST_COMPLETED
+import time
 import sys
 import os
 
@@ -8,10 +9,26 @@ import os
 sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
 
 # Importing get_compound_by_name from utils.pubchem_api
-from utils.pubchem_api import get_compound_by_name
+from utils.pubchem_api import get_compound_by_name, get_snapshot_compound, CompoundRecord, SLIM_PROPERTIES, PUBCHEM_REST_URL
+from utils.compound_cache import get_compound_cache, MISS
+from utils.rate_limiter import pubchem_limiter
+from utils.http_client import get_http_client, RateLimitTimeout
+from utils.single_flight import SingleFlight
 
 # Importing DatabaseManager from the analysis.database module
 from analysis.database import DatabaseManager
+from analysis.product_cache import product_cache, split_ingredients
+from analysis.ingredient_normalizer import normalize_ingredient_name
+from analysis.ingredient_similarity import compare_ingredients, ingredient_overlap
+
+# Settings for analyze_ingredient_list
+ANALYSIS_CONFIG = {
+    'max_workers': 8,
+    'ingredient_timeout': 15.0  # seconds allowed per ingredient once its lookup starts
+}
+
+# Concurrent lookups of the same normalized ingredient share one upstream fetch
+ingredient_flight = SingleFlight()
 
 def get_product_by_barcode(connection, barcode):
     """
@@ -22,26 +39,64 @@ def get_product_by_barcode(connection, barcode):
     Returns:
         dict: A dictionary containing product details.
     """
+    cached = product_cache.get(barcode)
+    if cached is not None:
+        return cached
     try:
         cursor = connection.cursor(dictionary=True)
         query = "SELECT * FROM products WHERE barcode = %s"
         cursor.execute(query, (barcode,))
         product = cursor.fetchone()
         cursor.close()
+        if product is not None:
+            product_cache.put(barcode, product)
         return product
     except mysql.connector.Error as err:
         print(f"Error fetching product by barcode: {err}")
         return None
 
-def get_ingredient_info(ingredient):
+def get_ingredient_info(ingredient, timeout=None, slim=False):
+    """
+    Retrieve PubChem data for an ingredient. The offline compound snapshot (see
+    pubchem_api.use_compound_snapshot) is consulted first, then the shared compound cache,
+    and only then the network. The snapshot holds no raw PUG JSON, so a full lookup served
+    from it returns the snapshot's compound_info dictionary instead.
+    Parameters:
+        ingredient (str): The ingredient name.
+        timeout (float): Seconds allowed for the request (defaults to ANALYSIS_CONFIG['ingredient_timeout']).
+        slim (bool): Request only SLIM_PROPERTIES and return a compact dictionary
+            (CID, formula, weight, InChIKey, SMILES) instead of the full compound record.
+    Returns:
+        dict: The PubChem data, or a dictionary with an 'error' key.
+    """
+    compound_info = get_snapshot_compound(ingredient)
+    if compound_info is not None:
+        return CompoundRecord.from_dict(compound_info).to_dict() if slim else compound_info
+    namespace = 'props' if slim else 'pug_json'
+    cache = get_compound_cache()
+    cached = cache.get(namespace, ingredient)
+    if cached is not MISS:
+        return cached if cached is not None else {"error": "Not Found"}
+    timeout = timeout or ANALYSIS_CONFIG['ingredient_timeout']
     try:
-        response = requests.get(f"https://pubchem.ncbi.nlm.nih.gov/rest/pug/compound/name/{ingredient}/JSON")
+        if slim:
+            url = f"{PUBCHEM_REST_URL}/compound/name/property/{','.join(SLIM_PROPERTIES)}/JSON"
+        else:
+            url = f"{PUBCHEM_REST_URL}/compound/name/JSON"
+        # The name goes in the POST body, as in pubchem_api._pug_rest, so names such as
+        # 'C12/15 Alkyl Benzoate' cannot change the URL path
+        response = get_http_client().post(
+            url, data={'name': ingredient}, timeout=timeout, limiter=pubchem_limiter, limiter_timeout=timeout
+        )
         if response.status_code == 200:
             data = response.json()
-            # Process data
-            return data  # Return the actual data here
+            if slim:
+                data = CompoundRecord.from_properties(data['PropertyTable']['Properties'][0]).to_dict()
+            cache.put(namespace, ingredient, data)
+            return data
         elif response.status_code == 404:
             print(f"Ingredient '{ingredient}' not found.")
+            cache.put(namespace, ingredient, None)
             return {"error": "Not Found"}
         elif response.status_code == 400:
             print(f"Bad request for ingredient '{ingredient}'.")
@@ -49,36 +104,49 @@ def get_ingredient_info(ingredient):
         else:
             print(f"Unexpected status code {response.status_code} for ingredient '{ingredient}'.")
             return {"error": "Error"}
+    except RateLimitTimeout:
+        print(f"Rate limit wait timed out for ingredient '{ingredient}'.")
+        return {"error": "Timeout"}
+    except requests.exceptions.Timeout:
+        print(f"Request timed out for ingredient '{ingredient}'.")
+        return {"error": "Timeout"}
     except Exception as e:
         print(f"Exception occurred while fetching data for ingredient '{ingredient}': {str(e)}")
         return {"error": "Exception"}
 
-def analyze_ingredient(ingredient_name):
+def analyze_ingredient(ingredient_name, timeout=None):
     """
     Analyze a single ingredient to get its compound information from PubChem.
     Parameters:
         ingredient_name (str): The name of the ingredient to analyze.
+        timeout (float): Seconds allowed for the lookup (defaults to ANALYSIS_CONFIG['ingredient_timeout']).
     Returns:
         dict: A dictionary containing compound information.
     """
-    compound_info = get_ingredient_info(ingredient_name)
-    if compound_info and 'error' in compound_info:
-        print(f"Error analyzing ingredient '{ingredient_name}': {compound_info['error']}")
-    return compound_info if compound_info is not None else {"error": "No information available"}
-
+    compound_info = ingredient_flight.do(
+        normalize_ingredient_name(ingredient_name), get_ingredient_info, ingredient_name, timeout=timeout
+    )
+    return _analysis_result(ingredient_name, compound_info)
 
-def compare_ingredients(ingredients1, ingredients2):
+async def analyze_ingredient_async(ingredient_name, timeout=None):
     """
-    Compare two lists of ingredients to calculate similarity.
+    Asyncio variant of analyze_ingredient; shares in-flight lookups with threaded callers.
     Parameters:
-        ingredients1 (list): The first list of ingredient names.
-        ingredients2 (list): The second list of ingredient names.
+        ingredient_name (str): The name of the ingredient to analyze.
+        timeout (float): Seconds allowed for the lookup (defaults to ANALYSIS_CONFIG['ingredient_timeout']).
     Returns:
-        float: A similarity score between 0 and 1.
+        dict: A dictionary containing compound information.
     """
-    combined_ingredients1 = ' '.join(ingredients1)
-    combined_ingredients2 = ' '.join(ingredients2)
-    return SequenceMatcher(None, combined_ingredients1, combined_ingredients2).ratio()
+    compound_info = await ingredient_flight.do_async(
+        normalize_ingredient_name(ingredient_name), get_ingredient_info, ingredient_name, timeout=timeout
+    )
+    return _analysis_result(ingredient_name, compound_info)
+
+def _analysis_result(ingredient_name, compound_info):
+    if compound_info and 'error' in compound_info:
+        print(f"Error analyzing ingredient '{ingredient_name}': {compound_info['error']}")
+    return compound_info if compound_info is not None else {"error": "No information available"}
+
 
 def get_ingredients_from_product(barcode, connection):
     """
@@ -89,10 +157,12 @@ def get_ingredients_from_product(barcode, connection):
     Returns:
         list: A list of ingredient names.
     """
+    ingredients = product_cache.get_ingredients(barcode)
+    if ingredients is not None:
+        return ingredients
     product = get_product_by_barcode(connection, barcode)
     if product:
-        ingredient_list = product.get('ingredient_list', '')
-        return [ingredient.strip() for ingredient in ingredient_list.split(',')] if ingredient_list else []
+        return split_ingredients(product.get('ingredient_list', ''))
     print(f"Product with barcode '{barcode}' not found.")
     return []
 
@@ -113,11 +183,7 @@ def compare_product_ingredients(barcode1, barcode2, connection):
         similarity_score = compare_ingredients(ingredients1, ingredients2)
         
         # Calculate unique and common ingredients
-        set1 = set(ingredients1)
-        set2 = set(ingredients2)
-        common_ingredients = list(set1.intersection(set2))
-        unique_ingredients1 = list(set1.difference(set2))
-        unique_ingredients2 = list(set2.difference(set1))
+        common_ingredients, unique_ingredients1, unique_ingredients2 = ingredient_overlap(ingredients1, ingredients2)
         
         result = {
             'barcode1': barcode1,
@@ -133,55 +199,76 @@ def compare_product_ingredients(barcode1, barcode2, connection):
     else:
         return {'error': 'One or both products not found or have no ingredients'}
 
-def analyze_ingredient_list(ingredient_list):
+def analyze_ingredient_list(ingredient_list, max_workers=None, timeout=None):
     """
     Analyze a list of ingredients to get compound information for each.
+    Lookups run concurrently on a bounded thread pool; PubChem requests are throttled
+    by the shared token bucket. An ingredient that does not finish within timeout
+    seconds of starting is reported as {'error': 'Timeout'} without failing the batch.
     Parameters:
         ingredient_list (list): A list of ingredient names.
+        max_workers (int): Thread pool size (defaults to ANALYSIS_CONFIG['max_workers']).
+        timeout (float): Seconds allowed per ingredient (defaults to ANALYSIS_CONFIG['ingredient_timeout']).
     Returns:
-        dict: A dictionary containing compound information for each ingredient.
+        dict: A dictionary containing compound information for each ingredient, in input order.
     """
-    analysis_results = {}
-    for ingredient in ingredient_list:
-        compound_info = analyze_ingredient(ingredient)
-        if compound_info:
-            analysis_results[ingredient] = compound_info
-        else:
-            analysis_results[ingredient] = {'error': 'Compound information not found'}
-    return analysis_results
+    timeout = timeout or ANALYSIS_CONFIG['ingredient_timeout']
+    ingredients = list(dict.fromkeys(ingredient_list))
+    results = {ingredient: None for ingredient in ingredients}
+    if not ingredients:
+        return results
+    started = {}
+
+    def run(ingredient):
+        started[ingredient] = time.monotonic()
+        return analyze_ingredient(ingredient, timeout=timeout)
+
+    executor = ThreadPoolExecutor(max_workers=min(max_workers or ANALYSIS_CONFIG['max_workers'], len(ingredients)))
+    try:
+        futures = {executor.submit(run, ingredient): ingredient for ingredient in ingredients}
+        pending = set(futures)
+        while pending:
+            done, pending = wait(pending, timeout=0.05, return_when=FIRST_COMPLETED)
+            for future in done:
+                ingredient = futures[future]
+                try:
+                    compound_info = future.result()
+                except Exception as e:
+                    compound_info = {'error': f'Exception: {e}'}
+                results[ingredient] = compound_info or {'error': 'Compound information not found'}
+            now = time.monotonic()
+            for future in list(pending):
+                ingredient = futures[future]
+                if ingredient in started and now - started[ingredient] > timeout:
+                    print(f"Analysis of ingredient '{ingredient}' timed out.")
+                    results[ingredient] = {'error': 'Timeout'}
+                    pending.discard(future)
+    finally:
+        # Do not block on lookups that already timed out
+        executor.shutdown(wait=False)
+    return results
 
 def main():
     """
     Main function for demonstration purposes.
     """
     # Example usage:
+    db_manager = DatabaseManager(pooled=True)
     try:
-        connection = mysql.connector.connect(
-            host='localhost',
-            database='skincare_db',
-            user='root',
-            password=''
-        )
-        
-        if connection.is_connected():
+        with db_manager.borrow_connection() as connection:
             # Compare ingredients of two products
             barcode1 = '012345678932'
             barcode2 = '012345678912'
             comparison_result = compare_product_ingredients(barcode1, barcode2, connection)
             print("Comparison Result:", comparison_result)
-            
-            # Analyze a list of ingredients
-            ingredients = ['Aspirin']
-            analysis_results = analyze_ingredient_list(ingredients)
-            print("Ingredient Analysis Results:", analysis_results)
+        
+        # Analyze a list of ingredients
+        ingredients = ['Aspirin']
+        analysis_results = analyze_ingredient_list(ingredients)
+        print("Ingredient Analysis Results:", analysis_results)
         
     except mysql.connector.Error as err:
         print(f"Error: {err}")
-    
-    finally:
-        if connection.is_connected():
-            connection.close()
-            print("Database connection closed.")
 
 if __name__ == "__main__":
     main()
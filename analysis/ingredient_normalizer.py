@@ -0,0 +1,330 @@
+import json
+import os
+import re
+import threading
+from collections import deque
+
+_WHITESPACE = re.compile(r'\s+')
+
+# Characters that separate ingredients on a label; everything else non-alphanumeric is a space
+_SEPARATORS = set('\n\r,;/()[]{}|•·*')
+
+# Label headings such as 'Ingredients:' or 'INACTIVE INGREDIENTS' at the start of a line
+_LABEL_HEADING = re.compile(r'^[ \t]*(?:(?:active|inactive|other)[ \t]+)?ingr[eé]dients?[ \t]*(?::|$)', re.IGNORECASE | re.MULTILINE)
+
+# The bundled INCI synonym dictionary: {canonical name: [synonyms]}
+INCI_SYNONYMS_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'inci_synonyms.json')
+
+# Fuzzy correction of OCR fragments that match no dictionary entry exactly
+CORRECTION_CONFIG = {
+    'max_edit_distance': 2,  # edits (insert, delete, substitute, transpose) tolerated per fragment
+    'prefix_length': 7,      # characters of each term indexed for deletes, as in SymSpell
+    'min_confidence': 0.75,  # corrections below this are left for a network lookup
+    'min_length': 4          # shorter fragments are too ambiguous to correct
+}
+
+def normalize_ingredient_name(name):
+    """
+    Normalize an ingredient name for interning and lookups.
+    Parameters:
+        name (str): A raw ingredient name, e.g. '  Sodium  Hyaluronate '.
+    Returns:
+        str: The lower-cased name with whitespace collapsed, e.g. 'sodium hyaluronate'.
+    """
+    if not name:
+        return ''
+    return _WHITESPACE.sub(' ', name).strip().lower()
+
+def normalize_for_matching(text):
+    """
+    Reduce text to lower-case alphanumerics, single spaces and '|' separators,
+    e.g. 'AQUA (WATER),\\nGlycerin' -> 'aqua|water|glycerin'.
+    Dictionary patterns and OCR text go through the same function so they line up.
+    """
+    characters = []
+    for character in text.lower():
+        if character.isalnum():
+            characters.append(character)
+        elif character in _SEPARATORS:
+            characters.append('|')
+        else:
+            characters.append(' ')
+    normalized = re.sub(r' +', ' ', ''.join(characters))
+    normalized = re.sub(r' ?\| ?', '|', normalized)
+    return re.sub(r'\|+', '|', normalized).strip(' |')
+
+def edit_distance(source, target, max_distance):
+    """
+    Optimal string alignment distance (Levenshtein plus adjacent transpositions).
+    Parameters:
+        source (str): The first string.
+        target (str): The second string.
+        max_distance (int): Stop early once the distance is known to exceed this.
+    Returns:
+        int: The distance, or max_distance + 1 if it is larger than max_distance.
+    """
+    if abs(len(source) - len(target)) > max_distance:
+        return max_distance + 1
+    two_rows_back = None
+    row = list(range(len(target) + 1))
+    for i in range(1, len(source) + 1):
+        previous_row, row = row, [i] + [0] * len(target)
+        for j in range(1, len(target) + 1):
+            cost = 0 if source[i - 1] == target[j - 1] else 1
+            current = min(previous_row[j] + 1, row[j - 1] + 1, previous_row[j - 1] + cost)
+            if i > 1 and j > 1 and source[i - 1] == target[j - 2] and source[i - 2] == target[j - 1]:
+                current = min(current, two_rows_back[j - 2] + 1)
+            row[j] = current
+        if min(row) > max_distance:
+            return max_distance + 1
+        two_rows_back = previous_row
+    return row[-1] if row[-1] <= max_distance else max_distance + 1
+
+def _deletes(term, max_distance):
+    """All strings reachable from term by deleting up to max_distance characters (term included)."""
+    deletes = {term}
+    frontier = {term}
+    for _ in range(max_distance):
+        frontier = {candidate[:index] + candidate[index + 1:] for candidate in frontier for index in range(len(candidate))}
+        deletes |= frontier
+    return deletes
+
+class FuzzyIndex:
+    """
+    SymSpell-style symmetric delete index. Every term's deletes are precomputed, so a lookup
+    only generates the deletes of the query and verifies the few terms that share one.
+    """
+    def __init__(self, terms, max_distance=None, prefix_length=None):
+        """
+        Parameters:
+            terms (iterable): The vocabulary, already passed through normalize_for_matching.
+            max_distance (int): Defaults to CORRECTION_CONFIG['max_edit_distance'].
+            prefix_length (int): Defaults to CORRECTION_CONFIG['prefix_length'].
+        """
+        self.max_distance = max_distance if max_distance is not None else CORRECTION_CONFIG['max_edit_distance']
+        self.prefix_length = prefix_length or CORRECTION_CONFIG['prefix_length']
+        self._deletes = {}
+        for term in terms:
+            for delete in _deletes(term[:self.prefix_length], self.max_distance):
+                self._deletes.setdefault(delete, []).append(term)
+
+    def lookup(self, term):
+        """
+        Find the vocabulary term closest to term.
+        Returns:
+            tuple: (term, distance) for the closest term, or None if none is within max_distance.
+        """
+        best = None
+        seen = set()
+        for delete in _deletes(term[:self.prefix_length], self.max_distance):
+            for candidate in self._deletes.get(delete, ()):
+                if candidate in seen:
+                    continue
+                seen.add(candidate)
+                limit = best[1] if best else self.max_distance
+                distance = edit_distance(term, candidate, limit)
+                if distance > limit:
+                    continue
+                if best is None or distance < best[1] or (distance == best[1] and candidate < best[0]):
+                    best = (candidate, distance)
+        return best
+
+class IngredientDictionary:
+    """
+    INCI/synonym dictionary compiled into an Aho-Corasick automaton, so every known
+    ingredient in a text blob is found in a single linear pass.
+    """
+    def __init__(self, synonyms):
+        """
+        Parameters:
+            synonyms (dict): A mapping of canonical ingredient name to a list of synonyms.
+        """
+        self._canonical = {}
+        for canonical, names in synonyms.items():
+            for name in [canonical] + list(names):
+                pattern = normalize_for_matching(name)
+                if pattern:
+                    self._canonical.setdefault(pattern, canonical)
+        self._build_automaton()
+        self._fuzzy = FuzzyIndex(self._canonical)
+
+    @classmethod
+    def load(cls, path=None):
+        """Load a dictionary from a JSON file (defaults to the bundled INCI_SYNONYMS_PATH)."""
+        with open(path or INCI_SYNONYMS_PATH, 'r', encoding='utf-8') as file:
+            return cls(json.load(file))
+
+    def _build_automaton(self):
+        self._goto = [{}]
+        self._fail = [0]
+        self._output = [[]]
+        for pattern in self._canonical:
+            state = 0
+            for character in pattern:
+                next_state = self._goto[state].get(character)
+                if next_state is None:
+                    next_state = len(self._goto)
+                    self._goto[state][character] = next_state
+                    self._goto.append({})
+                    self._fail.append(0)
+                    self._output.append([])
+                state = next_state
+            self._output[state].append(pattern)
+        queue = deque(self._goto[0].values())
+        while queue:
+            state = queue.popleft()
+            for character, next_state in self._goto[state].items():
+                queue.append(next_state)
+                fallback = self._fail[state]
+                while fallback and character not in self._goto[fallback]:
+                    fallback = self._fail[fallback]
+                self._fail[next_state] = self._goto[fallback].get(character, 0)
+                self._output[next_state] = self._output[next_state] + self._output[self._fail[next_state]]
+
+    def __len__(self):
+        return len(self._canonical)
+
+    def canonicalize(self, name):
+        """Return the canonical name for an exact (normalized) ingredient name or synonym, or None."""
+        return self._canonical.get(normalize_for_matching(name))
+
+    def correct(self, name):
+        """
+        Correct an OCR-garbled name to the nearest known ingredient, e.g. 'Glycenn' -> 'Glycerin'.
+        Parameters:
+            name (str): The name to correct.
+        Returns:
+            tuple: (canonical name, confidence) where confidence is 1 - distance / length
+            (1.0 for an exact match), or None if nothing is within the edit distance limit.
+        """
+        term = normalize_for_matching(name)
+        if term in self._canonical:
+            return self._canonical[term], 1.0
+        if len(term) < CORRECTION_CONFIG['min_length']:
+            return None
+        match = self._fuzzy.lookup(term)
+        if match is None:
+            return None
+        pattern, distance = match
+        return self._canonical[pattern], 1.0 - distance / max(len(term), len(pattern))
+
+    def find(self, normalized_text):
+        """
+        Find known ingredients in text already passed through normalize_for_matching.
+        A match must cover whole separator-bounded segments: a known name inside a longer
+        ingredient (e.g. 'sodium hyaluronate' in 'sodium hyaluronate crosspolymer') is not a
+        match, since that is a different compound. Overlapping matches are resolved leftmost-longest.
+        Returns:
+            list: (start, end, canonical name) tuples in text order.
+        """
+        matches = []
+        state = 0
+        for index, character in enumerate(normalized_text):
+            while state and character not in self._goto[state]:
+                state = self._fail[state]
+            state = self._goto[state].get(character, 0)
+            for pattern in self._output[state]:
+                start = index - len(pattern) + 1
+                end = index + 1
+                if (start == 0 or normalized_text[start - 1] == '|') and \
+                        (end == len(normalized_text) or normalized_text[end] == '|'):
+                    matches.append((start, end, self._canonical[pattern]))
+        matches.sort(key=lambda match: (match[0], match[0] - match[1]))
+        selected = []
+        covered_until = 0
+        for start, end, canonical in matches:
+            if start >= covered_until:
+                selected.append((start, end, canonical))
+                covered_until = end
+        return selected
+
+    def extract(self, text, min_confidence=None):
+        """
+        Extract ingredients from a raw OCR text blob.
+        Label headings ('Ingredients:') are dropped. Known ingredients and synonyms are collapsed
+        to their canonical name. A segment between separators that matches nothing exactly is
+        fuzzily corrected as a whole; segments whose best correction falls below min_confidence
+        are kept whole (normalized) for a network lookup.
+        Parameters:
+            text (str): The raw OCR output.
+            min_confidence (float): Defaults to CORRECTION_CONFIG['min_confidence'].
+        Returns:
+            list: (name, confidence) tuples in label order, without duplicates. Confidence is
+            1.0 for exact matches and 0.0 for fragments left uncorrected.
+        """
+        if min_confidence is None:
+            min_confidence = CORRECTION_CONFIG['min_confidence']
+        normalized = normalize_for_matching(_LABEL_HEADING.sub('\n', text))
+        found = []
+        cursor = 0
+        for start, end, canonical in self.find(normalized):
+            found.extend(self._correct_fragments(normalized[cursor:start], min_confidence))
+            found.append((canonical, 1.0))
+            cursor = end
+        found.extend(self._correct_fragments(normalized[cursor:], min_confidence))
+        seen = set()
+        extracted = []
+        for name, confidence in found:
+            if name not in seen:
+                seen.add(name)
+                extracted.append((name, confidence))
+        return extracted
+
+    def _correct_fragments(self, text, min_confidence):
+        corrected = []
+        for fragment in _fragments(text):
+            match = self.correct(fragment)
+            if match is not None and match[1] >= min_confidence:
+                corrected.append(match)
+            else:
+                corrected.append((fragment, 0.0))
+        return corrected
+
+def _fragments(text):
+    """Split leftover text on separators, dropping pieces without at least two letters."""
+    fragments = []
+    for fragment in text.split('|'):
+        fragment = fragment.strip()
+        if sum(character.isalpha() for character in fragment) >= 2:
+            fragments.append(fragment)
+    return fragments
+
+_shared_dictionary = None
+_shared_dictionary_lock = threading.Lock()
+
+def get_ingredient_dictionary():
+    """Return the process-wide IngredientDictionary, loading the bundled one on first use."""
+    global _shared_dictionary
+    with _shared_dictionary_lock:
+        if _shared_dictionary is None:
+            _shared_dictionary = IngredientDictionary.load()
+        return _shared_dictionary
+
+def extract_ingredients(text, dictionary=None, min_confidence=None):
+    """
+    Turn a raw OCR text blob into a de-duplicated ingredient list, canonicalizing known
+    and OCR-garbled ingredients before any network lookup.
+    Parameters:
+        text (str): The raw OCR output.
+        dictionary (IngredientDictionary): Defaults to the shared bundled dictionary.
+        min_confidence (float): Defaults to CORRECTION_CONFIG['min_confidence'].
+    Returns:
+        list: Ingredient names in label order.
+    """
+    if dictionary is None:
+        dictionary = get_ingredient_dictionary()
+    return [name for name, _ in dictionary.extract(text, min_confidence)]
+
+def canonical_ingredient_name(name, dictionary=None):
+    """
+    Key an ingredient name so that spellings and synonyms of the same ingredient compare equal,
+    e.g. 'AQUA' and 'Water ' -> 'water'. Names outside the dictionary are just normalized.
+    Parameters:
+        name (str): A raw ingredient name.
+        dictionary (IngredientDictionary): Defaults to the shared bundled dictionary.
+    Returns:
+        str: The normalized canonical name.
+    """
+    if dictionary is None:
+        dictionary = get_ingredient_dictionary()
+    return normalize_ingredient_name(dictionary.canonicalize(name) or name)
@@ -0,0 +1,181 @@
+import math
+import threading
+import sys
+import os
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from analysis.ingredient_normalizer import canonical_ingredient_name
+
+SIMILARITY_CONFIG = {
+    'metric': 'position_weighted',  # default metric for compare_ingredients
+    'position_decay': 1.0           # ingredient at rank r (0-based) weighs 1 / (r + 1) ** position_decay
+}
+
+class IngredientVocabulary:
+    """
+    Interns canonical ingredient names as small integer IDs, so similarity is computed on
+    integer sets instead of strings. Raw names are memoized to skip canonicalization on repeats.
+    """
+    def __init__(self):
+        self._ids = {}
+        self._names = []
+        self._raw = {}
+        self._lock = threading.Lock()
+
+    def __len__(self):
+        return len(self._names)
+
+    def intern(self, name):
+        """Return the ID for an ingredient name, assigning a new one if the name is unseen."""
+        ingredient_id = self._raw.get(name)
+        if ingredient_id is not None:
+            return ingredient_id
+        key = canonical_ingredient_name(name)
+        with self._lock:
+            ingredient_id = self._ids.get(key)
+            if ingredient_id is None:
+                ingredient_id = len(self._names)
+                self._ids[key] = ingredient_id
+                self._names.append(key)
+            self._raw[name] = ingredient_id
+        return ingredient_id
+
+    def name(self, ingredient_id):
+        """Return the canonical name behind an ID."""
+        return self._names[ingredient_id]
+
+# Shared vocabulary so profiles built anywhere in the process are comparable
+ingredient_vocabulary = IngredientVocabulary()
+
+class IngredientProfile:
+    """
+    An ingredient list encoded for fast comparison: the set of ingredient IDs plus each
+    ingredient's position weight. Duplicate ingredients keep their first (highest) rank.
+    """
+    __slots__ = ('ids', 'weights', 'total_weight')
+
+    def __init__(self, ingredients, vocabulary=None):
+        """
+        Parameters:
+            ingredients (list): Ingredient names in label order.
+            vocabulary (IngredientVocabulary): Defaults to the shared ingredient_vocabulary.
+        """
+        if vocabulary is None:
+            vocabulary = ingredient_vocabulary
+        ranks = {}
+        for ingredient in ingredients:
+            if ingredient and ingredient.strip():
+                ranks.setdefault(vocabulary.intern(ingredient), len(ranks))
+        self.weights = {ingredient_id: position_weight(rank) for ingredient_id, rank in ranks.items()}
+        self.ids = frozenset(ranks)
+        self.total_weight = sum(self.weights.values())
+
+    def __len__(self):
+        return len(self.ids)
+
+def position_weight(rank):
+    """Weight of the ingredient at a 0-based label rank; earlier means more concentrated."""
+    return 1.0 / (rank + 1) ** SIMILARITY_CONFIG['position_decay']
+
+def jaccard(profile1, profile2):
+    """Share of distinct ingredients the two products have in common: |A ∩ B| / |A ∪ B|."""
+    common = len(profile1.ids & profile2.ids)
+    union = len(profile1.ids) + len(profile2.ids) - common
+    return common / union if union else 0.0
+
+def weighted_jaccard(profile1, profile2, weights):
+    """
+    Jaccard with per-ingredient weights, e.g. from idf_weights, so that ubiquitous ingredients
+    such as water count for less: sum of common weights / sum of union weights.
+    Parameters:
+        weights (dict): A mapping of ingredient ID to weight; missing IDs weigh 1.0.
+    """
+    common = sum(weights.get(ingredient_id, 1.0) for ingredient_id in profile1.ids & profile2.ids)
+    union = (sum(weights.get(ingredient_id, 1.0) for ingredient_id in profile1.ids)
+             + sum(weights.get(ingredient_id, 1.0) for ingredient_id in profile2.ids) - common)
+    return common / union if union else 0.0
+
+def position_weighted_overlap(profile1, profile2):
+    """
+    Weighted Jaccard over label positions: each ingredient weighs position_weight(rank) in each
+    product, and the score is sum(min) / sum(max). Sharing the leading (most concentrated)
+    ingredients counts for more than sharing trace ones, and reordering lowers the score.
+    """
+    weights1, weights2 = profile1.weights, profile2.weights
+    shared = 0.0
+    for ingredient_id in profile1.ids & profile2.ids:
+        shared += min(weights1[ingredient_id], weights2[ingredient_id])
+    # min + max == weight1 + weight2 per ingredient, so the union needs no second pass
+    union = profile1.total_weight + profile2.total_weight - shared
+    return shared / union if union else 0.0
+
+def idf_weights(profiles):
+    """
+    Inverse document frequency of every ingredient across a catalog of profiles.
+    Parameters:
+        profiles (iterable): IngredientProfile objects.
+    Returns:
+        dict: A mapping of ingredient ID to log(1 + N / document frequency).
+    """
+    document_frequency = {}
+    count = 0
+    for profile in profiles:
+        count += 1
+        for ingredient_id in profile.ids:
+            document_frequency[ingredient_id] = document_frequency.get(ingredient_id, 0) + 1
+    return {ingredient_id: math.log(1 + count / frequency) for ingredient_id, frequency in document_frequency.items()}
+
+def similarity(profile1, profile2, metric=None, weights=None):
+    """
+    Score two profiles with the named metric.
+    Parameters:
+        metric (str): 'jaccard', 'weighted_jaccard' or 'position_weighted' (defaults to SIMILARITY_CONFIG['metric']).
+        weights (dict): Per-ingredient weights for 'weighted_jaccard'.
+    Returns:
+        float: A similarity score between 0 and 1.
+    """
+    metric = metric or SIMILARITY_CONFIG['metric']
+    if metric == 'jaccard':
+        return jaccard(profile1, profile2)
+    if metric == 'weighted_jaccard':
+        return weighted_jaccard(profile1, profile2, weights or {})
+    if metric == 'position_weighted':
+        return position_weighted_overlap(profile1, profile2)
+    raise ValueError(f"Unknown similarity metric: {metric}")
+
+def compare_ingredients(ingredients1, ingredients2, metric=None, weights=None):
+    """
+    Compare two lists of ingredients to calculate similarity.
+    Parameters:
+        ingredients1 (list): The first list of ingredient names.
+        ingredients2 (list): The second list of ingredient names.
+        metric (str): See similarity (defaults to SIMILARITY_CONFIG['metric']).
+        weights (dict): Per-ingredient weights for 'weighted_jaccard'.
+    Returns:
+        float: A similarity score between 0 and 1.
+    """
+    return similarity(IngredientProfile(ingredients1), IngredientProfile(ingredients2), metric, weights)
+
+def ingredient_overlap(ingredients1, ingredients2):
+    """
+    Split two ingredient lists into common and unique ingredients, matching names by
+    canonical ID so that spelling and synonym differences do not hide shared ingredients.
+    Returns:
+        tuple: (common_ingredients, unique_ingredients1, unique_ingredients2), each in label order
+        and using the names as they appear in the products.
+    """
+    ids2 = {ingredient_vocabulary.intern(ingredient) for ingredient in ingredients2}
+    ids1 = {ingredient_vocabulary.intern(ingredient) for ingredient in ingredients1}
+    common, unique1, unique2 = [], [], []
+    seen = set()
+    for ingredient in ingredients1:
+        ingredient_id = ingredient_vocabulary.intern(ingredient)
+        if ingredient_id not in seen:
+            seen.add(ingredient_id)
+            (common if ingredient_id in ids2 else unique1).append(ingredient)
+    seen = set()
+    for ingredient in ingredients2:
+        ingredient_id = ingredient_vocabulary.intern(ingredient)
+        if ingredient_id not in seen and ingredient_id not in ids1:
+            seen.add(ingredient_id)
+            unique2.append(ingredient)
+    return common, unique1, unique2
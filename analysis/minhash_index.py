@@ -0,0 +1,180 @@
+import hashlib
+import threading
+import sys
+import os
+import numpy as np
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from analysis.ingredient_normalizer import canonical_ingredient_name
+from analysis.ingredient_similarity import IngredientProfile, similarity
+from analysis.product_cache import split_ingredients
+
+MINHASH_CONFIG = {
+    'num_perm': 128,       # hash functions per signature (stored as num_perm uint32 values)
+    'bands': 32,           # LSH bands; rows per band = num_perm / bands, ~0.42 Jaccard threshold at 32 x 4
+    'seed': 1,             # changing the seed or num_perm invalidates stored signatures
+    'max_candidates': 500  # candidates re-ranked with exact similarity per query
+}
+
+_MERSENNE_PRIME = np.uint64((1 << 61) - 1)
+_MAX_HASH = np.uint64((1 << 32) - 1)
+
+def _permutations(num_perm, seed):
+    generator = np.random.RandomState(seed)
+    a = generator.randint(1, 1 << 32, size=num_perm, dtype=np.uint64)
+    b = generator.randint(0, 1 << 32, size=num_perm, dtype=np.uint64)
+    return a, b
+
+_PERMUTATIONS = _permutations(MINHASH_CONFIG['num_perm'], MINHASH_CONFIG['seed'])
+
+def _ingredient_hash(name):
+    return int.from_bytes(hashlib.blake2b(name.encode('utf-8'), digest_size=4).digest(), 'little')
+
+def minhash_signature(ingredients):
+    """
+    MinHash signature of a product's canonical ingredient set.
+    Parameters:
+        ingredients (list): Ingredient names.
+    Returns:
+        numpy.ndarray: num_perm uint32 values, or None for an empty ingredient list.
+    """
+    names = {canonical_ingredient_name(ingredient) for ingredient in ingredients if ingredient and ingredient.strip()}
+    if not names:
+        return None
+    hashes = np.array([_ingredient_hash(name) for name in names], dtype=np.uint64)
+    a, b = _PERMUTATIONS
+    # (a * x + b) mod p per permutation and ingredient; a, x < 2**32 so a * x fits in 64 bits
+    permuted = ((np.outer(hashes, a) + b) % _MERSENNE_PRIME) & _MAX_HASH
+    return permuted.min(axis=0).astype(np.uint32)
+
+def signature_to_bytes(signature):
+    return signature.astype('<u4').tobytes()
+
+def signature_from_bytes(data):
+    """Decode a stored signature, or return None if it was made with a different num_perm."""
+    if data is None or len(data) != MINHASH_CONFIG['num_perm'] * 4:
+        return None
+    return np.frombuffer(bytes(data), dtype='<u4').astype(np.uint32)
+
+def estimated_jaccard(signature1, signature2):
+    """Share of matching signature positions, an unbiased estimate of the Jaccard similarity."""
+    return float(np.mean(signature1 == signature2))
+
+class MinHashLSH:
+    """
+    Banded locality-sensitive hashing over MinHash signatures. A query only looks at the
+    products that collide with it in at least one band, so lookups do not scan the catalog.
+    """
+    def __init__(self, bands=None):
+        self.bands = bands or MINHASH_CONFIG['bands']
+        self.rows = MINHASH_CONFIG['num_perm'] // self.bands
+        self._buckets = [{} for _ in range(self.bands)]
+        self._signatures = {}
+        self._lock = threading.Lock()
+
+    def __len__(self):
+        return len(self._signatures)
+
+    def __contains__(self, key):
+        return key in self._signatures
+
+    def _band_keys(self, signature):
+        return [signature[band * self.rows:(band + 1) * self.rows].tobytes() for band in range(self.bands)]
+
+    def insert(self, key, signature):
+        """Add or replace the signature for key (e.g. a product id)."""
+        with self._lock:
+            self._remove(key)
+            self._signatures[key] = signature
+            for buckets, band_key in zip(self._buckets, self._band_keys(signature)):
+                buckets.setdefault(band_key, set()).add(key)
+
+    def remove(self, key):
+        with self._lock:
+            self._remove(key)
+
+    def _remove(self, key):
+        signature = self._signatures.pop(key, None)
+        if signature is None:
+            return
+        for buckets, band_key in zip(self._buckets, self._band_keys(signature)):
+            bucket = buckets.get(band_key)
+            if bucket is not None:
+                bucket.discard(key)
+                if not bucket:
+                    del buckets[band_key]
+
+    def query(self, signature, max_candidates=None):
+        """
+        Find candidate keys sharing at least one band with signature.
+        Returns:
+            list: Up to max_candidates keys, most band collisions first.
+        """
+        max_candidates = max_candidates or MINHASH_CONFIG['max_candidates']
+        collisions = {}
+        with self._lock:
+            for buckets, band_key in zip(self._buckets, self._band_keys(signature)):
+                for key in buckets.get(band_key, ()):
+                    collisions[key] = collisions.get(key, 0) + 1
+        return sorted(collisions, key=lambda key: -collisions[key])[:max_candidates]
+
+_product_index = None
+_product_index_lock = threading.Lock()
+
+def get_product_index():
+    """Return the process-wide product MinHashLSH, or None if it has not been loaded."""
+    return _product_index
+
+def set_product_index(index):
+    """Replace the process-wide product index (None unloads it)."""
+    global _product_index
+    _product_index = index
+
+def load_product_index(db_manager):
+    """
+    Build the process-wide product index from the stored signatures, once per process.
+    Parameters:
+        db_manager (DatabaseManager): Used to stream product_minhash.
+    Returns:
+        MinHashLSH: The shared index.
+    """
+    global _product_index
+    with _product_index_lock:
+        if _product_index is None:
+            index = MinHashLSH()
+            for chunk in db_manager.iter_minhash_signatures():
+                for product_id, data in chunk:
+                    signature = signature_from_bytes(data)
+                    if signature is not None:
+                        index.insert(product_id, signature)
+            _product_index = index
+        return _product_index
+
+def find_similar_products(db_manager, ingredients, limit=10, metric=None):
+    """
+    Find catalog products with ingredients similar to an ingredient list.
+    LSH candidates are re-ranked with exact similarity from analysis.ingredient_similarity.
+    Parameters:
+        db_manager (DatabaseManager): Used to load the index and the candidate products.
+        ingredients (list): Ingredient names to search for.
+        limit (int): Maximum number of products to return.
+        metric (str): Re-ranking metric (defaults to SIMILARITY_CONFIG['metric']).
+    Returns:
+        list: (product row dict, similarity score) tuples, best first.
+    """
+    signature = minhash_signature(ingredients)
+    if signature is None:
+        return []
+    index = get_product_index()
+    if index is None:
+        index = load_product_index(db_manager)
+    candidates = index.query(signature)
+    if not candidates:
+        return []
+    profile = IngredientProfile(ingredients)
+    scored = []
+    for product in db_manager.get_products_by_ids(candidates):
+        score = similarity(profile, IngredientProfile(split_ingredients(product.get('ingredient_list'))), metric)
+        if score > 0:
+            scored.append((product, score))
+    scored.sort(key=lambda item: -item[1])
+    return scored[:limit]
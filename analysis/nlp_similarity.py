@@ -1,24 +1,236 @@
-import tensorflow_hub as hub
+import threading
+import time
+from itertools import islice
 import numpy as np
 from sklearn.metrics.pairwise import cosine_similarity
 import sys
 import os
 sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
 from analysis.database import DatabaseManager
+from analysis.ingredient_analysis import get_product_by_barcode
+from analysis.product_cache import product_cache, split_ingredients
+from analysis.minhash_index import find_similar_products
+from analysis.ingredient_normalizer import canonical_ingredient_name
+from analysis.ingredient_similarity import position_weight
+from analysis.embedding_store import get_embedding_store, get_ingredient_embedding_store
+from analysis.vector_search import get_vector_search, normalize_rows
+from analysis.encoders import SentenceEncoder, register_encoder, get_sentence_encoder
 
-# Load the model once globally
-embed = hub.load("https://tfhub.dev/google/universal-sentence-encoder/4")
+NLP_CONFIG = {
+    'encoder': 'use',    # embed_sentences backend: 'use' (TensorFlow Hub) or 'hashed_tfidf' (CPU-only)
+    'model_url': "https://tfhub.dev/google/universal-sentence-encoder/4",
+    'model_path': None,  # local SavedModel directory; used instead of model_url when set (offline use)
+    'warm_up': False,    # load the model in a background thread when the GUI starts
+    'batch_size': 64,    # sentences per encoder call in embed_batches
+    'similar_products': 'embedding',  # get_similar_products backend: 'embedding' or 'minhash'
+    'embedding_mode': 'text',   # 'text' embeds the joined list; 'pooled' pools cached per-ingredient vectors
+    'pooling': 'position'       # 'position' weights ingredients by label rank, 'uniform' averages them
+}
+
+_encoder = None
+_encoder_lock = threading.Lock()
+
+def get_encoder():
+    """
+    Return the Universal Sentence Encoder, loading it on first use.
+    TensorFlow Hub is only imported here, so importing this module stays cheap.
+    """
+    global _encoder
+    if _encoder is None:
+        with _encoder_lock:
+            if _encoder is None:
+                import tensorflow_hub as hub
+                started = time.monotonic()
+                location = NLP_CONFIG['model_path'] or NLP_CONFIG['model_url']
+                _encoder = hub.load(location)
+                print(f"Sentence encoder loaded from {location} in {time.monotonic() - started:.1f}s")
+    return _encoder
+
+def warm_up_encoder():
+    """
+    Load the encoder in a background daemon thread so the first comparison does not wait for it.
+    Returns:
+        threading.Thread: The loading thread.
+    """
+    def load():
+        try:
+            get_encoder()
+        except Exception as e:
+            print(f"Error: could not load the sentence encoder: {e}")
+
+    thread = threading.Thread(target=load, name='encoder-warm-up', daemon=True)
+    thread.start()
+    return thread
+
+class UniversalSentenceEncoder(SentenceEncoder):
+    """The TensorFlow Hub Universal Sentence Encoder, loaded lazily through get_encoder."""
+    name = 'use'
+
+    def encode(self, sentences):
+        return get_encoder()(list(sentences)).numpy()
+
+register_encoder(UniversalSentenceEncoder.name, UniversalSentenceEncoder)
 
 def embed_sentences(sentences):
     """
-    Embed a list of sentences using Universal Sentence Encoder.
+    Embed a list of sentences with the encoder selected by NLP_CONFIG['encoder'].
     Parameters:
         sentences (list): A list of sentences to embed.
     Returns:
         np.ndarray: The embeddings of the sentences.
     """
-    embeddings = embed(sentences)
-    return embeddings.numpy()
+    return get_sentence_encoder(NLP_CONFIG['encoder']).encode(sentences)
+
+def embedding_namespace():
+    """
+    The embedding store namespace of the configured encoder: its name, plus its fingerprint
+    when it has fitted state (e.g. IDF weights), so re-fitting starts a fresh store.
+    """
+    encoder = get_sentence_encoder(NLP_CONFIG['encoder'])
+    if encoder.fingerprint is None:
+        return NLP_CONFIG['encoder']
+    return f"{NLP_CONFIG['encoder']}-{encoder.fingerprint}"
+
+def ingredient_text(ingredients):
+    """The text embedded for an ingredient list (and hashed to detect changes)."""
+    return ', '.join(ingredients)
+
+def pooled_embeddings(ingredient_lists, store=None):
+    """
+    Compose product embeddings from per-ingredient embeddings.
+    Each distinct canonical ingredient is embedded once and kept in the ingredient embedding
+    store, so lists made of known ingredients never reach the encoder. Missing ingredients
+    across all lists are embedded together in one call.
+    Parameters:
+        ingredient_lists (list): Ingredient name lists.
+        store (EmbeddingStore): Defaults to the shared ingredient embedding store.
+    Returns:
+        np.ndarray: One unit-length pooled embedding per list (zero for an empty list).
+    """
+    if store is None:
+        store = get_ingredient_embedding_store(embedding_namespace())
+    names_per_list = [
+        list(dict.fromkeys(canonical_ingredient_name(ingredient) for ingredient in ingredients if ingredient and ingredient.strip()))
+        for ingredients in ingredient_lists
+    ]
+    missing = store.stale(dict.fromkeys((name, name) for names in names_per_list for name in names))
+    if missing:
+        store.put_many((name, text, embedding) for (name, text), embedding in zip(missing, embed_sentences([name for name, _ in missing])))
+    pooled = []
+    for names in names_per_list:
+        if not names:
+            if store.dim is None:
+                raise ValueError("Cannot pool an empty ingredient list before any ingredient is embedded")
+            pooled.append(np.zeros(store.dim, dtype=np.float32))
+            continue
+        vectors = normalize_rows(np.stack([store.get(name) for name in names]))
+        if NLP_CONFIG['pooling'] == 'position':
+            weights = np.array([position_weight(rank) for rank in range(len(names))], dtype=np.float32)
+        else:
+            weights = np.ones(len(names), dtype=np.float32)
+        pooled.append(normalize_rows(weights @ vectors)[0])
+    return np.array(pooled)
+
+def embed_texts(texts):
+    """
+    Embed ingredient texts with the configured NLP_CONFIG['embedding_mode'].
+    Parameters:
+        texts (list): Texts built by ingredient_text.
+    Returns:
+        np.ndarray: One embedding per text.
+    """
+    if NLP_CONFIG['embedding_mode'] == 'pooled':
+        return pooled_embeddings([split_ingredients(text) for text in texts])
+    return embed_sentences(texts)
+
+def _store_text(text):
+    """The text hashed in the product store; tagging pooled vectors keeps the two modes apart."""
+    if NLP_CONFIG['embedding_mode'] == 'pooled':
+        return f"pooled:{NLP_CONFIG['pooling']}:{text}"
+    return text
+
+def embed_batches(items, batch_size=None, store=None, stats=None):
+    """
+    Embed a stream of products in encoder batches, persisting the results as they arrive.
+    Products whose text is already in the store are served from it without touching the encoder.
+    Parameters:
+        items (iterable): (barcode, ingredient text) pairs; may be a lazy iterator.
+        batch_size (int): Sentences per encoder call (defaults to NLP_CONFIG['batch_size']).
+        store (EmbeddingStore): Defaults to the shared store.
+        stats (dict): If given, updated with 'embedded', 'cached' and 'seconds' (encoder time).
+    Yields:
+        tuple: (barcode, embedding) in input order, one batch at a time.
+    """
+    batch_size = batch_size or NLP_CONFIG['batch_size']
+    if store is None:
+        store = get_embedding_store(embedding_namespace())
+    if stats is not None:
+        stats.setdefault('embedded', 0)
+        stats.setdefault('cached', 0)
+        stats.setdefault('seconds', 0.0)
+    iterator = iter(items)
+    while True:
+        batch = list(islice(iterator, batch_size))
+        if not batch:
+            return
+        texts = dict(batch)
+        stale = store.stale((barcode, _store_text(text)) for barcode, text in batch)
+        if stale:
+            started = time.monotonic()
+            embeddings = embed_texts([texts[barcode] for barcode, _ in stale])
+            elapsed = time.monotonic() - started
+            store.put_many((barcode, text, embedding) for (barcode, text), embedding in zip(stale, embeddings))
+            if stats is not None:
+                stats['seconds'] += elapsed
+        if stats is not None:
+            stats['embedded'] += len(stale)
+            stats['cached'] += len(batch) - len(stale)
+        for barcode, _ in batch:
+            yield barcode, store.get(barcode)
+
+def get_product_embeddings(products, store=None):
+    """
+    Return product embeddings, serving them from the persistent embedding store and embedding
+    only products that are missing or whose ingredient list changed.
+    Parameters:
+        products (list): (barcode, ingredient list) pairs.
+        store (EmbeddingStore): Defaults to the shared store.
+    Returns:
+        dict: A mapping of barcode to embedding.
+    """
+    texts = [(barcode, ingredient_text(ingredients)) for barcode, ingredients in products]
+    return dict(embed_batches(texts, store=store))
+
+def backfill_embeddings(db_manager=None, batch_size=None, store=None):
+    """
+    Embed every catalog product that is missing from the store or has changed, in one pass.
+    Parameters:
+        db_manager (DatabaseManager): Defaults to a new DatabaseManager, closed afterwards.
+        batch_size (int): Sentences per encoder call (defaults to NLP_CONFIG['batch_size']).
+        store (EmbeddingStore): Defaults to the shared store.
+    Returns:
+        dict: Counts of embedded and cached products, encoder seconds and sentences per second.
+    """
+    owns_manager = db_manager is None
+    if owns_manager:
+        db_manager = DatabaseManager()
+    stats = {}
+    items = (
+        (product['barcode'], ingredient_text(split_ingredients(product['ingredient_list'])))
+        for chunk in db_manager.iter_products()
+        for product in chunk
+        if product['barcode'] and product['ingredient_list']
+    )
+    try:
+        for _ in embed_batches(items, batch_size, store, stats):
+            pass
+    finally:
+        if owns_manager:
+            db_manager.close_connection()
+    stats['sentences_per_second'] = stats['embedded'] / stats['seconds'] if stats['seconds'] else 0.0
+    print(f"Embedded {stats['embedded']} products ({stats['cached']} already up to date) "
+          f"at {stats['sentences_per_second']:.1f} sentences/sec")
+    return stats
 
 def compute_similarity(embedding1, embedding2):
     """
@@ -40,10 +252,12 @@ def get_ingredients_from_product(barcode, connection):
     Returns:
         list: A list of ingredient names.
     """
+    ingredients = product_cache.get_ingredients(barcode)
+    if ingredients is not None:
+        return ingredients
     product = get_product_by_barcode(connection, barcode)
     if product:
-        ingredient_list = product.get('ingredient_list', '')
-        return [ingredient.strip() for ingredient in ingredient_list.split(',')] if ingredient_list else []
+        return split_ingredients(product.get('ingredient_list', ''))
     print(f"Product with barcode '{barcode}' not found.")
     return []
 
@@ -60,11 +274,8 @@ def compare_product_ingredients_nlp(barcode1, barcode2, connection):
     ingredients1 = get_ingredients_from_product(barcode1, connection)
     ingredients2 = get_ingredients_from_product(barcode2, connection)
     if ingredients1 and ingredients2:
-        combined_ingredients1 = ', '.join(ingredients1)
-        combined_ingredients2 = ', '.join(ingredients2)
-        embedding1 = embed_sentences([combined_ingredients1])[0]
-        embedding2 = embed_sentences([combined_ingredients2])[0]
-        similarity_score = compute_similarity(embedding1, embedding2)
+        embeddings = get_product_embeddings([(barcode1, ingredients1), (barcode2, ingredients2)])
+        similarity_score = compute_similarity(embeddings[barcode1], embeddings[barcode2])
         set1 = set(ingredients1)
         set2 = set(ingredients2)
         common_ingredients = list(set1.intersection(set2))
@@ -84,6 +295,63 @@ def compare_product_ingredients_nlp(barcode1, barcode2, connection):
     else:
         return {'error': 'One or both products not found or have no ingredients'}
 
+def search_similar_embeddings(query, k=10, store=None, exclude=None, nprobe=None, exact=None, search=None):
+    """
+    Find the stored products whose embeddings are most similar to query.
+    Parameters:
+        query (np.ndarray): The query embedding.
+        k (int): Number of products to return.
+        store (EmbeddingStore): Defaults to the shared store.
+        exclude (str): A barcode to leave out (e.g. the query product itself).
+        nprobe (int), exact (bool): Recall/latency controls, see VectorSearch.search.
+        search (VectorSearch): Defaults to the shared search of the embedding namespace; pass
+            one alongside a custom store so the two do not share an index file.
+    Returns:
+        list: (barcode, cosine similarity) tuples, best first.
+    """
+    namespace = embedding_namespace()
+    if store is None:
+        store = get_embedding_store(namespace)
+    if search is None:
+        search = get_vector_search(namespace)
+    barcodes, vectors = store.matrix()
+    extra = 1 if exclude is not None else 0
+    rows, scores = search.search(query, vectors, k + extra, nprobe=nprobe, exact=exact, store=store)
+    results = [(barcodes[row], float(score)) for row, score in zip(rows, scores) if barcodes[row] != exclude]
+    return results[:k]
+
+def get_similar_products(ingredients, limit=10, db_manager=None):
+    """
+    Find catalog products whose ingredients resemble an ingredient list.
+    By default the list is embedded and matched against the stored product embeddings;
+    with NLP_CONFIG['similar_products'] = 'minhash', candidates come from the MinHash/LSH
+    index and are re-ranked with exact set similarity instead.
+    Parameters:
+        ingredients (list): A list of ingredient names.
+        limit (int): Maximum number of products to return.
+        db_manager (DatabaseManager): Defaults to a new DatabaseManager, closed afterwards.
+    Returns:
+        list: (product name, similarity score) tuples, most similar first.
+    """
+    if not ingredients:
+        return []
+    owns_manager = db_manager is None
+    if owns_manager:
+        db_manager = DatabaseManager()
+    try:
+        if NLP_CONFIG['similar_products'] == 'minhash':
+            return [(product['name'], score) for product, score in find_similar_products(db_manager, ingredients, limit)]
+        query = embed_texts([ingredient_text(ingredients)])[0]
+        results = []
+        for barcode, score in search_similar_embeddings(query, limit):
+            product = db_manager.get_product_by_barcode(barcode)
+            if product:
+                results.append((product['name'], score))
+        return results
+    finally:
+        if owns_manager:
+            db_manager.close_connection()
+
 def main():
     pass
 
@@ -0,0 +1,109 @@
+import threading
+import time
+from collections import OrderedDict
+
+# Defaults for the shared product cache
+PRODUCT_CACHE_CONFIG = {
+    'max_size': 10000,
+    'ttl': 300.0  # seconds
+}
+
+def split_ingredients(ingredient_list):
+    """
+    Split a comma-joined ingredient_list column into a list of ingredient names.
+    Parameters:
+        ingredient_list (str): The ingredient_list value of a product row.
+    Returns:
+        list: The stripped, non-empty ingredient names in label order.
+    """
+    if not ingredient_list:
+        return []
+    return [ingredient.strip() for ingredient in ingredient_list.split(',') if ingredient.strip()]
+
+class ProductCache:
+    """
+    In-process LRU cache of product rows keyed by barcode, with a size bound and a TTL.
+    Each entry also keeps the already-split ingredient list.
+    """
+    def __init__(self, max_size=None, ttl=None):
+        self.max_size = max_size or PRODUCT_CACHE_CONFIG['max_size']
+        self.ttl = ttl if ttl is not None else PRODUCT_CACHE_CONFIG['ttl']
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    def _lookup(self, barcode):
+        entry = self._entries.get(barcode)
+        if entry is None:
+            self.misses += 1
+            return None
+        if self.ttl and time.monotonic() - entry['stored_at'] > self.ttl:
+            del self._entries[barcode]
+            self.misses += 1
+            return None
+        self._entries.move_to_end(barcode)
+        self.hits += 1
+        return entry
+
+    def get(self, barcode):
+        """Return a copy of the cached product row for barcode, or None on a miss."""
+        with self._lock:
+            entry = self._lookup(barcode)
+            return dict(entry['product']) if entry else None
+
+    def get_ingredients(self, barcode):
+        """Return the cached ingredient list for barcode, or None on a miss."""
+        with self._lock:
+            entry = self._lookup(barcode)
+            return list(entry['ingredients']) if entry else None
+
+    def put(self, barcode, product):
+        """Store a product row (and its split ingredient list) under barcode."""
+        if product is None:
+            return
+        entry = {
+            'product': dict(product),
+            'ingredients': split_ingredients(product.get('ingredient_list')),
+            'stored_at': time.monotonic()
+        }
+        with self._lock:
+            self._entries[barcode] = entry
+            self._entries.move_to_end(barcode)
+            while len(self._entries) > self.max_size:
+                self._entries.popitem(last=False)
+
+    def invalidate(self, barcode):
+        """Drop the entry for barcode, if any."""
+        with self._lock:
+            self._entries.pop(barcode, None)
+
+    def clear(self):
+        """Drop every entry; the hit/miss counters are kept."""
+        with self._lock:
+            self._entries.clear()
+
+    def reset_stats(self):
+        """Reset the hit/miss counters."""
+        with self._lock:
+            self.hits = 0
+            self.misses = 0
+
+    def stats(self):
+        """
+        Report cache counters.
+        Returns:
+            dict: size, max_size, hits, misses and hit_rate.
+        """
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                'size': len(self._entries),
+                'max_size': self.max_size,
+                'hits': self.hits,
+                'misses': self.misses,
+                'hit_rate': self.hits / lookups if lookups else 0.0
+            }
+
+# Shared by DatabaseManager and the module-level lookup helpers
+product_cache = ProductCache()
@@ -1,10 +1,12 @@
 import sys
 import os
+from concurrent.futures import ThreadPoolExecutor
 sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
-import pubchempy as pcp
 from analysis.database import DatabaseManager
-from utils.pubchem_api import get_compound_by_name
-from typing import Dict, Any
+from analysis.product_cache import split_ingredients
+from analysis.ingredient_similarity import position_weight
+from utils.pubchem_api import get_compound_safety, get_ghs_classification
+from typing import Dict, Any, Iterable, List, Optional, Tuple
 import logging
 
 # Set up logging
@@ -18,6 +20,13 @@ SAFETY_THRESHOLDS = {
     'None': 0.0
 }
 
+# Settings for the product safety scorer
+SAFETY_SCORING_CONFIG = {
+    'aggregation': 'worst',  # 'worst', 'mean' or 'position_weighted'
+    'max_workers': 8,        # concurrent ingredient lookups
+    'chunk_size': 1000       # products read per chunk by analyze_products_safety
+}
+
 def get_safety_and_toxicity_info(cid: int) -> Dict[str, Any]:
     """
     Retrieve safety and toxicity information for a compound from PubChem.
@@ -27,13 +36,10 @@ def get_safety_and_toxicity_info(cid: int) -> Dict[str, Any]:
         Dict[str, Any]: A dictionary containing safety and toxicity information.
     """
     try:
-        compound = pcp.Compound.from_cid(cid)
-        safety_info = {
-            'CID': compound.cid,
-            'Toxicity': compound.toxicity or 'Unknown',
-            'Safety': compound.safety or 'Unknown'
-        }
-        return safety_info
+        classification = get_ghs_classification(cid)
+        if classification is None:
+            return {}
+        return dict(classification, CID=cid)
     except Exception as e:
         logging.error(f"Error retrieving safety and toxicity info: {e}")
         return {}
@@ -73,32 +79,168 @@ def display_traffic_light(safety_rating: str) -> None:
     traffic_light = traffic_lights.get(safety_rating, '⚫')
     logging.info(f"Safety Rating: {safety_rating} {traffic_light}")
 
-def analyze_product_safety(barcode: str) -> None:
+def get_safety_rating(ingredient: str) -> str:
+    """
+    Determine the safety rating of a single ingredient.
+    Parameters:
+        ingredient (str): The ingredient name.
+    Returns:
+        str: The safety rating.
+    """
+    return determine_safety_rating(get_compound_safety(ingredient) or {})
+
+def _safe_rating(ingredient: str) -> str:
+    try:
+        return get_safety_rating(ingredient)
+    except Exception as e:
+        logging.error(f"Error rating ingredient '{ingredient}': {e}")
+        return 'None'
+
+def resolve_safety_ratings(ingredients: Iterable[str], max_workers: Optional[int] = None) -> Dict[str, str]:
+    """
+    Rate distinct ingredients concurrently. Lookups go through get_compound_safety, so cached
+    ingredients cost no requests and PubChem traffic stays under the shared rate limit.
+    Parameters:
+        ingredients (Iterable[str]): Ingredient names; duplicates are rated once.
+        max_workers (int): Thread pool size (defaults to SAFETY_SCORING_CONFIG['max_workers']).
+    Returns:
+        Dict[str, str]: The safety rating of every ingredient.
+    """
+    names = list(dict.fromkeys(ingredient for ingredient in ingredients if ingredient))
+    if not names:
+        return {}
+    workers = min(max_workers or SAFETY_SCORING_CONFIG['max_workers'], len(names))
+    with ThreadPoolExecutor(max_workers=workers) as executor:
+        return dict(zip(names, executor.map(_safe_rating, names)))
+
+def rating_for_score(score: Optional[float]) -> str:
+    """Map a numeric safety score to the highest rating whose SAFETY_THRESHOLDS value it reaches."""
+    if score is None:
+        return 'None'
+    for rating, threshold in sorted(SAFETY_THRESHOLDS.items(), key=lambda item: -item[1]):
+        if rating != 'None' and score >= threshold:
+            return rating
+    return 'Low'
+
+def aggregate_safety(ratings: List[str], aggregation: Optional[str] = None) -> Tuple[str, Optional[float]]:
+    """
+    Combine ingredient ratings, in label order, into one product rating.
+    Ingredients rated 'None' (no safety data) are left out.
+    Parameters:
+        ratings (List[str]): The rating of each ingredient in label order.
+        aggregation (str): 'worst' (the least safe ingredient decides), 'mean', or
+            'position_weighted' (a mean that weighs earlier, more concentrated ingredients
+            more); defaults to SAFETY_SCORING_CONFIG['aggregation'].
+    Returns:
+        Tuple[str, Optional[float]]: The product rating and its score (None if no ingredient was rated).
+    """
+    aggregation = aggregation or SAFETY_SCORING_CONFIG['aggregation']
+    scored = [(rank, SAFETY_THRESHOLDS[rating]) for rank, rating in enumerate(ratings) if rating in SAFETY_THRESHOLDS and rating != 'None']
+    if aggregation not in ('worst', 'mean', 'position_weighted'):
+        raise ValueError(f"Unknown safety aggregation: {aggregation}")
+    if not scored:
+        return 'None', None
+    if aggregation == 'worst':
+        score = min(value for _, value in scored)
+    elif aggregation == 'mean':
+        score = sum(value for _, value in scored) / len(scored)
+    else:
+        weights = [position_weight(rank) for rank, _ in scored]
+        score = sum(weight * value for weight, (_, value) in zip(weights, scored)) / sum(weights)
+    return rating_for_score(score), score
+
+def score_product_safety(ingredients: List[str], aggregation: Optional[str] = None,
+                         ratings: Optional[Dict[str, str]] = None) -> Tuple[str, Optional[float]]:
+    """
+    Rate a product from its ingredient list.
+    Parameters:
+        ingredients (List[str]): Ingredient names in label order.
+        aggregation (str): See aggregate_safety.
+        ratings (Dict[str, str]): Ingredient ratings already resolved (e.g. for a whole chunk of
+            products); missing ingredients are resolved concurrently.
+    Returns:
+        Tuple[str, Optional[float]]: The product rating and its score.
+    """
+    ratings = ratings if ratings is not None else {}
+    resolved = resolve_safety_ratings(ingredient for ingredient in ingredients if ingredient not in ratings)
+    return aggregate_safety(
+        [ratings.get(ingredient) or resolved.get(ingredient, 'None') for ingredient in ingredients], aggregation
+    )
+
+def analyze_product_safety(barcode: str, aggregation: Optional[str] = None,
+                           db_manager: Optional[DatabaseManager] = None) -> Optional[str]:
     """
     Analyze the safety of a product based on its ingredients.
+    Each ingredient's identity and hazard data are resolved together through
+    get_compound_safety instead of a full compound fetch followed by a second
+    Compound.from_cid; both answers are cached, so a known ingredient costs no requests.
+    The ingredient ratings are aggregated into one product rating, written with a single UPDATE.
     Parameters:
         barcode (str): The barcode of the product to analyze.
+        aggregation (str): See aggregate_safety.
+        db_manager (DatabaseManager): Defaults to a new DatabaseManager, closed afterwards.
+    Returns:
+        Optional[str]: The product's safety rating, or None if it could not be analyzed.
     """
-    conn = create_connection()
-    if conn:
-        product = get_product_by_barcode(conn, barcode)
-        if product:
-            ingredients = product['ingredient_list'].split(', ')
-            for ingredient in ingredients:
-                info = get_compound_by_name(ingredient)
-                if info:
-                    cid = info.get('CID')
-                    if cid:
-                        safety_info = get_safety_and_toxicity_info(cid)
-                        if safety_info:
-                            safety_rating = determine_safety_rating(safety_info)
-                            update_product_safety_rating(barcode, safety_rating)
-                            display_traffic_light(safety_rating)
-        else:
-            logging.warning(f"No product found with barcode '{barcode}'")
-        close_connection(conn)
-    else:
+    owns_manager = db_manager is None
+    if owns_manager:
+        db_manager = DatabaseManager()
+    if not db_manager.connection and db_manager.pool is None:
         logging.error("Failed to connect to the database")
+        return None
+    try:
+        product = db_manager.get_product_by_barcode(barcode)
+        if not product:
+            logging.warning(f"No product found with barcode '{barcode}'")
+            return None
+        safety_rating, _ = score_product_safety(split_ingredients(product['ingredient_list']), aggregation)
+        db_manager.update_product_safety_rating(barcode, safety_rating)
+        display_traffic_light(safety_rating)
+        return safety_rating
+    finally:
+        if owns_manager:
+            db_manager.close_connection()
+
+def analyze_products_safety(barcodes: Optional[Iterable[str]] = None, aggregation: Optional[str] = None,
+                            db_manager: Optional[DatabaseManager] = None, chunk_size: Optional[int] = None) -> Dict[str, str]:
+    """
+    Rate many products and write every rating in a single transaction.
+    Products are read one chunk at a time; the distinct ingredients of a chunk are resolved
+    concurrently once, so an ingredient shared by many products is looked up once per chunk
+    (and served from the compound cache after that).
+    Parameters:
+        barcodes (Iterable[str]): Products to rate (defaults to the whole catalog).
+        aggregation (str): See aggregate_safety.
+        db_manager (DatabaseManager): Defaults to a new DatabaseManager, closed afterwards.
+        chunk_size (int): Products per chunk (defaults to SAFETY_SCORING_CONFIG['chunk_size']).
+    Returns:
+        Dict[str, str]: The new rating of every product, by barcode.
+    """
+    chunk_size = chunk_size or SAFETY_SCORING_CONFIG['chunk_size']
+    owns_manager = db_manager is None
+    if owns_manager:
+        db_manager = DatabaseManager()
+    try:
+        if barcodes is None:
+            chunks = db_manager.iter_products(chunk_size)
+        else:
+            barcodes = list(dict.fromkeys(barcodes))
+            chunks = (
+                [product for product in map(db_manager.get_product_by_barcode, barcodes[start:start + chunk_size]) if product]
+                for start in range(0, len(barcodes), chunk_size)
+            )
+        product_ratings = {}
+        for products in chunks:
+            ingredient_lists = {product['barcode']: split_ingredients(product['ingredient_list']) for product in products}
+            ratings = resolve_safety_ratings(ingredient for ingredients in ingredient_lists.values() for ingredient in ingredients)
+            for barcode, ingredients in ingredient_lists.items():
+                product_ratings[barcode] = score_product_safety(ingredients, aggregation, ratings)[0]
+        db_manager.update_safety_ratings_bulk(product_ratings.items())
+        logging.info(f"Safety ratings updated for {len(product_ratings)} products")
+        return product_ratings
+    finally:
+        if owns_manager:
+            db_manager.close_connection()
 
 def main():
     """
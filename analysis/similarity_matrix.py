@@ -0,0 +1,336 @@
+import argparse
+import time
+import sys
+import os
+import numpy as np
+from scipy import sparse
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from analysis.database import DatabaseManager
+
+SIMILARITY_MATRIX_CONFIG = {
+    'metric': 'jaccard',  # 'jaccard' or 'weighted_jaccard' (IDF-weighted)
+    'threshold': 0.3,     # pairs scoring below this are dropped
+    'top_k': 50,          # neighbours kept per product (None keeps every pair above the threshold)
+    'chunk_size': 500     # product rows scored per sparse multiplication
+}
+
+def build_ingredient_matrix(index_rows):
+    """
+    Build a binary sparse product x ingredient matrix from ingredient index rows.
+    Parameters:
+        index_rows (iterable): (product_id, ingredient_id, position) rows, e.g. from
+            DatabaseManager.iter_ingredient_index.
+    Returns:
+        tuple: (product_ids, matrix) where product_ids[i] is the product of matrix row i.
+    """
+    product_ids, _, matrix = ingredient_matrix_from_chunks([list(index_rows)])
+    return product_ids, matrix
+
+def ingredient_matrix_from_chunks(index_chunks):
+    """
+    Build the product x ingredient matrix while streaming the ingredient index. Each chunk is
+    reduced to two int32 id arrays as it arrives, so no Python rows are kept for the catalog.
+    Parameters:
+        index_chunks (iterable): Lists of (product_id, ingredient_id, position) rows, e.g.
+            DatabaseManager.iter_ingredient_index().
+    Returns:
+        tuple: (product_ids, ingredient_ids, matrix) with matrix rows and columns in id order.
+    """
+    product_parts = []
+    ingredient_parts = []
+    for chunk in index_chunks:
+        if len(chunk):
+            ids = np.array(chunk, dtype=np.int64)
+            product_parts.append(ids[:, 0].astype(np.int32))
+            ingredient_parts.append(ids[:, 1].astype(np.int32))
+    if not product_parts:
+        return np.empty(0, dtype=np.int64), np.empty(0, dtype=np.int64), sparse.csr_matrix((0, 0))
+    product_ids, row_index = np.unique(np.concatenate(product_parts), return_inverse=True)
+    del product_parts
+    ingredient_ids, column_index = np.unique(np.concatenate(ingredient_parts), return_inverse=True)
+    del ingredient_parts
+    matrix = sparse.csr_matrix(
+        (np.ones(len(row_index)), (row_index.ravel(), column_index.ravel())),
+        shape=(len(product_ids), len(ingredient_ids))
+    )
+    # The index has one row per (product, ingredient), but clamp in case of duplicates
+    matrix.data[:] = 1.0
+    return product_ids, ingredient_ids, matrix
+
+def idf_column_weights(matrix, document_frequency=None, total=None):
+    """
+    Inverse document frequency of every ingredient column: log(1 + N / document frequency).
+    Catalog-wide counts can be passed in when matrix only holds part of the catalog.
+    """
+    if document_frequency is None:
+        document_frequency = matrix.getnnz(axis=0)
+    total = matrix.shape[0] if total is None else total
+    return np.log1p(total / np.maximum(document_frequency, 1))
+
+def _scored_rows(matrix, metric, threshold, chunk_size, rows, column_weights):
+    """
+    Score the given matrix rows against every row, one chunk at a time.
+    Yields:
+        tuple: (rows, columns, scores) arrays of the pairs at or above threshold for one chunk of
+        rows; every pair of a row is in the same chunk as the row.
+    """
+    if metric == 'jaccard':
+        weighted = matrix
+    elif metric == 'weighted_jaccard':
+        if column_weights is None:
+            column_weights = idf_column_weights(matrix)
+        weighted = (matrix @ sparse.diags(column_weights)).tocsr()
+    else:
+        raise ValueError(f"Unknown similarity metric: {metric}")
+    sizes = np.asarray(weighted.sum(axis=1)).ravel()
+    transposed = matrix.T.tocsc()
+    for start in range(0, len(rows), chunk_size):
+        chunk_rows = rows[start:start + chunk_size]
+        common = (weighted[chunk_rows] @ transposed).tocsr()
+        pair_rows = np.repeat(chunk_rows, np.diff(common.indptr))
+        columns = common.indices
+        scores = common.data / (sizes[pair_rows] + sizes[columns] - common.data)
+        keep = (pair_rows != columns) & (scores >= threshold)
+        yield pair_rows[keep], columns[keep], scores[keep]
+
+def _neighbour_ranks(rows, columns, scores):
+    """
+    Sort pairs by row, best score first with ties going to the lower column, and return
+    (order, rank of each pair within its row). Matrix columns follow product id order, so
+    the ranking is the same in any matrix holding the row's neighbours.
+    """
+    order = np.lexsort((columns, -scores, rows))
+    sorted_rows = rows[order]
+    return order, np.arange(len(rows)) - np.searchsorted(sorted_rows, sorted_rows, side='left')
+
+def similar_pairs(product_ids, matrix, metric=None, threshold=None, top_k=None, chunk_size=None,
+                  rows=None, column_weights=None):
+    """
+    Score all product pairs that share at least one ingredient, one chunk of rows at a time.
+    Each chunk is a single sparse product (chunk x ingredients) . (ingredients x products), so
+    peak memory is bounded by chunk_size x catalog size rather than catalog size squared.
+    Parameters:
+        product_ids (numpy.ndarray): Product id of every matrix row.
+        matrix (scipy.sparse.csr_matrix): Binary product x ingredient matrix.
+        metric (str): 'jaccard' or 'weighted_jaccard' (defaults to SIMILARITY_MATRIX_CONFIG['metric']).
+        threshold (float): Minimum score kept (defaults to SIMILARITY_MATRIX_CONFIG['threshold']).
+        top_k (int): Neighbours kept per product (defaults to SIMILARITY_MATRIX_CONFIG['top_k']).
+        chunk_size (int): Rows per chunk (defaults to SIMILARITY_MATRIX_CONFIG['chunk_size']).
+        rows (numpy.ndarray): Only score the pairs of these matrix rows (defaults to every row).
+        column_weights (numpy.ndarray): IDF weights for weighted_jaccard (defaults to the matrix's own).
+    Yields:
+        tuple: (product_id1, product_id2, similarity_score) with product_id1 < product_id2. With
+        top_k, a pair is kept if it is in the top k of either product and may be yielded twice.
+    """
+    metric = metric or SIMILARITY_MATRIX_CONFIG['metric']
+    threshold = SIMILARITY_MATRIX_CONFIG['threshold'] if threshold is None else threshold
+    top_k = SIMILARITY_MATRIX_CONFIG['top_k'] if top_k is None else top_k
+    chunk_size = chunk_size or SIMILARITY_MATRIX_CONFIG['chunk_size']
+    scored_rows = np.arange(matrix.shape[0]) if rows is None else np.asarray(rows, dtype=np.int64)
+    for rows, columns, scores in _scored_rows(matrix, metric, threshold, chunk_size, scored_rows, column_weights):
+        if not top_k and len(scored_rows) == matrix.shape[0]:
+            # Without per-product cut-offs each pair only needs scoring from one side
+            keep = rows < columns
+            rows, columns, scores = rows[keep], columns[keep], scores[keep]
+        if top_k:
+            order, rank = _neighbour_ranks(rows, columns, scores)
+            keep = order[rank < top_k]
+            rows, columns, scores = rows[keep], columns[keep], scores[keep]
+        first = product_ids[np.minimum(rows, columns)]
+        second = product_ids[np.maximum(rows, columns)]
+        yield from zip(first.tolist(), second.tolist(), scores.tolist())
+
+def prefix_ingredient_ids(index_rows, frequencies, total, metric=None, threshold=None):
+    """
+    Prefix filtering for candidate generation. A product y can only reach threshold with x if
+    their shared ingredients carry at least threshold of x's (weighted) size, so y must contain
+    one of x's ingredients outside the longest tail that weighs less than that. Taking the tail
+    from x's most common ingredients leaves a short prefix of rare ones, which keeps ingredients
+    such as water, found in most of the catalog, out of the candidate lookup.
+    Parameters:
+        index_rows (list): (product_id, ingredient_id, position) rows of the products to match.
+        frequencies (dict): {ingredient_id: number of products containing it}.
+        total (int): Number of indexed products.
+        metric, threshold: See similar_pairs.
+    Returns:
+        list: The distinct ingredient ids in any of the products' prefixes.
+    """
+    metric = metric or SIMILARITY_MATRIX_CONFIG['metric']
+    threshold = SIMILARITY_MATRIX_CONFIG['threshold'] if threshold is None else threshold
+    ingredients_by_product = {}
+    for product_id, ingredient_id, _ in index_rows:
+        ingredients_by_product.setdefault(product_id, set()).add(ingredient_id)
+    prefixes = set()
+    for ingredient_ids in ingredients_by_product.values():
+        ingredient_ids = sorted(ingredient_ids, key=lambda ingredient_id: (frequencies.get(ingredient_id, 0), ingredient_id))
+        if metric == 'weighted_jaccard':
+            document_frequency = np.array([frequencies.get(ingredient_id, 0) for ingredient_id in ingredient_ids])
+            weights = idf_column_weights(None, document_frequency, total)
+        else:
+            weights = np.ones(len(ingredient_ids))
+        # Weight from each position to the end; the tail may only weigh less than the bound
+        # (with a small margin so rounding never drops a qualifying pair)
+        tails = np.cumsum(weights[::-1])[::-1]
+        bound = threshold * tails[0] * (1 - 1e-9)
+        prefixes.update(ingredient_ids[:int(np.count_nonzero(tails >= bound))])
+    return sorted(prefixes)
+
+def build_similarity_table(db_manager=None, metric=None, threshold=None, top_k=None, chunk_size=None):
+    """
+    Rebuild product_similarity for the whole catalog from the ingredient index.
+    The matrix is built while the index is streamed, and scored pairs are streamed straight into
+    DatabaseManager.replace_similarity_table, which swaps in a fresh table so pairs from earlier
+    builds that no longer qualify are dropped. The changes logged before the build started are
+    cleared since every product was rescored.
+    Parameters:
+        db_manager (DatabaseManager): Defaults to a new DatabaseManager.
+        metric, threshold, top_k, chunk_size: See similar_pairs.
+    Returns:
+        dict: The insert report plus the number of products scored.
+    """
+    db_manager = db_manager or DatabaseManager()
+    started = time.monotonic()
+    mark = db_manager.similarity_change_mark()
+    product_ids, _, matrix = ingredient_matrix_from_chunks(db_manager.iter_ingredient_index())
+    pairs = similar_pairs(product_ids, matrix, metric, threshold, top_k, chunk_size)
+    report = db_manager.replace_similarity_table(pairs)
+    report['products'] = len(product_ids)
+    if mark is not None:
+        db_manager.clear_similarity_changes(mark)
+    print(f"Similarity table built for {len(product_ids)} products: {report['written']} pairs "
+          f"written in {time.monotonic() - started:.1f}s")
+    return report
+
+def _score_products(db_manager, products, metric, threshold):
+    """
+    Score some products against the whole catalog, loading only their prefix-filtered
+    candidates (see prefix_ingredient_ids) rather than every product sharing an ingredient.
+    Returns:
+        tuple: (product_ids, neighbour_ids, scores) arrays holding every pair of the products
+        at or above threshold.
+    """
+    empty = (np.empty(0, dtype=np.int64), np.empty(0, dtype=np.int64), np.empty(0))
+    index_rows = db_manager.get_ingredient_index_rows(products)
+    if not index_rows:
+        return empty
+    frequencies, total = db_manager.get_ingredient_frequencies(sorted({row[1] for row in index_rows}))
+    prefixes = prefix_ingredient_ids(index_rows, frequencies, total, metric, threshold)
+    candidates = sorted(set(db_manager.get_product_ids_by_ingredients(prefixes)).union(row[0] for row in index_rows))
+    product_ids, ingredient_ids, matrix = ingredient_matrix_from_chunks([db_manager.get_ingredient_index_rows(candidates)])
+    column_weights = None
+    if metric == 'weighted_jaccard':
+        frequencies, total = db_manager.get_ingredient_frequencies(ingredient_ids.tolist())
+        document_frequency = np.array([frequencies.get(ingredient_id, 0) for ingredient_id in ingredient_ids.tolist()])
+        column_weights = idf_column_weights(matrix, document_frequency, total)
+    rows = np.flatnonzero(np.isin(product_ids, products))
+    parts = list(_scored_rows(matrix, metric, threshold, SIMILARITY_MATRIX_CONFIG['chunk_size'], rows, column_weights))
+    if not parts:
+        return empty
+    pair_rows, columns, scores = (np.concatenate(part) for part in zip(*parts))
+    return product_ids[pair_rows], product_ids[columns], scores
+
+def _kept_pairs(db_manager, sources, neighbours, scores, rescored, top_k):
+    """
+    Apply the full build's rule to the pairs of the re-scored products: a pair stays if it
+    ranks in the top k of either product. A neighbour outside rescored has an unchanged list,
+    so its stored k-th neighbour decides whether the pair is in its top k.
+    Returns:
+        list: (product_id1, product_id2, similarity_score) tuples with product_id1 < product_id2.
+    """
+    if top_k:
+        order, rank = _neighbour_ranks(sources, neighbours, scores)
+        keep = np.zeros(len(sources), dtype=bool)
+        keep[order[rank < top_k]] = True
+        # Pairs between two re-scored products are ranked from both rows above
+        outside = np.flatnonzero(~keep & ~np.isin(neighbours, rescored))
+        if len(outside):
+            cutoffs = db_manager.get_neighbour_cutoffs(np.unique(neighbours[outside]).tolist(), top_k)
+            for position in outside.tolist():
+                cutoff = cutoffs.get(int(neighbours[position]))
+                # Scores are stored as FLOAT, so compare at that precision
+                score = np.float32(scores[position])
+                keep[position] = cutoff is None or score > np.float32(cutoff[0]) or (
+                    score == np.float32(cutoff[0]) and sources[position] <= cutoff[1]
+                )
+        sources, neighbours, scores = sources[keep], neighbours[keep], scores[keep]
+    first = np.minimum(sources, neighbours)
+    second = np.maximum(sources, neighbours)
+    return list(zip(first.tolist(), second.tolist(), scores.tolist()))
+
+def update_similarity_table(db_manager=None, metric=None, threshold=None, top_k=None, chunk_size=None):
+    """
+    Bring product_similarity up to date with the products logged in similarity_changes, leaving
+    the table as a full build would. With top_k, a changed product can enter or leave the
+    neighbour lists of products that did not change, so those products (every stored partner
+    of a changed product, and every product now scoring above threshold with one) are
+    re-scored and re-ranked along with it. Their stored pairs are then replaced in one
+    transaction. The log is only cleared up to the changes read at the start, once they are
+    written, so the job can be re-run or interrupted safely. With weighted_jaccard the IDF
+    weights move with every edit, so only re-scored pairs use the current catalog frequencies;
+    a full build brings the rest up to date.
+    Parameters:
+        db_manager (DatabaseManager): Defaults to a new DatabaseManager.
+        metric, threshold, top_k: See similar_pairs.
+        chunk_size (int): Changed products scored and replaced per transaction.
+    Returns:
+        dict: {'products': changed products processed, 'written': pairs written}.
+    """
+    db_manager = db_manager or DatabaseManager()
+    metric = metric or SIMILARITY_MATRIX_CONFIG['metric']
+    threshold = SIMILARITY_MATRIX_CONFIG['threshold'] if threshold is None else threshold
+    top_k = SIMILARITY_MATRIX_CONFIG['top_k'] if top_k is None else top_k
+    chunk_size = chunk_size or SIMILARITY_MATRIX_CONFIG['chunk_size']
+    started = time.monotonic()
+    mark, changed = db_manager.get_similarity_changes()
+    report = {'products': len(changed), 'written': 0}
+    if mark is None:
+        return report
+    pending = set(changed)
+    for start in range(0, len(changed), chunk_size):
+        batch = [product_id for product_id in changed[start:start + chunk_size] if product_id in pending]
+        if not batch:
+            continue
+        edited = set(batch)
+        scored = [_score_products(db_manager, batch, metric, threshold)]
+        affected = set()
+        if top_k:
+            frontier = batch
+            while frontier:
+                affected.update(db_manager.get_similarity_partners(frontier), scored[-1][1].tolist())
+                affected.difference_update(edited)
+                # A changed product from a later batch that is pulled in here has stale stored
+                # pairs, so it is handled as changed now, partners included
+                frontier = sorted(affected & pending)
+                if frontier:
+                    edited.update(frontier)
+                    scored.append(_score_products(db_manager, frontier, metric, threshold))
+            if affected:
+                scored.append(_score_products(db_manager, sorted(affected), metric, threshold))
+        pending.difference_update(edited)
+        sources, neighbours, scores = (np.concatenate(part) for part in zip(*scored))
+        rescored = sorted(edited | affected)
+        pairs = _kept_pairs(db_manager, sources, neighbours, scores, rescored, top_k)
+        report['written'] += db_manager.replace_similarities(rescored, pairs)
+    db_manager.clear_similarity_changes(mark)
+    print(f"Similarity table updated for {len(changed)} changed products: {report['written']} pairs "
+          f"written in {time.monotonic() - started:.1f}s")
+    return report
+
+def main():
+    """Command-line entry point: rebuild or incrementally update product_similarity."""
+    parser = argparse.ArgumentParser(description="Compute ingredient similarity for all product pairs.")
+    parser.add_argument('--incremental', action='store_true', help="only rescore products changed since the last run")
+    parser.add_argument('--metric', choices=['jaccard', 'weighted_jaccard'], default=SIMILARITY_MATRIX_CONFIG['metric'])
+    parser.add_argument('--threshold', type=float, default=SIMILARITY_MATRIX_CONFIG['threshold'])
+    parser.add_argument('--top-k', type=int, default=SIMILARITY_MATRIX_CONFIG['top_k'], help="0 keeps every pair above the threshold")
+    parser.add_argument('--chunk-size', type=int, default=SIMILARITY_MATRIX_CONFIG['chunk_size'])
+    args = parser.parse_args()
+    db_manager = DatabaseManager()
+    try:
+        build = update_similarity_table if args.incremental else build_similarity_table
+        build(db_manager, args.metric, args.threshold, args.top_k, args.chunk_size)
+    finally:
+        db_manager.close_connection()
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,249 @@
+import os
+import threading
+import time
+import numpy as np
+from sklearn.cluster import MiniBatchKMeans
+
+VECTOR_SEARCH_CONFIG = {
+    'exact_max_rows': 50000,  # catalogs up to this size are searched exactly
+    'chunk_size': 8192,       # rows per matrix multiplication in exact search
+    'nlist': None,            # IVF cells (defaults to about 4 * sqrt(rows))
+    'nprobe': 8,              # cells scanned per query; raise for recall, lower for latency
+    'rebuild_ratio': 0.1,     # rebuild once rows added or re-assigned since the build exceed this share
+    'path': os.path.join(os.path.expanduser('~'), '.skincare', 'ivf_index.npz')
+}
+
+def normalize_rows(vectors):
+    """Return float32 copies of vectors scaled to unit length (zero rows stay zero)."""
+    vectors = np.asarray(vectors, dtype=np.float32)
+    if vectors.ndim == 1:
+        vectors = vectors[np.newaxis, :]
+    norms = np.linalg.norm(vectors, axis=1, keepdims=True)
+    return vectors / np.where(norms == 0, 1, norms)
+
+def _top_k(scores, rows, k):
+    """Pick the k best (row, score) pairs from parallel arrays, best first."""
+    if len(scores) > k:
+        best = np.argpartition(-scores, k - 1)[:k]
+        scores, rows = scores[best], rows[best]
+    order = np.argsort(-scores, kind='stable')
+    return rows[order], scores[order]
+
+def exact_top_k(query, vectors, k, start=0, chunk_size=None):
+    """
+    Cosine top-k over vectors[start:] by normalized float32 matrix multiplication, one
+    chunk of rows at a time, so memory stays bounded by chunk_size regardless of catalog size.
+    Parameters:
+        query (numpy.ndarray): The query embedding.
+        vectors (numpy.ndarray): The embedding matrix (may be a memory-mapped view).
+        k (int): Number of results.
+        start (int): First row to search.
+        chunk_size (int): Rows per chunk (defaults to VECTOR_SEARCH_CONFIG['chunk_size']).
+    Returns:
+        tuple: (rows, scores) arrays, best first.
+    """
+    chunk_size = chunk_size or VECTOR_SEARCH_CONFIG['chunk_size']
+    query = normalize_rows(query)[0]
+    best_rows = np.empty(0, dtype=np.int64)
+    best_scores = np.empty(0, dtype=np.float32)
+    for chunk_start in range(start, len(vectors), chunk_size):
+        chunk = normalize_rows(vectors[chunk_start:chunk_start + chunk_size])
+        scores = chunk @ query
+        rows = np.arange(chunk_start, chunk_start + len(chunk))
+        best_rows, best_scores = _top_k(np.concatenate([best_scores, scores]), np.concatenate([best_rows, rows]), k)
+    return best_rows, best_scores
+
+class IVFIndex:
+    """
+    Inverted-file ANN index: rows are clustered with k-means and a query only scans the
+    nprobe cells whose centroids are closest to it. The index stores row numbers, not
+    vectors; vectors are read from the embedding matrix at query time.
+    """
+    def __init__(self, centroids, order, offsets, rows, generation=0, reassigned=0):
+        """
+        Parameters:
+            centroids (numpy.ndarray): Unit-length cell centroids.
+            order (numpy.ndarray): Row numbers grouped by cell.
+            offsets (numpy.ndarray): Cell i holds order[offsets[i]:offsets[i + 1]].
+            rows (int): Number of matrix rows covered by the index.
+            generation (int): Store generation the cell assignments reflect.
+            reassigned (int): Rows moved between cells since the centroids were fitted.
+        """
+        self.centroids = centroids
+        self.order = order
+        self.offsets = offsets
+        self.rows = rows
+        self.generation = generation
+        self.reassigned = reassigned
+
+    @classmethod
+    def build(cls, vectors, nlist=None, seed=0):
+        """Cluster every row of vectors and build the inverted lists."""
+        started = time.monotonic()
+        rows = len(vectors)
+        nlist = min(nlist or VECTOR_SEARCH_CONFIG['nlist'] or max(1, int(4 * np.sqrt(rows))), rows)
+        chunk_size = VECTOR_SEARCH_CONFIG['chunk_size']
+        kmeans = MiniBatchKMeans(n_clusters=nlist, random_state=seed, batch_size=max(1024, nlist), n_init=3)
+        for chunk_start in range(0, rows, chunk_size):
+            chunk = normalize_rows(vectors[chunk_start:chunk_start + chunk_size])
+            if len(chunk) >= nlist:
+                kmeans.partial_fit(chunk)
+        if not hasattr(kmeans, 'cluster_centers_'):
+            kmeans.fit(normalize_rows(vectors))
+        centroids = normalize_rows(kmeans.cluster_centers_)
+        assignments = np.empty(rows, dtype=np.int64)
+        for chunk_start in range(0, rows, chunk_size):
+            chunk = normalize_rows(vectors[chunk_start:chunk_start + chunk_size])
+            assignments[chunk_start:chunk_start + len(chunk)] = np.argmax(chunk @ centroids.T, axis=1)
+        order = np.argsort(assignments, kind='stable')
+        offsets = np.searchsorted(assignments[order], np.arange(nlist + 1))
+        print(f"IVF index built over {rows} rows with {nlist} cells in {time.monotonic() - started:.1f}s")
+        return cls(centroids, order, offsets, rows)
+
+    def reassign(self, vectors, rows, generation):
+        """
+        Return a copy of the index with rows that were overwritten in place moved to the cells
+        of their current vectors. The index itself is left untouched, so searches already
+        running on it never see half-updated inverted lists.
+        Parameters:
+            vectors (numpy.ndarray): The embedding matrix.
+            rows (numpy.ndarray): Indexed row numbers whose vectors changed.
+            generation (int): Store generation the new index reflects.
+        Returns:
+            IVFIndex: The updated index.
+        """
+        rows = rows[rows < self.rows]
+        if not len(rows):
+            return IVFIndex(self.centroids, self.order, self.offsets, self.rows, generation, self.reassigned)
+        assignments = np.empty(self.rows, dtype=np.int64)
+        assignments[self.order] = np.repeat(np.arange(len(self.centroids)), np.diff(self.offsets))
+        assignments[rows] = np.argmax(normalize_rows(vectors[rows]) @ self.centroids.T, axis=1)
+        order = np.argsort(assignments, kind='stable')
+        offsets = np.searchsorted(assignments[order], np.arange(len(self.centroids) + 1))
+        return IVFIndex(self.centroids, order, offsets, self.rows, generation, self.reassigned + len(rows))
+
+    def search(self, query, vectors, k, nprobe=None):
+        """
+        Approximate cosine top-k over the indexed rows of vectors.
+        Returns:
+            tuple: (rows, scores) arrays, best first.
+        """
+        nprobe = min(nprobe or VECTOR_SEARCH_CONFIG['nprobe'], len(self.centroids))
+        query = normalize_rows(query)[0]
+        cells = np.argpartition(-(self.centroids @ query), nprobe - 1)[:nprobe]
+        rows = np.concatenate([self.order[self.offsets[cell]:self.offsets[cell + 1]] for cell in cells])
+        if not len(rows):
+            return rows, np.empty(0, dtype=np.float32)
+        rows.sort()  # sequential reads from the memory-mapped matrix
+        scores = normalize_rows(vectors[rows]) @ query
+        return _top_k(scores, rows, k)
+
+    def save(self, path):
+        os.makedirs(os.path.dirname(path) or '.', exist_ok=True)
+        temporary_path = path + '.tmp.npz'
+        np.savez(
+            temporary_path, centroids=self.centroids, order=self.order, offsets=self.offsets,
+            rows=self.rows, generation=self.generation, reassigned=self.reassigned
+        )
+        os.replace(temporary_path, path)
+
+    @classmethod
+    def load(cls, path):
+        """Load a saved index, or return None if there is none."""
+        if not os.path.exists(path):
+            return None
+        with np.load(path) as data:
+            if 'generation' not in data:
+                return None  # saved without a store generation; its assignments cannot be trusted
+            return cls(
+                data['centroids'], data['order'], data['offsets'], int(data['rows']),
+                int(data['generation']), int(data['reassigned'])
+            )
+
+class VectorSearch:
+    """
+    Top-k cosine search over an embedding matrix. Small catalogs are searched exactly; larger
+    ones go through a persisted IVFIndex, with rows added since it was built searched exactly.
+    One VectorSearch (and index file) serves one embedding store.
+    """
+    def __init__(self, path=None):
+        self.path = path or VECTOR_SEARCH_CONFIG['path']
+        self._index = None
+        self._lock = threading.Lock()
+
+    def _ivf(self, vectors, store=None):
+        """
+        Return an IVF index for vectors, loading or (re)building it as needed. When the store
+        the vectors came from is given, rows it has overwritten since the index last saw it are
+        re-assigned to their current cells.
+        """
+        with self._lock:
+            if self._index is None:
+                self._index = IVFIndex.load(self.path)
+            index = self._index
+            generation = store.generation if store is not None else index.generation if index is not None else 0
+            if index is not None and (
+                index.rows > len(vectors) or index.centroids.shape[1] != vectors.shape[1] or index.generation > generation
+            ):
+                index = None  # the store was rebuilt or the encoder changed
+            if index is not None and index.generation < generation:
+                # Searches that already hold the old index keep using it; new ones get the copy
+                index = index.reassign(vectors, store.rows_written_since(index.generation), generation)
+                index.save(self.path)
+            if index is None or max(len(vectors) - index.rows, index.reassigned) > VECTOR_SEARCH_CONFIG['rebuild_ratio'] * index.rows:
+                index = IVFIndex.build(vectors)
+                index.generation = generation
+                index.save(self.path)
+            self._index = index
+            return index
+
+    def search(self, query, vectors, k, nprobe=None, exact=None, store=None):
+        """
+        Find the k rows of vectors most similar to query.
+        Parameters:
+            query (numpy.ndarray): The query embedding.
+            vectors (numpy.ndarray): The embedding matrix.
+            k (int): Number of results.
+            nprobe (int): IVF cells scanned (defaults to VECTOR_SEARCH_CONFIG['nprobe']).
+            exact (bool): Force exact (True) or approximate (False) search; by default exact
+                search is used up to VECTOR_SEARCH_CONFIG['exact_max_rows'] rows.
+            store (EmbeddingStore): The store vectors came from, so in-place overwrites reach the index.
+        Returns:
+            tuple: (rows, scores) arrays, best first.
+        """
+        if not len(vectors) or k <= 0:
+            return np.empty(0, dtype=np.int64), np.empty(0, dtype=np.float32)
+        if exact is None:
+            exact = len(vectors) <= VECTOR_SEARCH_CONFIG['exact_max_rows']
+        if exact:
+            return exact_top_k(query, vectors, k)
+        index = self._ivf(vectors, store)
+        rows, scores = index.search(query, vectors, k, nprobe)
+        if index.rows < len(vectors):
+            tail_rows, tail_scores = exact_top_k(query, vectors, k, start=index.rows)
+            rows, scores = _top_k(np.concatenate([scores, tail_scores]), np.concatenate([rows, tail_rows]), k)
+        return rows, scores
+
+_shared_searches = {}
+_shared_search_lock = threading.Lock()
+
+def get_vector_search(namespace=None):
+    """
+    Return the process-wide VectorSearch for an embedding store namespace.
+    Parameters:
+        namespace (str): The namespace of the store being searched (see get_embedding_store);
+            each namespace keeps its index file in its own subdirectory.
+    """
+    with _shared_search_lock:
+        search = _shared_searches.get(namespace)
+        if search is None:
+            path = VECTOR_SEARCH_CONFIG['path']
+            if namespace is not None:
+                path = os.path.join(os.path.dirname(path), namespace, os.path.basename(path))
+            search = _shared_searches[namespace] = VectorSearch(path)
+        return search
+
+def set_vector_search(search, namespace=None):
+    """Replace a process-wide VectorSearch (e.g. with one using a temporary index path)."""
+    with _shared_search_lock:
+        _shared_searches[namespace] = search
@@ -31,7 +31,7 @@ class DisplayResults:
     def populate_tree(self):
         for ingredient in self.ingredients:
             try:
-                ingredient_info = get_ingredient_info(ingredient)
+                ingredient_info = get_ingredient_info(ingredient, slim=True)
                 safety_rating = get_safety_rating(ingredient)
                 self.tree.insert("", "end", values=(ingredient, ingredient_info, safety_rating))
             except Exception as e:
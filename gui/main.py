@@ -12,8 +12,9 @@ from datetime import datetime
 import requests
 from analysis.database import DatabaseManager
 from analysis.ingredient_analysis import get_ingredient_info
+from analysis.ingredient_normalizer import extract_ingredients
 from analysis.safety_ratings import determine_safety_rating
-from analysis.nlp_similarity import compare_product_ingredients_nlp
+from analysis.nlp_similarity import compare_product_ingredients_nlp, warm_up_encoder, NLP_CONFIG
 from utils.pubchem_api import get_compound_by_name
 
 pytesseract.pytesseract.tesseract_cmd = r'C:\Program Files\Tesseract-OCR\tesseract.exe'
@@ -27,6 +28,10 @@ class SkincareApp:
         # Database Manager
         self.db_manager = DatabaseManager()
         self.db_manager.create_table()
+
+        # The sentence encoder is loaded on first use unless warm-up is enabled
+        if NLP_CONFIG['warm_up']:
+            warm_up_encoder()
         
         # Video capture setup
         self.video_source = 0
@@ -188,7 +193,7 @@ class SkincareApp:
             return
 
         detected_text = self.text_output.get(1.0, tk.END).strip()
-        ingredients = detected_text.split('\n')
+        ingredients = extract_ingredients(detected_text)
 
         self.results_tree.delete(*self.results_tree.get_children())
         self.display_results(ingredients)
@@ -196,7 +201,7 @@ class SkincareApp:
     def display_results(self, ingredients):
         for ingredient in ingredients:
             try:
-                ingredient_info = get_ingredient_info(ingredient)
+                ingredient_info = get_ingredient_info(ingredient, slim=True)
                 safety_rating = determine_safety_rating(ingredient_info)
                 self.results_tree.insert("", "end", values=(ingredient, ingredient_info, safety_rating))
             except Exception as e:
@@ -5,11 +5,12 @@ import os
 sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
 import mysql.connector
 from mysql.connector import Error
-from difflib import SequenceMatcher
-import requests
 import pubchempy as pcp
 from analysis.database import DatabaseManager
-from utils.pubchem_api import get_compound_by_name
+from analysis.ingredient_similarity import compare_ingredients, ingredient_overlap
+from utils.pubchem_api import get_compound_by_name, PUBCHEM_REST_URL
+from utils.rate_limiter import pubchem_limiter
+from utils.http_client import get_http_client
 
 class SkincareApp:
     def __init__(self, root):
@@ -80,7 +81,9 @@ class SkincareApp:
 
     def get_ingredient_info(self, ingredient):
         try:
-            response = requests.get(f"https://pubchem.ncbi.nlm.nih.gov/rest/pug/compound/name/{ingredient}/JSON")
+            response = get_http_client().post(
+                f"{PUBCHEM_REST_URL}/compound/name/JSON", data={'name': ingredient}, limiter=pubchem_limiter
+            )
             if response.status_code == 200:
                 data = response.json()
                 return data
@@ -148,16 +151,10 @@ class SkincareApp:
             self.compare_result_text.insert(tk.END, f"Comparison Result:\n{result}")
 
     def get_ingredients_from_product(self, barcode):
-        product = self.db_manager.get_product_by_barcode(barcode)
-        if product:
-            ingredient_list = product.get('ingredient_list', '')
-            return [ingredient.strip() for ingredient in ingredient_list.split(',')] if ingredient_list else []
-        return []
+        return self.db_manager.get_ingredients_by_barcode(barcode)
 
     def compare_ingredients(self, ingredients1, ingredients2):
-        combined_ingredients1 = ' '.join(ingredients1)
-        combined_ingredients2 = ' '.join(ingredients2)
-        return SequenceMatcher(None, combined_ingredients1, combined_ingredients2).ratio()
+        return compare_ingredients(ingredients1, ingredients2)
 
     def compare_product_ingredients(self, barcode1, barcode2):
         ingredients1 = self.get_ingredients_from_product(barcode1)
@@ -166,11 +163,7 @@ class SkincareApp:
         if ingredients1 and ingredients2:
             similarity_score = self.compare_ingredients(ingredients1, ingredients2)
 
-            set1 = set(ingredients1)
-            set2 = set(ingredients2)
-            common_ingredients = list(set1.intersection(set2))
-            unique_ingredients1 = list(set1.difference(set2))
-            unique_ingredients2 = list(set2.difference(set1))
+            common_ingredients, unique_ingredients1, unique_ingredients2 = ingredient_overlap(ingredients1, ingredients2)
 
             return {
                 'barcode1': barcode1,
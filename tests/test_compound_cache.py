@@ -0,0 +1,57 @@
+import unittest
+from unittest.mock import patch
+import sys
+import os
+import tempfile
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from utils.compound_cache import CompoundCache, MISS
+
+class TestCompoundCache(unittest.TestCase):
+
+    def setUp(self):
+        self.tmpdir = tempfile.TemporaryDirectory()
+        self.cache = CompoundCache(os.path.join(self.tmpdir.name, 'cache.sqlite3'), ttl=100, negative_ttl=10)
+
+    def tearDown(self):
+        self.cache.close()
+        self.tmpdir.cleanup()
+
+    def test_names_are_normalized(self):
+        self.assertIs(self.cache.get('name', 'Glycerin'), MISS)
+        self.cache.put('name', 'Glycerin', {'CID': 753})
+        self.assertEqual(self.cache.get('name', '  GLYCERIN '), {'CID': 753})
+        self.cache.put('cid', '753', {'CID': 753})
+        self.assertEqual(self.cache.get('cid', 753), {'CID': 753})
+
+    @patch('utils.compound_cache.time.time')
+    def test_negative_entries_use_shorter_ttl(self, mock_time):
+        mock_time.return_value = 1000.0
+        self.cache.put('name', 'Unobtainium', None)
+        self.cache.put('name', 'Water', {'CID': 962})
+        mock_time.return_value = 1005.0
+        self.assertIsNone(self.cache.get('name', 'Unobtainium'))
+        mock_time.return_value = 1050.0
+        self.assertIs(self.cache.get('name', 'Unobtainium'), MISS)
+        self.assertEqual(self.cache.get('name', 'Water'), {'CID': 962})
+        self.assertEqual(self.cache.purge_expired(), 1)
+
+    def test_stats(self):
+        self.cache.put('name', 'Water', {'CID': 962})
+        self.cache.put('pug_json', 'Unobtainium', None)
+        self.cache.get('name', 'water')
+        self.cache.get('name', 'aqua')
+        stats = self.cache.stats()
+        self.assertEqual(stats['entries'], 2)
+        self.assertEqual(stats['negative_entries'], 1)
+        self.assertEqual(stats['namespaces'], {'name': 1, 'pug_json': 1})
+        self.assertEqual(stats['hit_rate'], 0.5)
+        self.assertGreater(stats['bytes'], 0)
+
+    def test_persists_across_instances(self):
+        self.cache.put('name', 'Water', {'CID': 962})
+        reopened = CompoundCache(self.cache.path)
+        self.assertEqual(reopened.get('name', 'Water'), {'CID': 962})
+        reopened.close()
+
+if __name__ == '__main__':
+    unittest.main()
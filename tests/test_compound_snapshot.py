@@ -0,0 +1,98 @@
+import unittest
+from unittest.mock import patch
+import sys
+import os
+import gzip
+import tempfile
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from utils import pubchem_api
+from analysis import ingredient_analysis
+from utils.compound_snapshot import CompoundSnapshot, build_snapshot
+from utils.compound_cache import MISS
+
+PROPERTIES = """CID\tIUPACName\tMolecularFormula\tMolecularWeight\tInChIKey\tCanonicalSMILES
+962\toxidane\tH2O\t18.015\tXLYOFNOQVPJJNP-UHFFFAOYSA-N\tO
+753\tpropane-1,2,3-triol\tC3H8O3\t92.09\tPEDCQBHIVMGVHV-UHFFFAOYSA-N\tC(C(CO)O)O
+"""
+
+SYNONYMS = "962\tWater\n962\tAqua\n962\tDihydrogen oxide\n753\tGlycerin\n753\tGlycerol\n"
+
+class TestCompoundSnapshot(unittest.TestCase):
+
+    def setUp(self):
+        self.tmpdir = tempfile.TemporaryDirectory()
+        properties_path = os.path.join(self.tmpdir.name, 'properties.tsv')
+        synonyms_path = os.path.join(self.tmpdir.name, 'CID-Synonym-filtered.gz')
+        self.snapshot_path = os.path.join(self.tmpdir.name, 'compounds.snapshot')
+        with open(properties_path, 'w') as file:
+            file.write(PROPERTIES)
+        with gzip.open(synonyms_path, 'wt') as file:
+            file.write(SYNONYMS)
+        self.stats = build_snapshot(properties_path, self.snapshot_path, synonyms_path, max_synonyms=2)
+        self.snapshot = CompoundSnapshot(self.snapshot_path)
+
+    def tearDown(self):
+        self.snapshot.close()
+        self.tmpdir.cleanup()
+
+    def test_lookup_by_cid_and_name(self):
+        self.assertEqual(self.stats, {'compounds': 2, 'names': 6})
+        self.assertEqual(self.snapshot.get_by_cid(753)['Molecular_Formula'], 'C3H8O3')
+        self.assertEqual(self.snapshot.get_by_name('  AQUA ')['CID'], 962)
+        self.assertEqual(self.snapshot.get_by_name('Glycerol')['Synonyms'], ['Glycerin', 'Glycerol'])
+        # Only the first max_synonyms synonyms are kept
+        self.assertIsNone(self.snapshot.get_by_name('Dihydrogen oxide'))
+        self.assertIsNone(self.snapshot.get_by_cid(1))
+
+    def test_rejects_other_files(self):
+        other = os.path.join(self.tmpdir.name, 'other.bin')
+        with open(other, 'wb') as file:
+            file.write(b'\0' * 64)
+        with self.assertRaises(ValueError):
+            CompoundSnapshot(other)
+
+    @patch('utils.pubchem_api._get_compounds')
+    def test_pubchem_api_serves_from_snapshot(self, mock_get_compounds):
+        pubchem_api.use_compound_snapshot(self.snapshot_path)
+        try:
+            self.assertEqual(pubchem_api.get_compound_by_name('Water')['CID'], 962)
+            self.assertEqual(pubchem_api.get_compound_by_cid(753)['Name'], 'propane-1,2,3-triol')
+            mock_get_compounds.assert_not_called()
+        finally:
+            pubchem_api.use_compound_snapshot(None)
+
+    def test_swapping_the_snapshot_leaves_readers_working(self):
+        pubchem_api.use_compound_snapshot(self.snapshot_path)
+        reader = pubchem_api._snapshot
+        pubchem_api.use_compound_snapshot(None)
+        # A lookup that read the old snapshot before the swap can still finish
+        self.assertEqual(reader.get_by_name('Glycerol')['CID'], 753)
+        self.assertIsNone(pubchem_api.get_snapshot_compound('Glycerol'))
+        self.assertIsNone(pubchem_api.get_snapshot_compound_by_cid(753))
+
+    @patch('analysis.ingredient_analysis.get_http_client')
+    def test_ingredient_info_serves_from_snapshot(self, mock_get_http_client):
+        pubchem_api.use_compound_snapshot(self.snapshot_path)
+        try:
+            slim = ingredient_analysis.get_ingredient_info('Aqua', slim=True)
+            self.assertEqual(slim['CID'], 962)
+            self.assertEqual(slim['Molecular_Formula'], 'H2O')
+            self.assertEqual(ingredient_analysis.analyze_ingredient('Glycerin')['CID'], 753)
+            mock_get_http_client.assert_not_called()
+        finally:
+            pubchem_api.use_compound_snapshot(None)
+
+    @patch('analysis.ingredient_analysis.get_compound_cache')
+    @patch('analysis.ingredient_analysis.get_http_client')
+    def test_ingredient_info_sends_names_in_the_body(self, mock_get_http_client, mock_get_cache):
+        mock_get_cache.return_value.get.return_value = MISS
+        response = mock_get_http_client.return_value.post.return_value
+        response.status_code = 404
+        self.assertEqual(ingredient_analysis.get_ingredient_info('C12/15 Alkyl Benzoate'), {'error': 'Not Found'})
+        (url,), kwargs = mock_get_http_client.return_value.post.call_args
+        self.assertEqual(url, f'{pubchem_api.PUBCHEM_REST_URL}/compound/name/JSON')
+        self.assertEqual(kwargs['data'], {'name': 'C12/15 Alkyl Benzoate'})
+        self.assertIs(kwargs['limiter'], ingredient_analysis.pubchem_limiter)
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,87 @@
+import unittest
+from unittest.mock import patch
+import sys
+import os
+import json
+import tempfile
+import threading
+import time
+from urllib.parse import parse_qs
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from analysis import ingredient_analysis
+from utils.compound_cache import CompoundCache, set_compound_cache
+from utils.rate_limiter import TokenBucket
+
+class StubPubChemHandler(BaseHTTPRequestHandler):
+    """Answers POST /compound/name/JSON like PUG REST; 'Slow' hangs and 'Missing' is a 404."""
+    requests_seen = []
+
+    def do_POST(self):
+        body = self.rfile.read(int(self.headers.get('Content-Length', 0))).decode()
+        name = parse_qs(body)['name'][0]
+        StubPubChemHandler.requests_seen.append(name)
+        if name == 'Slow':
+            time.sleep(1.0)
+        if name == 'Missing':
+            self.send_response(404)
+            self.end_headers()
+            return
+        body = json.dumps({'PC_Compounds': [{'name': name}]}).encode()
+        self.send_response(200)
+        self.send_header('Content-Type', 'application/json')
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, *args):
+        pass
+
+class TestConcurrentAnalysis(unittest.TestCase):
+
+    @classmethod
+    def setUpClass(cls):
+        cls.server = ThreadingHTTPServer(('127.0.0.1', 0), StubPubChemHandler)
+        cls.server.daemon_threads = True
+        threading.Thread(target=cls.server.serve_forever, daemon=True).start()
+        cls.base_url = f'http://127.0.0.1:{cls.server.server_address[1]}'
+
+    @classmethod
+    def tearDownClass(cls):
+        cls.server.shutdown()
+        cls.server.server_close()
+
+    def setUp(self):
+        StubPubChemHandler.requests_seen = []
+        self.tmpdir = tempfile.TemporaryDirectory()
+        self.cache = CompoundCache(os.path.join(self.tmpdir.name, 'cache.sqlite3'))
+        set_compound_cache(self.cache)
+
+    def tearDown(self):
+        set_compound_cache(None)
+        self.cache.close()
+        self.tmpdir.cleanup()
+
+    def test_results_keep_input_order_and_isolate_failures(self):
+        ingredients = ['Water', 'Slow', 'Glycerin', 'Missing', 'Niacinamide']
+        with patch.object(ingredient_analysis, 'PUBCHEM_REST_URL', self.base_url), \
+                patch.object(ingredient_analysis, 'pubchem_limiter', TokenBucket(100, 100)):
+            results = ingredient_analysis.analyze_ingredient_list(ingredients, max_workers=5, timeout=0.3)
+        self.assertEqual(list(results), ingredients)
+        self.assertEqual(results['Slow'], {'error': 'Timeout'})
+        self.assertEqual(results['Missing'], {'error': 'Not Found'})
+        self.assertEqual(results['Glycerin'], {'PC_Compounds': [{'name': 'Glycerin'}]})
+
+    def test_rate_limit_is_respected(self):
+        ingredients = [f'Ingredient{i}' for i in range(6)]
+        with patch.object(ingredient_analysis, 'PUBCHEM_REST_URL', self.base_url), \
+                patch.object(ingredient_analysis, 'pubchem_limiter', TokenBucket(10, 2)):
+            start = time.monotonic()
+            ingredient_analysis.analyze_ingredient_list(ingredients, max_workers=6)
+            elapsed = time.monotonic() - start
+        # 2 requests from the burst, the remaining 4 at 10/s
+        self.assertGreaterEqual(elapsed, 0.35)
+        self.assertEqual(sorted(StubPubChemHandler.requests_seen), sorted(ingredients))
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,256 @@
+import unittest
+from unittest.mock import patch, MagicMock
+import gc
+import threading
+import sys
+import os
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from mysql.connector import Error
+from mysql.connector.errors import PoolError
+from analysis.database import DatabaseManager, POOL_CONFIG
+from analysis.product_cache import ProductCache
+
+class TestDatabaseManager(unittest.TestCase):
+
+    def setUp(self):
+        self.connection = MagicMock()
+        self.cursor = self.connection.cursor.return_value
+        with patch('analysis.database.mysql.connector.connect', return_value=self.connection):
+            self.db_manager = DatabaseManager(cache=ProductCache())
+
+    def test_insert_products_bulk_commits_once_per_chunk(self):
+        products = [(f'{i:012d}', f'Product {i}', 'Water, Glycerin', 'High') for i in range(5)]
+        report = self.db_manager.insert_products_bulk(products, chunk_size=2)
+        self.assertEqual(report, {'written': 5, 'errors': []})
+        self.assertEqual(self.cursor.executemany.call_count, 3)
+        self.assertEqual(self.connection.commit.call_count, 3)
+        self.assertIn('ON DUPLICATE KEY UPDATE', self.cursor.executemany.call_args[0][0])
+
+    def test_insert_products_bulk_reports_failing_rows(self):
+        self.cursor.executemany.side_effect = Error('Data too long')
+        def execute(query, row):
+            if row[0] == 'bad':
+                raise Error('Data too long')
+        self.cursor.execute.side_effect = execute
+        products = [
+            {'barcode': 'good', 'name': 'A', 'ingredient_list': 'Water', 'safety_rating': 'High'},
+            ('bad', 'B', 'Water', 'High'),
+            ('short',),
+        ]
+        report = self.db_manager.insert_products_bulk(products)
+        self.assertEqual(report['written'], 1)
+        self.assertEqual([error['index'] for error in report['errors']], [2, 1])
+        self.connection.rollback.assert_called_once()
+
+    def test_insert_similarities_bulk(self):
+        report = self.db_manager.insert_similarities_bulk(iter([(1, 2, 0.5), (1, 3, 0.25)]))
+        self.assertEqual(report['written'], 2)
+        rows = self.cursor.executemany.call_args[0][1]
+        self.assertEqual(rows, [(1, 2, 0.5), (1, 3, 0.25)])
+
+    def test_replace_similarity_table_swaps_in_a_staging_table(self):
+        report = self.db_manager.replace_similarity_table(iter([(1, 2, 0.5)]))
+        self.assertEqual(report['written'], 1)
+        self.assertIn('product_similarity_staging', self.cursor.executemany.call_args[0][0])
+        queries = [call[0][0] for call in self.cursor.execute.call_args_list]
+        self.assertIn('CREATE TABLE IF NOT EXISTS product_similarity_staging', queries[1])
+        self.assertTrue(queries[-2].startswith('RENAME TABLE product_similarity TO product_similarity_old'))
+        self.assertEqual(queries[-1], 'DROP TABLE product_similarity_old')
+
+    def test_get_product_by_barcode_reads_through_cache(self):
+        self.cursor.fetchone.return_value = {'id': 1, 'barcode': '1', 'ingredient_list': 'Water, Glycerin'}
+        self.db_manager.get_product_by_barcode('1')
+        self.assertEqual(self.db_manager.get_ingredients_by_barcode('1'), ['Water', 'Glycerin'])
+        self.assertEqual(self.cursor.execute.call_count, 1)
+        self.db_manager.update_product_safety_rating('1', 'High')
+        self.db_manager.get_product_by_barcode('1')
+        self.assertEqual(self.cursor.execute.call_count, 3)
+        self.assertEqual(self.db_manager.cache.stats()['hits'], 1)
+
+    def test_insert_product_indexes_canonical_ingredients(self):
+        self.cursor.lastrowid = 7
+        self.cursor.fetchall.return_value = [(1, 'water'), (2, 'glycerin')]
+        # Aqua is a synonym of Water, as in the similarity engine and the MinHash signatures
+        self.db_manager.insert_product('1', 'Cream', 'Water,  GLYCERIN , Aqua', 'High')
+        interned = self.cursor.executemany.call_args_list[0][0][1]
+        self.assertEqual(sorted(interned), [('glycerin',), ('water',)])
+        index_rows = self.cursor.executemany.call_args_list[-1][0][1]
+        self.assertEqual(index_rows, [(7, 1, 0), (7, 2, 1)])
+
+    def test_ingredient_names_are_migrated_to_a_binary_collation(self):
+        self.cursor.fetchall.return_value = []
+        self.cursor.fetchone.return_value = ('utf8mb4_0900_ai_ci',)
+        self.db_manager.migrate_ingredient_index()
+        queries = [call[0][0] for call in self.cursor.execute.call_args_list]
+        self.assertTrue(any('MODIFY name' in query and 'utf8mb4_bin' in query for query in queries))
+
+    def test_insert_product_rolls_back_partial_writes(self):
+        self.cursor.lastrowid = 7
+        self.cursor.executemany.side_effect = Error('Deadlock found')
+        self.db_manager.insert_product('1', 'Cream', 'Water', 'High')
+        self.connection.rollback.assert_called_once()
+        self.connection.commit.assert_not_called()
+
+    def test_insert_product_rolls_back_and_raises_on_unmapped_ingredient(self):
+        self.cursor.lastrowid = 7
+        # The database returns another spelling than the one interned
+        self.cursor.fetchall.return_value = [(1, 'glycérine')]
+        with self.assertRaises(ValueError):
+            self.db_manager.insert_product('1', 'Cream', 'Glycerine', 'High')
+        self.connection.rollback.assert_called_once()
+        self.connection.commit.assert_not_called()
+
+    def test_find_products_by_ingredients(self):
+        self.cursor.fetchall.return_value = []
+        self.db_manager.find_products_by_ingredients(any_of=['Niacinamide'], all_of=['Aqua', 'Glycerin'], none_of=['Alcohol'])
+        query, params = self.cursor.execute.call_args[0]
+        self.assertIn('NOT IN', query)
+        self.assertEqual(params, ['niacinamide', 'glycerin', 'water', 2, 'ethanol'])
+
+    def test_find_products_without_usable_filters_returns_nothing(self):
+        self.assertEqual(self.db_manager.find_products_by_ingredients(any_of=['  ']), [])
+        self.assertEqual(self.db_manager.find_products_by_ingredients(all_of=[','], none_of=['']), [])
+        self.assertEqual(self.db_manager.find_products_by_ingredients(), [])
+        self.cursor.execute.assert_not_called()
+
+    def test_insert_product_indexes_overlong_ingredient_names(self):
+        self.cursor.lastrowid = 7
+        long_name = 'x' * 254 + ' extract of something'
+        self.cursor.fetchall.return_value = [(1, 'water'), (2, 'x' * 254)]
+        self.db_manager.insert_product('1', 'Cream', f'Water, {long_name}', 'High')
+        interned = self.cursor.executemany.call_args_list[0][0][1]
+        self.assertEqual(sorted(interned), [('water',), ('x' * 254,)])
+        self.assertEqual(self.cursor.executemany.call_args_list[-1][0][1], [(7, 1, 0), (7, 2, 1)])
+        self.connection.commit.assert_called_once()
+
+    def test_iter_ingredient_index_pages_by_product_id(self):
+        self.cursor.fetchall.side_effect = [[(1,), (4,)], [(1, 10, 0), (4, 11, 0)], []]
+        chunks = list(self.db_manager.iter_ingredient_index(chunk_size=2))
+        self.assertEqual(chunks, [[(1, 10, 0), (4, 11, 0)]])
+        self.assertEqual(self.cursor.execute.call_args_list[1][0][1], (1, 4))
+        self.assertEqual(self.cursor.execute.call_args_list[2][0][1], (4, 2))
+
+    def test_insert_product_logs_similarity_change(self):
+        self.cursor.lastrowid = 7
+        self.cursor.fetchall.return_value = [(1, 'water')]
+        self.db_manager.insert_product('1', 'Cream', 'Water', 'High')
+        logged = [call[0] for call in self.cursor.executemany.call_args_list if 'similarity_changes' in call[0][0]]
+        self.assertEqual(logged[0][1], [(7,)])
+
+    def test_replace_similarities_deletes_stale_pairs_in_one_transaction(self):
+        written = self.db_manager.replace_similarities([3, 8], iter([(1, 3, 0.5), (3, 8, 0.4)]))
+        self.assertEqual(written, 2)
+        query, params = self.cursor.execute.call_args[0]
+        self.assertIn('DELETE FROM product_similarity', query)
+        self.assertEqual(params, [3, 8, 3, 8])
+        self.assertEqual(self.cursor.executemany.call_args[0][1], [(1, 3, 0.5), (3, 8, 0.4)])
+        self.connection.commit.assert_called_once()
+
+    def test_get_neighbour_cutoffs_reads_every_list_in_one_query(self):
+        self.cursor.fetchall.return_value = [(5, 9, 0.7), (5, 3, 0.9), (5, 4, 0.7), (6, 9, 0.8)]
+        cutoffs = self.db_manager.get_neighbour_cutoffs([5, 6], 2)
+        self.assertEqual(cutoffs, {5: (0.7, 4)})
+        self.assertEqual(self.cursor.execute.call_count, 1)
+        query, params = self.cursor.execute.call_args[0]
+        self.assertIn('UNION ALL', query)
+        self.assertEqual(params, [5, 6, 5, 6])
+        self.assertEqual(self.db_manager.get_similarity_partners([5, 6]), [3, 4, 9])
+
+    def test_update_safety_ratings_bulk_commits_once(self):
+        self.db_manager.cache.put('1', {'barcode': '1'})
+        written = self.db_manager.update_safety_ratings_bulk(iter([('1', 'High'), ('2', 'Low'), ('3', 'None')]), chunk_size=2)
+        self.assertEqual(written, 3)
+        self.assertEqual(self.cursor.executemany.call_count, 2)
+        self.assertEqual(self.cursor.executemany.call_args_list[0][0][1], [('High', '1'), ('Low', '2')])
+        self.connection.commit.assert_called_once()
+        self.assertIsNone(self.db_manager.cache.get('1'))
+
+    def test_create_table_adds_missing_unique_pair_key(self):
+        self.cursor.fetchall.return_value = [('PRIMARY',)]
+        self.cursor.rowcount = 3
+        self.db_manager.create_table()
+        queries = [call[0][0] for call in self.cursor.execute.call_args_list]
+        delete_index = next(i for i, query in enumerate(queries) if 'DELETE older FROM product_similarity' in query)
+        self.assertIn('ADD UNIQUE KEY uq_similarity_pair', queries[delete_index + 1])
+
+    def test_create_table_keeps_existing_unique_pair_key(self):
+        self.cursor.fetchall.return_value = [('uq_similarity_pair',), ('idx_similarity_top',), ('idx_similarity_top_reverse',)]
+        self.cursor.fetchone.return_value = ('utf8mb4_bin',)
+        self.db_manager.create_table()
+        queries = [call[0][0] for call in self.cursor.execute.call_args_list]
+        self.assertFalse(any('DELETE older' in query or 'ALTER TABLE' in query for query in queries))
+
+class TestConnectionModes(unittest.TestCase):
+
+    def pooled_manager(self, per_thread=False):
+        self.pool = MagicMock()
+        self.pool.get_connection.side_effect = lambda: MagicMock()
+        with patch('analysis.database.pooling.MySQLConnectionPool', return_value=self.pool):
+            return DatabaseManager(pooled=True, per_thread=per_thread)
+
+    def test_single_connection_is_only_pinged_when_idle(self):
+        connection = MagicMock()
+        with patch('analysis.database.mysql.connector.connect', return_value=connection):
+            db_manager = DatabaseManager()
+        with db_manager.borrow_connection():
+            pass
+        connection.ping.assert_not_called()
+        db_manager._last_used -= POOL_CONFIG['ping_idle']
+        with db_manager.borrow_connection() as borrowed:
+            self.assertIs(borrowed, connection)
+        connection.ping.assert_called_once()
+        self.assertTrue(connection.ping.call_args[1]['reconnect'])
+
+    def test_pooled_connections_are_returned_after_each_call(self):
+        db_manager = self.pooled_manager()
+        with db_manager.borrow_connection() as first:
+            pass
+        with db_manager.borrow_connection() as second:
+            pass
+        self.assertIsNot(first, second)
+        first.close.assert_called_once()
+        # The pool checks liveness on checkout, so no extra ping is sent
+        first.ping.assert_not_called()
+
+    def test_checkout_waits_for_a_released_connection(self):
+        db_manager = self.pooled_manager()
+        connection = MagicMock()
+        self.pool.get_connection.side_effect = [PoolError('exhausted'), connection]
+        with db_manager.borrow_connection() as borrowed:
+            self.assertIs(borrowed, connection)
+        self.pool.get_connection.side_effect = PoolError('exhausted')
+        with patch.dict(POOL_CONFIG, {'checkout_timeout': 0.1}):
+            with self.assertRaises(PoolError):
+                with db_manager.borrow_connection():
+                    pass
+
+    def test_per_thread_connection_is_kept_and_released(self):
+        db_manager = self.pooled_manager(per_thread=True)
+        with db_manager.borrow_connection() as first:
+            pass
+        with db_manager.borrow_connection() as second:
+            pass
+        self.assertIs(first, second)
+        first.close.assert_not_called()
+        db_manager.release_thread_connection()
+        first.close.assert_called_once()
+        db_manager.release_thread_connection()
+        first.close.assert_called_once()
+
+    def test_per_thread_connection_is_returned_when_thread_exits(self):
+        db_manager = self.pooled_manager(per_thread=True)
+        borrowed = []
+
+        def work():
+            with db_manager.borrow_connection() as connection:
+                borrowed.append(connection)
+
+        thread = threading.Thread(target=work)
+        thread.start()
+        thread.join()
+        del thread
+        gc.collect()
+        borrowed[0].close.assert_called_once()
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,66 @@
+import unittest
+from unittest.mock import patch
+import sys
+import os
+import tempfile
+import numpy as np
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from analysis import embedding_store
+from analysis.embedding_store import EmbeddingStore
+
+class TestEmbeddingStore(unittest.TestCase):
+
+    def setUp(self):
+        self.tmpdir = tempfile.TemporaryDirectory()
+
+    def tearDown(self):
+        self.tmpdir.cleanup()
+
+    def test_vectors_survive_reopen_and_growth(self):
+        store = EmbeddingStore(self.tmpdir.name)
+        with patch.dict(embedding_store.EMBEDDING_STORE_CONFIG, {'grow_by': 2}):
+            store.put_many((f'b{i}', f'text {i}', np.full(4, i)) for i in range(5))
+        store.close()
+        reopened = EmbeddingStore(self.tmpdir.name)
+        self.assertEqual(len(reopened), 5)
+        self.assertEqual(reopened.dim, 4)
+        np.testing.assert_array_equal(reopened.get('b3'), np.full(4, 3, dtype=np.float32))
+        barcodes, vectors = reopened.matrix()
+        self.assertEqual(barcodes, ['b0', 'b1', 'b2', 'b3', 'b4'])
+        self.assertEqual(vectors.shape, (5, 4))
+        with self.assertRaises(ValueError):
+            EmbeddingStore(self.tmpdir.name, dim=8)
+
+    def test_writes_append_to_the_index_log(self):
+        store = EmbeddingStore(self.tmpdir.name)
+        store.put_many((f'b{i}', f'text {i}', np.full(3, i)) for i in range(4))
+        index_path = os.path.join(self.tmpdir.name, 'index.json')
+        log_path = os.path.join(self.tmpdir.name, 'index.log')
+        snapshot = os.stat(index_path).st_mtime_ns
+        store.put('b4', 'text 4', np.full(3, 4))
+        store.put('b1', 'text 1 changed', np.full(3, 9))
+        self.assertEqual(os.stat(index_path).st_mtime_ns, snapshot)
+        with open(log_path, 'r', encoding='utf-8') as file:
+            self.assertEqual(len(file.readlines()), 2)
+        # Reopening without close() replays the log over the snapshot
+        reopened = EmbeddingStore(self.tmpdir.name)
+        self.assertEqual(len(reopened), 5)
+        np.testing.assert_array_equal(reopened.get('b1', 'text 1 changed'), np.full(3, 9, dtype=np.float32))
+        np.testing.assert_array_equal(reopened.get('b4'), np.full(3, 4, dtype=np.float32))
+        reopened.close()
+        self.assertFalse(os.path.exists(log_path))
+
+    def test_changed_text_is_stale(self):
+        store = EmbeddingStore(self.tmpdir.name)
+        store.put('b1', 'Water, Glycerin', np.ones(3))
+        self.assertIsNotNone(store.get('b1', 'Water, Glycerin'))
+        self.assertIsNone(store.get('b1', 'Water, Glycerin, Urea'))
+        self.assertEqual(store.stale([('b1', 'Water, Glycerin'), ('b2', 'Water')]), [('b2', 'Water')])
+        # Re-embedding overwrites the product's existing row
+        store.put('b1', 'Water, Glycerin, Urea', np.zeros(3))
+        self.assertEqual(len(store), 1)
+        with self.assertRaises(ValueError):
+            store.put('b2', 'Water', np.ones(5))
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,80 @@
+import unittest
+from unittest.mock import patch
+import sys
+import os
+import tempfile
+import time
+import numpy as np
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from analysis import nlp_similarity
+from analysis.encoders import HashedNgramEncoder, SentenceEncoder, get_sentence_encoder, register_encoder
+
+class TestEncoders(unittest.TestCase):
+
+    def setUp(self):
+        self.tmpdir = tempfile.TemporaryDirectory()
+        self.idf_path = os.path.join(self.tmpdir.name, 'idf.npy')
+
+    def tearDown(self):
+        self.tmpdir.cleanup()
+
+    def test_hashed_tfidf_similarity_tolerates_ocr_noise(self):
+        encoder = HashedNgramEncoder(idf_path=self.idf_path)
+        vectors = encoder.encode([
+            'Water, Glycerin, Niacinamide, Phenoxyethanol',
+            'Water, Glycenn, Niacinamlde, Phenoxyethanol',
+            'Dimethicone, Zinc Oxide, Octocrylene',
+        ])
+        self.assertEqual(vectors.shape, (3, 256))
+        np.testing.assert_allclose(np.linalg.norm(vectors, axis=1), 1.0, rtol=1e-5)
+        self.assertGreater(vectors[0] @ vectors[1], vectors[0] @ vectors[2] + 0.3)
+        # Deterministic across instances (same seed, no fitted state)
+        np.testing.assert_allclose(HashedNgramEncoder(idf_path=self.idf_path).encode(['Water'])[0], encoder.encode(['Water'])[0])
+
+    def test_fit_idf_is_persisted(self):
+        corpus = ['Water, Glycerin', 'Water, Urea', 'Water, Squalane']
+        encoder = HashedNgramEncoder(idf_path=self.idf_path, components=0, n_features=2 ** 12).fit(corpus)
+        self.assertTrue(os.path.exists(self.idf_path))
+        reloaded = HashedNgramEncoder(idf_path=self.idf_path, components=0, n_features=2 ** 12)
+        np.testing.assert_array_equal(reloaded.idf, encoder.idf)
+        self.assertEqual(reloaded.encode(['Water']).shape, (1, 2 ** 12))
+
+    def test_refitting_idf_changes_the_store_namespace(self):
+        encoder = HashedNgramEncoder(idf_path=self.idf_path, n_features=2 ** 12)
+        unfitted = encoder.fingerprint
+        self.assertEqual(HashedNgramEncoder(idf_path=self.idf_path, n_features=2 ** 12).fingerprint, unfitted)
+        self.assertNotEqual(HashedNgramEncoder(idf_path=self.idf_path, n_features=2 ** 12, seed=1).fingerprint, unfitted)
+        encoder.fit(['Water, Glycerin', 'Water, Urea'])
+        fitted = encoder.fingerprint
+        self.assertNotEqual(fitted, unfitted)
+        # A later process loading the saved weights lands in the same namespace
+        self.assertEqual(HashedNgramEncoder(idf_path=self.idf_path, n_features=2 ** 12).fingerprint, fitted)
+        encoder.fit(['Water, Squalane', 'Dimethicone'])
+        self.assertNotEqual(encoder.fingerprint, fitted)
+        register_encoder('refit', lambda: encoder)
+        with patch.dict(nlp_similarity.NLP_CONFIG, {'encoder': 'refit'}):
+            self.assertEqual(nlp_similarity.embedding_namespace(), f'refit-{encoder.fingerprint}')
+
+    def test_throughput(self):
+        encoder = HashedNgramEncoder(idf_path=self.idf_path)
+        sentences = [f'Water, Glycerin, Extract {i}, Niacinamide, Panthenol, Tocopherol' for i in range(2000)]
+        started = time.monotonic()
+        encoder.encode(sentences)
+        self.assertLess(time.monotonic() - started, 2.0)
+
+    def test_backend_is_selected_by_configuration(self):
+        class FixedEncoder(SentenceEncoder):
+            name = 'fixed'
+
+            def encode(self, sentences):
+                return np.ones((len(sentences), 2))
+
+        register_encoder('fixed', FixedEncoder)
+        self.assertIs(get_sentence_encoder('fixed'), get_sentence_encoder('fixed'))
+        with patch.dict(nlp_similarity.NLP_CONFIG, {'encoder': 'fixed'}):
+            self.assertEqual(nlp_similarity.embed_sentences(['a', 'b']).shape, (2, 2))
+        with self.assertRaises(ValueError):
+            get_sentence_encoder('missing')
+
+if __name__ == '__main__':
+    unittest.main()
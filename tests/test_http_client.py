@@ -0,0 +1,98 @@
+import unittest
+from unittest.mock import patch
+import sys
+import os
+import threading
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from utils.http_client import HTTPClient, RateLimitTimeout
+from utils.rate_limiter import TokenBucket
+
+class FlakyHandler(BaseHTTPRequestHandler):
+    """Fails the first `failures` requests with `status`, then answers 200."""
+    protocol_version = 'HTTP/1.1'
+    failures = 0
+    status = 503
+    calls = 0
+    client_ports = set()
+
+    def do_GET(self):
+        FlakyHandler.calls += 1
+        FlakyHandler.client_ports.add(self.client_address[1])
+        status = FlakyHandler.status if FlakyHandler.calls <= FlakyHandler.failures else 200
+        body = b'{"ok": true}'
+        self.send_response(status)
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, *args):
+        pass
+
+class TestHTTPClient(unittest.TestCase):
+
+    @classmethod
+    def setUpClass(cls):
+        cls.server = ThreadingHTTPServer(('127.0.0.1', 0), FlakyHandler)
+        cls.server.daemon_threads = True
+        threading.Thread(target=cls.server.serve_forever, daemon=True).start()
+        cls.url = f'http://127.0.0.1:{cls.server.server_address[1]}/'
+
+    @classmethod
+    def tearDownClass(cls):
+        cls.server.shutdown()
+        cls.server.server_close()
+
+    def setUp(self):
+        FlakyHandler.calls = 0
+        FlakyHandler.client_ports = set()
+        self.client = HTTPClient(backoff_factor=0.01)
+
+    def tearDown(self):
+        self.client.close()
+
+    def test_retries_transient_errors(self):
+        FlakyHandler.failures, FlakyHandler.status = 2, 503
+        response = self.client.get(self.url)
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(FlakyHandler.calls, 3)
+
+    def test_gives_up_after_max_retries(self):
+        FlakyHandler.failures, FlakyHandler.status = 10, 429
+        response = self.client.get(self.url)
+        self.assertEqual(response.status_code, 429)
+        self.assertEqual(FlakyHandler.calls, self.client.config['max_retries'] + 1)
+
+    def test_does_not_retry_client_errors(self):
+        FlakyHandler.failures, FlakyHandler.status = 1, 404
+        self.assertEqual(self.client.get(self.url).status_code, 404)
+        self.assertEqual(FlakyHandler.calls, 1)
+
+    def test_connections_are_kept_alive(self):
+        FlakyHandler.failures = 0
+        for _ in range(3):
+            self.client.get(self.url)
+        self.assertEqual(len(FlakyHandler.client_ports), 1)
+
+    def test_limiter_token_is_taken_for_every_attempt(self):
+        FlakyHandler.failures, FlakyHandler.status = 2, 429
+        limiter = TokenBucket(1000, 10)
+        with patch.object(limiter, 'acquire', wraps=limiter.acquire) as mock_acquire:
+            self.client.get(self.url, limiter=limiter)
+        self.assertEqual(FlakyHandler.calls, 3)
+        self.assertEqual(mock_acquire.call_count, 3)
+
+    def test_limiter_timeout_stops_retries(self):
+        FlakyHandler.failures, FlakyHandler.status = 10, 503
+        limiter = TokenBucket(0.01, 1)
+        with self.assertRaises(RateLimitTimeout):
+            self.client.get(self.url, limiter=limiter, limiter_timeout=0.05)
+        self.assertEqual(FlakyHandler.calls, 1)
+
+    @patch('utils.http_client.random.uniform', side_effect=lambda low, high: high)
+    def test_backoff_is_exponential_and_capped(self, mock_uniform):
+        client = HTTPClient(backoff_factor=1.0, backoff_max=5.0)
+        self.assertEqual([client.backoff(attempt) for attempt in range(4)], [1.0, 2.0, 4.0, 5.0])
+
+if __name__ == '__main__':
+    unittest.main()
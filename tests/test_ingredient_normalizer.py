@@ -0,0 +1,73 @@
+import unittest
+import sys
+import os
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from analysis.ingredient_normalizer import (
+    IngredientDictionary, edit_distance, extract_ingredients, get_ingredient_dictionary, normalize_for_matching
+)
+
+class TestIngredientNormalizer(unittest.TestCase):
+
+    def setUp(self):
+        self.dictionary = IngredientDictionary({
+            'Water': ['Aqua', 'Eau'],
+            'Ethanol': ['Alcohol'],
+            'Cetyl Alcohol': [],
+            'Glycerin': ['Glycerol']
+        })
+
+    def test_normalize_for_matching(self):
+        self.assertEqual(normalize_for_matching('AQUA (WATER),\n Glycerin'), 'aqua|water|glycerin')
+        self.assertEqual(normalize_for_matching('Alcohol  Denat.'), 'alcohol denat')
+
+    def test_synonyms_collapse_to_one_canonical_name(self):
+        for text in ('AQUA (WATER)', 'Aqua/Water/Eau', 'water'):
+            self.assertEqual(extract_ingredients(text, self.dictionary), ['Water'])
+        self.assertEqual(self.dictionary.canonicalize(' GLYCEROL '), 'Glycerin')
+        self.assertIsNone(self.dictionary.canonicalize('Unobtainium'))
+
+    def test_longest_match_on_word_boundaries(self):
+        text = 'Aqua, Cetyl Alcohol, Alcohol, Glycerolate'
+        self.assertEqual(
+            self.dictionary.extract(text),
+            [('Water', 1.0), ('Cetyl Alcohol', 1.0), ('Ethanol', 1.0), ('glycerolate', 0.0)]
+        )
+
+    def test_known_names_inside_longer_ingredients_are_not_split_out(self):
+        dictionary = IngredientDictionary({'Sodium Hyaluronate': [], 'Hyaluronic Acid': [], 'Water': ['Aqua']})
+        self.assertEqual(
+            extract_ingredients('Aqua, Sodium Hyaluronate Crosspolymer, Sodium Hyaluronate', dictionary),
+            ['Water', 'sodium hyaluronate crosspolymer', 'Sodium Hyaluronate']
+        )
+        self.assertEqual(extract_ingredients('Hydrolyzed Hyaluronic Acid', dictionary), ['hydrolyzed hyaluronic acid'])
+        self.assertEqual(extract_ingredients('Ingredients: Aqua, Hyaluronic Acid', dictionary), ['Water', 'Hyaluronic Acid'])
+        self.assertEqual(extract_ingredients('INGREDIENTS\nAqua', dictionary), ['Water'])
+
+    def test_unknown_fragments_are_kept_in_label_order(self):
+        text = 'Water\nMystery Extract; Glycerin\nx\nWATER'
+        self.assertEqual(extract_ingredients(text, self.dictionary), ['Water', 'mystery extract', 'Glycerin'])
+
+    def test_edit_distance(self):
+        self.assertEqual(edit_distance('glycenn', 'glycerin', 2), 2)
+        self.assertEqual(edit_distance('acetaet', 'acetate', 2), 1)
+        self.assertEqual(edit_distance('water', 'glycerin', 2), 3)
+
+    def test_fuzzy_correction_with_confidence(self):
+        canonical, confidence = self.dictionary.correct('Glycenn')
+        self.assertEqual(canonical, 'Glycerin')
+        self.assertAlmostEqual(confidence, 0.75)
+        self.assertEqual(self.dictionary.correct('Watr'), ('Water', 0.8))
+        self.assertIsNone(self.dictionary.correct('Niacinamide'))
+        # Low-confidence corrections stay as they are so they still go to the network
+        self.assertEqual(extract_ingredients('Glycenn, Watre', self.dictionary), ['Glycerin', 'Water'])
+        self.assertEqual(extract_ingredients('Glycenn', self.dictionary, min_confidence=0.9), ['glycenn'])
+
+    def test_bundled_dictionary_loads(self):
+        dictionary = get_ingredient_dictionary()
+        self.assertEqual(dictionary.canonicalize('Parfum'), 'Fragrance')
+        self.assertEqual(extract_ingredients('Butyrospermum Parkii (Shea) Butter, 1,2-Hexanediol'),
+                         ['Shea Butter', '1,2-Hexanediol'])
+        self.assertEqual(extract_ingredients('Tocopheryl Acetale\nNiacinamlde'), ['Tocopheryl Acetate', 'Niacinamide'])
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,47 @@
+import unittest
+import sys
+import os
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from analysis.ingredient_similarity import (
+    IngredientProfile, compare_ingredients, idf_weights, ingredient_overlap,
+    jaccard, position_weighted_overlap, weighted_jaccard
+)
+
+class TestIngredientSimilarity(unittest.TestCase):
+
+    def setUp(self):
+        self.serum = IngredientProfile(['Water', 'Glycerin', 'Niacinamide', 'Phenoxyethanol'])
+        self.toner = IngredientProfile(['Aqua', 'Niacinamide', 'Glycerin', 'Fragrance'])
+
+    def test_jaccard_uses_canonical_ids(self):
+        # Aqua and Water are the same ingredient
+        self.assertAlmostEqual(jaccard(self.serum, self.toner), 3 / 5)
+        self.assertEqual(jaccard(self.serum, self.serum), 1.0)
+        self.assertEqual(jaccard(self.serum, IngredientProfile([])), 0.0)
+
+    def test_position_weighted_overlap_rewards_leading_ingredients(self):
+        reordered = IngredientProfile(['Phenoxyethanol', 'Niacinamide', 'Glycerin', 'Water'])
+        self.assertEqual(position_weighted_overlap(self.serum, self.serum), 1.0)
+        self.assertLess(position_weighted_overlap(self.serum, reordered), 1.0)
+        shares_lead = IngredientProfile(['Water', 'Glycerin', 'Squalane', 'Urea'])
+        shares_tail = IngredientProfile(['Squalane', 'Urea', 'Niacinamide', 'Phenoxyethanol'])
+        self.assertGreater(position_weighted_overlap(self.serum, shares_lead),
+                           position_weighted_overlap(self.serum, shares_tail))
+
+    def test_weighted_jaccard_discounts_common_ingredients(self):
+        other = IngredientProfile(['Water', 'Squalane'])
+        weights = idf_weights([self.serum, self.toner, other])
+        self.assertLess(weighted_jaccard(self.serum, other, weights), weighted_jaccard(self.serum, other, {}))
+        self.assertAlmostEqual(weighted_jaccard(self.serum, self.toner, {}), jaccard(self.serum, self.toner))
+
+    def test_compare_ingredients_and_overlap(self):
+        self.assertEqual(compare_ingredients(['Water', 'Glycerin'], ['aqua', 'GLYCERIN'], metric='jaccard'), 1.0)
+        with self.assertRaises(ValueError):
+            compare_ingredients(['Water'], ['Water'], metric='cosine')
+        common, unique1, unique2 = ingredient_overlap(['Water', 'Glycerin', 'Urea'], ['Aqua', 'Urea', 'Squalane'])
+        self.assertEqual(common, ['Water', 'Urea'])
+        self.assertEqual(unique1, ['Glycerin'])
+        self.assertEqual(unique2, ['Squalane'])
+
+if __name__ == '__main__':
+    unittest.main()
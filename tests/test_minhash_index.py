@@ -0,0 +1,78 @@
+import unittest
+from unittest.mock import patch, MagicMock
+import sys
+import os
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from analysis import minhash_index
+from analysis.minhash_index import (
+    MinHashLSH, estimated_jaccard, find_similar_products, minhash_signature,
+    signature_from_bytes, signature_to_bytes
+)
+from analysis.database import DatabaseManager
+
+BASE = ['Water', 'Glycerin', 'Niacinamide', 'Panthenol', 'Allantoin', 'Squalane',
+        'Tocopherol', 'Phenoxyethanol', 'Xanthan Gum', 'Citric Acid']
+
+class TestMinHashIndex(unittest.TestCase):
+
+    def setUp(self):
+        minhash_index.set_product_index(None)
+
+    def tearDown(self):
+        minhash_index.set_product_index(None)
+
+    def test_signature_estimates_jaccard(self):
+        signature = minhash_signature(BASE)
+        self.assertEqual(len(signature), minhash_index.MINHASH_CONFIG['num_perm'])
+        # Synonyms and case do not change the signature
+        self.assertTrue((minhash_signature(['AQUA'] + BASE[1:]) == signature).all())
+        half = minhash_signature(BASE[:5] + ['Urea', 'Caffeine', 'Retinol', 'Carbomer', 'Linalool'])
+        self.assertAlmostEqual(estimated_jaccard(signature, half), 5 / 15, delta=0.15)
+        self.assertIsNone(minhash_signature([' ', '']))
+        self.assertTrue((signature_from_bytes(signature_to_bytes(signature)) == signature).all())
+        self.assertIsNone(signature_from_bytes(b'\0' * 8))
+
+    def test_lsh_returns_near_duplicates_only(self):
+        index = MinHashLSH()
+        index.insert(1, minhash_signature(BASE))
+        index.insert(2, minhash_signature(BASE[:-1] + ['Sodium Benzoate']))
+        index.insert(3, minhash_signature(['Dimethicone', 'Cyclopentasiloxane', 'Zinc Oxide', 'Octocrylene']))
+        candidates = index.query(minhash_signature(BASE))
+        self.assertEqual(candidates[0], 1)
+        self.assertIn(2, candidates)
+        self.assertNotIn(3, candidates)
+        index.remove(1)
+        self.assertNotIn(1, index.query(minhash_signature(BASE)))
+        self.assertEqual(len(index), 2)
+
+    def test_find_similar_products_reranks_candidates(self):
+        products = {
+            1: {'id': 1, 'name': 'Exact', 'ingredient_list': ', '.join(BASE)},
+            2: {'id': 2, 'name': 'Close', 'ingredient_list': ', '.join(BASE[:-1] + ['Sodium Benzoate'])},
+        }
+        db_manager = MagicMock()
+        db_manager.iter_minhash_signatures.return_value = iter([[
+            (product_id, signature_to_bytes(minhash_signature(product['ingredient_list'].split(', '))))
+            for product_id, product in products.items()
+        ]])
+        db_manager.get_products_by_ids.side_effect = lambda ids: [products[product_id] for product_id in ids]
+        results = find_similar_products(db_manager, BASE[:-1] + ['Sodium Benzoate'])
+        self.assertEqual([product['name'] for product, _ in results], ['Close', 'Exact'])
+        self.assertAlmostEqual(results[0][1], 1.0)
+        self.assertEqual(find_similar_products(db_manager, []), [])
+
+    @patch('analysis.database.mysql.connector.connect')
+    def test_insert_product_updates_loaded_index(self, mock_connect):
+        cursor = mock_connect.return_value.cursor.return_value
+        cursor.lastrowid = 42
+        cursor.fetchall.return_value = [(index, name.lower()) for index, name in enumerate(BASE)]
+        index = MinHashLSH()
+        minhash_index.set_product_index(index)
+        db_manager = DatabaseManager(cache=None)
+        db_manager.insert_product('1', 'Serum', ', '.join(BASE), 'High')
+        self.assertIn(42, index)
+        stored = [call[0] for call in cursor.executemany.call_args_list if 'product_minhash' in call[0][0]]
+        self.assertEqual(stored[0][1][0][0], 42)
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,139 @@
+import unittest
+from unittest.mock import patch, MagicMock
+import sys
+import os
+import threading
+import time
+import types
+import tempfile
+import numpy as np
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from analysis import nlp_similarity
+from analysis.embedding_store import EmbeddingStore
+from analysis.vector_search import VectorSearch
+
+class TestEncoderLoading(unittest.TestCase):
+
+    def setUp(self):
+        nlp_similarity._encoder = None
+        self.hub = types.ModuleType('tensorflow_hub')
+        self.loads = []
+
+        def load(location):
+            self.loads.append(location)
+            time.sleep(0.1)
+            return MagicMock(name='encoder')
+
+        self.hub.load = load
+        self.modules = patch.dict(sys.modules, {'tensorflow_hub': self.hub})
+        self.modules.start()
+
+    def tearDown(self):
+        self.modules.stop()
+        nlp_similarity._encoder = None
+
+    def test_import_does_not_load_the_model(self):
+        self.assertIsNone(nlp_similarity._encoder)
+        self.assertEqual(self.loads, [])
+
+    def test_concurrent_first_use_loads_once_from_local_path(self):
+        with patch.dict(nlp_similarity.NLP_CONFIG, {'model_path': '/models/use4'}):
+            threads = [threading.Thread(target=nlp_similarity.get_encoder) for _ in range(4)]
+            for thread in threads:
+                thread.start()
+            for thread in threads:
+                thread.join()
+        self.assertEqual(self.loads, ['/models/use4'])
+
+    def test_warm_up_loads_in_background(self):
+        nlp_similarity.warm_up_encoder().join()
+        self.assertEqual(self.loads, [nlp_similarity.NLP_CONFIG['model_url']])
+        self.assertIsNotNone(nlp_similarity._encoder)
+
+class TestProductEmbeddings(unittest.TestCase):
+
+    def setUp(self):
+        self.tmpdir = tempfile.TemporaryDirectory()
+        self.store = EmbeddingStore(self.tmpdir.name)
+
+    def tearDown(self):
+        self.tmpdir.cleanup()
+
+    @patch('analysis.nlp_similarity.embed_sentences')
+    def test_only_missing_or_changed_products_are_embedded(self, mock_embed_sentences):
+        mock_embed_sentences.side_effect = lambda sentences: np.array([[len(sentence), 1.0] for sentence in sentences])
+        products = [('1', ['Water', 'Glycerin']), ('2', ['Water'])]
+        embeddings = nlp_similarity.get_product_embeddings(products, self.store)
+        mock_embed_sentences.assert_called_once_with(['Water, Glycerin', 'Water'])
+        np.testing.assert_array_equal(embeddings['2'], [5.0, 1.0])
+        nlp_similarity.get_product_embeddings(products, self.store)
+        self.assertEqual(mock_embed_sentences.call_count, 1)
+        nlp_similarity.get_product_embeddings([('1', ['Water', 'Urea']), ('2', ['Water'])], self.store)
+        mock_embed_sentences.assert_called_with(['Water, Urea'])
+
+    @patch('analysis.nlp_similarity.embed_sentences')
+    def test_backfill_embeds_catalog_in_batches(self, mock_embed_sentences):
+        mock_embed_sentences.side_effect = lambda sentences: np.ones((len(sentences), 2))
+        db_manager = MagicMock()
+        catalog = [
+            [{'barcode': str(i), 'ingredient_list': 'Water, Glycerin' if i % 2 else 'Water'} for i in range(5)],
+            [{'barcode': '5', 'ingredient_list': None}, {'barcode': '6', 'ingredient_list': 'Urea'}]
+        ]
+        db_manager.iter_products.side_effect = lambda: iter(catalog)
+        stats = nlp_similarity.backfill_embeddings(db_manager, batch_size=4, store=self.store)
+        self.assertEqual(mock_embed_sentences.call_count, 2)
+        self.assertEqual([len(call[0][0]) for call in mock_embed_sentences.call_args_list], [4, 2])
+        self.assertEqual((stats['embedded'], stats['cached']), (6, 0))
+        self.assertIn('sentences_per_second', stats)
+        stats = nlp_similarity.backfill_embeddings(db_manager, batch_size=4, store=self.store)
+        self.assertEqual((stats['embedded'], stats['cached']), (0, 6))
+        self.assertEqual(mock_embed_sentences.call_count, 2)
+
+    @patch('analysis.nlp_similarity.get_vector_search')
+    @patch('analysis.nlp_similarity.get_embedding_store')
+    @patch('analysis.nlp_similarity.embed_sentences')
+    def test_get_similar_products_searches_stored_embeddings(self, mock_embed_sentences, mock_get_store, mock_get_search):
+        mock_get_store.return_value = self.store
+        mock_get_search.return_value = VectorSearch(os.path.join(self.tmpdir.name, 'ivf.npz'))
+        self.store.put_many([('1', 'a', [1.0, 0.0]), ('2', 'b', [0.8, 0.6]), ('3', 'c', [0.0, 1.0])])
+        mock_embed_sentences.return_value = np.array([[1.0, 0.1]])
+        db_manager = MagicMock()
+        db_manager.get_product_by_barcode.side_effect = lambda barcode: {'name': f'Product {barcode}'}
+        results = nlp_similarity.get_similar_products(['Water', 'Glycerin'], limit=2, db_manager=db_manager)
+        self.assertEqual([name for name, _ in results], ['Product 1', 'Product 2'])
+        self.assertEqual(nlp_similarity.search_similar_embeddings(np.array([1.0, 0.1]), 1, self.store, exclude='1')[0][0], '2')
+
+    @patch('analysis.nlp_similarity.find_similar_products')
+    @patch('analysis.nlp_similarity.DatabaseManager')
+    def test_get_similar_products_closes_the_manager_it_opens(self, mock_manager_class, mock_find):
+        mock_find.return_value = [({'name': 'Cream'}, 0.5)]
+        with patch.dict(nlp_similarity.NLP_CONFIG, {'similar_products': 'minhash'}):
+            self.assertEqual(nlp_similarity.get_similar_products(['Water']), [('Cream', 0.5)])
+        mock_manager_class.return_value.close_connection.assert_called_once()
+        db_manager = MagicMock()
+        with patch.dict(nlp_similarity.NLP_CONFIG, {'similar_products': 'minhash'}):
+            nlp_similarity.get_similar_products(['Water'], db_manager=db_manager)
+        db_manager.close_connection.assert_not_called()
+
+    @patch('analysis.nlp_similarity.embed_sentences')
+    def test_pooled_mode_embeds_each_ingredient_once(self, mock_embed_sentences):
+        vocabulary = {'water': [1.0, 0.0, 0.0], 'glycerin': [0.0, 1.0, 0.0], 'urea': [0.0, 0.0, 1.0]}
+        mock_embed_sentences.side_effect = lambda names: np.array([vocabulary[name] for name in names])
+        ingredient_store = EmbeddingStore(os.path.join(self.tmpdir.name, 'ingredients'))
+        with patch.dict(nlp_similarity.NLP_CONFIG, {'embedding_mode': 'pooled'}), \
+                patch('analysis.nlp_similarity.get_ingredient_embedding_store', return_value=ingredient_store):
+            embeddings = nlp_similarity.get_product_embeddings(
+                [('1', ['Water', 'Glycerin']), ('2', ['AQUA', 'Urea', 'Glycerin'])], self.store
+            )
+            mock_embed_sentences.assert_called_once_with(['water', 'glycerin', 'urea'])
+            # Water (rank 0) outweighs Glycerin (rank 1) with position pooling
+            self.assertGreater(embeddings['1'][0], embeddings['1'][1])
+            self.assertAlmostEqual(float(np.linalg.norm(embeddings['2'])), 1.0, places=5)
+            # A new product made of known ingredients does not reach the encoder
+            nlp_similarity.get_product_embeddings([('3', ['Glycerin', 'Urea'])], self.store)
+            self.assertEqual(mock_embed_sentences.call_count, 1)
+        # Text-mode embeddings are not confused with pooled ones for the same product
+        self.assertEqual(self.store.stale([('1', 'Water, Glycerin')]), [('1', 'Water, Glycerin')])
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,47 @@
+import unittest
+from unittest.mock import patch
+import sys
+import os
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from analysis.product_cache import ProductCache, split_ingredients
+
+PRODUCT = {'id': 1, 'barcode': '012345678932', 'name': 'Cream', 'ingredient_list': 'Water, Glycerin,Niacinamide'}
+
+class TestProductCache(unittest.TestCase):
+
+    def test_split_ingredients(self):
+        self.assertEqual(split_ingredients('Water, Glycerin,Niacinamide, '), ['Water', 'Glycerin', 'Niacinamide'])
+        self.assertEqual(split_ingredients(None), [])
+
+    def test_hit_and_miss_counters(self):
+        cache = ProductCache(max_size=10, ttl=60)
+        self.assertIsNone(cache.get('012345678932'))
+        cache.put('012345678932', PRODUCT)
+        self.assertEqual(cache.get('012345678932'), PRODUCT)
+        self.assertEqual(cache.get_ingredients('012345678932'), ['Water', 'Glycerin', 'Niacinamide'])
+        stats = cache.stats()
+        self.assertEqual((stats['hits'], stats['misses'], stats['size']), (2, 1, 1))
+
+    def test_lru_eviction(self):
+        cache = ProductCache(max_size=2, ttl=60)
+        cache.put('a', PRODUCT)
+        cache.put('b', PRODUCT)
+        cache.get('a')
+        cache.put('c', PRODUCT)
+        self.assertIsNone(cache.get('b'))
+        self.assertIsNotNone(cache.get('a'))
+
+    @patch('analysis.product_cache.time.monotonic')
+    def test_ttl_expiry_and_invalidate(self, mock_monotonic):
+        mock_monotonic.return_value = 100.0
+        cache = ProductCache(max_size=10, ttl=5)
+        cache.put('a', PRODUCT)
+        cache.put('b', PRODUCT)
+        mock_monotonic.return_value = 106.0
+        self.assertIsNone(cache.get('a'))
+        mock_monotonic.return_value = 100.0
+        cache.invalidate('b')
+        self.assertIsNone(cache.get('b'))
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,136 @@
+import unittest
+from unittest.mock import patch
+from types import SimpleNamespace
+import sys
+import os
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from utils import pubchem_api
+from utils.compound_cache import CompoundCache, set_compound_cache
+
+def make_compound(cid):
+    return SimpleNamespace(
+        cid=cid, iupac_name=f'compound-{cid}', molecular_formula='H2O', molecular_weight='18.015',
+        inchi=None, inchikey=None, canonical_smiles='O'
+    )
+
+def synonym_lists(cids):
+    cids = [cids] if isinstance(cids, int) else cids
+    return {cid: [f'syn-{cid}'] for cid in cids}
+
+class TestBatchLookups(unittest.TestCase):
+
+    def setUp(self):
+        set_compound_cache(CompoundCache(':memory:'))
+
+    def tearDown(self):
+        set_compound_cache(None)
+
+    @patch('utils.pubchem_api._get_synonym_lists')
+    @patch('utils.pubchem_api._get_compounds')
+    def test_cids_are_fetched_in_one_list_request(self, mock_get_compounds, mock_get_synonym_lists):
+        mock_get_compounds.side_effect = lambda cids, namespace: [make_compound(cid) for cid in cids]
+        mock_get_synonym_lists.side_effect = synonym_lists
+        results = pubchem_api.get_compounds_by_cids([962, 753, 962])
+        self.assertEqual(list(results), [962, 753])
+        self.assertEqual(results[753]['Synonyms'], ['syn-753'])
+        mock_get_compounds.assert_called_once_with([962, 753], 'cid')
+        # Served from the cache the second time
+        pubchem_api.get_compounds_by_cids([753])
+        self.assertEqual(mock_get_compounds.call_count, 1)
+
+    @patch('utils.pubchem_api.get_compound_by_cid')
+    @patch('utils.pubchem_api._get_synonym_lists')
+    @patch('utils.pubchem_api._get_compounds')
+    def test_missing_cids_fall_back_individually(self, mock_get_compounds, mock_get_synonym_lists, mock_get_compound_by_cid):
+        mock_get_compounds.return_value = [make_compound(962)]
+        mock_get_synonym_lists.return_value = synonym_lists([962])
+        mock_get_compound_by_cid.return_value = None
+        results = pubchem_api.get_compounds_by_cids([962, 999999999])
+        self.assertEqual(results[962]['CID'], 962)
+        self.assertIsNone(results[999999999])
+        mock_get_compound_by_cid.assert_called_once_with(999999999)
+
+    @patch('utils.pubchem_api._get_cids')
+    @patch('utils.pubchem_api._get_synonym_lists')
+    @patch('utils.pubchem_api._get_compounds')
+    def test_names_sharing_a_cid_share_one_record_fetch(self, mock_get_compounds, mock_get_synonym_lists, mock_get_cids):
+        mock_get_cids.side_effect = lambda name: {'Aqua': [962], 'Water': [962], 'Glycerin': [753]}.get(name, [])
+        mock_get_compounds.side_effect = lambda cids, namespace: [make_compound(cid) for cid in cids]
+        mock_get_synonym_lists.side_effect = synonym_lists
+        results = pubchem_api.get_compounds_by_names(['Aqua', 'Water', 'Glycerin', 'Unobtainium'])
+        self.assertEqual(results['Aqua'], results['Water'])
+        self.assertEqual(results['Glycerin']['CID'], 753)
+        self.assertIsNone(results['Unobtainium'])
+        mock_get_compounds.assert_called_once_with([962, 753], 'cid')
+
+class TestCompoundRecord(unittest.TestCase):
+
+    def setUp(self):
+        set_compound_cache(CompoundCache(':memory:'))
+
+    def tearDown(self):
+        set_compound_cache(None)
+
+    @patch('utils.pubchem_api._get_synonym_lists')
+    @patch('utils.pubchem_api._get_properties')
+    def test_slim_record_fetches_synonyms_lazily(self, mock_get_properties, mock_get_synonym_lists):
+        mock_get_properties.return_value = [
+            {'CID': 962, 'MolecularFormula': 'H2O', 'MolecularWeight': '18.015', 'InChIKey': 'XLYOFNOQVPJJNP-UHFFFAOYSA-N', 'ConnectivitySMILES': 'O'}
+        ]
+        mock_get_synonym_lists.return_value = synonym_lists([962])
+        record = pubchem_api.get_compound_record_by_name('Water')
+        self.assertFalse(hasattr(record, '__dict__'))
+        self.assertEqual(record.canonical_smiles, 'O')
+        self.assertEqual(mock_get_properties.call_args[0][0], pubchem_api.SLIM_PROPERTIES)
+        mock_get_synonym_lists.assert_not_called()
+        self.assertEqual(record.synonyms, ['syn-962'])
+        self.assertEqual(record.synonyms, ['syn-962'])
+        mock_get_synonym_lists.assert_called_once()
+        self.assertEqual(pubchem_api.get_compound_record_by_name('water'), record)
+        mock_get_properties.assert_called_once()
+
+class TestGHSClassification(unittest.TestCase):
+
+    def setUp(self):
+        set_compound_cache(CompoundCache(':memory:'))
+
+    def tearDown(self):
+        set_compound_cache(None)
+
+    def ghs_record(self, signal, statements):
+        information = [
+            {'Name': 'Pictogram(s)', 'Value': {'StringWithMarkup': [{'String': ' ', 'Markup': [{'Type': 'Icon', 'Extra': 'Irritant'}]}]}},
+            {'Name': 'Signal', 'Value': {'StringWithMarkup': [{'String': signal}]}},
+            {'Name': 'GHS Hazard Statements', 'Value': {'StringWithMarkup': [{'String': statement} for statement in statements]}}
+        ]
+        return {'Section': [{'TOCHeading': 'Safety and Hazards', 'Section': [
+            {'TOCHeading': 'Hazards Identification', 'Section': [{'TOCHeading': 'GHS Classification', 'Information': information}]}
+        ]}]}
+
+    def test_parse_ghs_classification(self):
+        classification = pubchem_api.parse_ghs_classification(
+            self.ghs_record('Warning', ['H302 (100%): Harmful if swallowed [Warning Acute toxicity, oral]'])
+        )
+        self.assertEqual(classification['Hazard_Codes'], ['H302'])
+        self.assertEqual(classification['Pictograms'], ['Irritant'])
+        self.assertEqual(classification['Toxicity'], 'Medium')
+        severe = pubchem_api.parse_ghs_classification(self.ghs_record('Danger', ['H350: May cause cancer']))
+        self.assertEqual(severe['Toxicity'], 'Very High')
+        self.assertEqual(pubchem_api.parse_ghs_classification({})['Toxicity'], 'Unknown')
+
+    @patch('utils.pubchem_api.get_http_client')
+    @patch('utils.pubchem_api._get_properties')
+    def test_compound_safety_is_cached(self, mock_get_properties, mock_get_http_client):
+        mock_get_properties.return_value = [{'CID': 2244, 'MolecularFormula': 'C9H8O4'}]
+        mock_get = mock_get_http_client.return_value.get
+        mock_get.return_value.status_code = 200
+        mock_get.return_value.json.return_value = {'Record': self.ghs_record('Warning', ['H302'])}
+        first = pubchem_api.get_compound_safety('Aspirin')
+        second = pubchem_api.get_compound_safety('aspirin')
+        self.assertEqual(first, second)
+        self.assertEqual((first['CID'], first['Toxicity']), (2244, 'Medium'))
+        self.assertEqual(mock_get.call_count, 1)
+        self.assertEqual(mock_get_properties.call_count, 1)
+
+if __name__ == '__main__':
+    unittest.main()
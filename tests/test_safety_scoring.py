@@ -0,0 +1,64 @@
+import unittest
+from unittest.mock import patch, MagicMock
+import sys
+import os
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from analysis.safety_ratings import (
+    aggregate_safety, rating_for_score, score_product_safety, analyze_product_safety, analyze_products_safety
+)
+
+RATINGS = {'Water': 'High', 'Glycerin': 'High', 'Fragrance': 'Medium', 'Hydroquinone': 'Low', 'Mystery': 'None'}
+
+def fake_rating(ingredient):
+    return RATINGS.get(ingredient, 'None')
+
+class TestSafetyScoring(unittest.TestCase):
+
+    def test_aggregations(self):
+        ratings = ['High', 'None', 'Medium', 'Low']
+        self.assertEqual(aggregate_safety(ratings, 'worst'), ('Low', 0.2))
+        rating, score = aggregate_safety(ratings, 'mean')
+        self.assertAlmostEqual(score, 0.5)
+        self.assertEqual(rating, 'Medium')
+        # The leading, most concentrated ingredient dominates the position-weighted score
+        rating, score = aggregate_safety(ratings, 'position_weighted')
+        self.assertGreater(score, 0.5)
+        self.assertEqual(aggregate_safety(['None', 'None']), ('None', None))
+        with self.assertRaises(ValueError):
+            aggregate_safety(ratings, 'median')
+
+    def test_rating_for_score(self):
+        self.assertEqual(rating_for_score(0.8), 'High')
+        self.assertEqual(rating_for_score(0.79), 'Medium')
+        self.assertEqual(rating_for_score(0.1), 'Low')
+        self.assertEqual(rating_for_score(None), 'None')
+
+    @patch('analysis.safety_ratings.get_safety_rating', side_effect=fake_rating)
+    def test_score_product_safety_resolves_each_ingredient_once(self, mock_rating):
+        rating, _ = score_product_safety(['Water', 'Fragrance', 'Water', 'Mystery'], 'worst')
+        self.assertEqual(rating, 'Medium')
+        self.assertEqual(sorted(call[0][0] for call in mock_rating.call_args_list), ['Fragrance', 'Mystery', 'Water'])
+
+    @patch('analysis.safety_ratings.get_safety_rating', side_effect=fake_rating)
+    def test_analyze_product_safety_writes_one_update(self, _):
+        db_manager = MagicMock()
+        db_manager.get_product_by_barcode.return_value = {'barcode': '1', 'ingredient_list': 'Water, Hydroquinone, Glycerin'}
+        self.assertEqual(analyze_product_safety('1', 'worst', db_manager), 'Low')
+        db_manager.update_product_safety_rating.assert_called_once_with('1', 'Low')
+        db_manager.close_connection.assert_not_called()
+
+    @patch('analysis.safety_ratings.get_safety_rating', side_effect=fake_rating)
+    def test_analyze_products_safety_updates_in_bulk(self, mock_rating):
+        db_manager = MagicMock()
+        db_manager.iter_products.return_value = iter([
+            [{'barcode': '1', 'ingredient_list': 'Water, Glycerin'}, {'barcode': '2', 'ingredient_list': 'Water, Fragrance'}],
+            [{'barcode': '3', 'ingredient_list': 'Mystery'}],
+        ])
+        ratings = analyze_products_safety(db_manager=db_manager, aggregation='worst')
+        self.assertEqual(ratings, {'1': 'High', '2': 'Medium', '3': 'None'})
+        db_manager.update_safety_ratings_bulk.assert_called_once()
+        self.assertEqual(dict(db_manager.update_safety_ratings_bulk.call_args[0][0]), ratings)
+        self.assertEqual(mock_rating.call_count, 4)
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,247 @@
+import unittest
+from unittest.mock import MagicMock
+import sys
+import os
+import random
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from analysis.similarity_matrix import (
+    build_ingredient_matrix, ingredient_matrix_from_chunks, similar_pairs, build_similarity_table, update_similarity_table,
+    prefix_ingredient_ids
+)
+
+class FakeSimilarityDatabase:
+    """In-memory stand-in for the DatabaseManager methods used by update_similarity_table."""
+
+    def __init__(self, products):
+        self.products = {product_id: set(ingredients) for product_id, ingredients in products.items()}
+        self.pairs = {}
+        self.changes = []
+
+    def edit(self, product_id, ingredients):
+        self.products[product_id] = set(ingredients)
+        self.changes.append(product_id)
+
+    def get_similarity_changes(self):
+        if not self.changes:
+            return None, []
+        return len(self.changes), sorted(set(self.changes))
+
+    def clear_similarity_changes(self, mark):
+        self.changes = self.changes[mark:]
+
+    def get_product_ids_by_ingredients(self, ingredient_ids):
+        self.looked_up = set(ingredient_ids)
+        return sorted(product_id for product_id, ingredients in self.products.items() if ingredients & self.looked_up)
+
+    def get_similarity_partners(self, product_ids):
+        wanted = set(product_ids)
+        partners = set()
+        for first, second in self.pairs:
+            if first in wanted:
+                partners.add(second)
+            if second in wanted:
+                partners.add(first)
+        return sorted(partners)
+
+    def get_neighbour_cutoffs(self, product_ids, k):
+        cutoffs = {}
+        for product_id in product_ids:
+            ranked = sorted(
+                (-score, first if second == product_id else second)
+                for (first, second), score in self.pairs.items() if product_id in (first, second)
+            )
+            if len(ranked) >= k:
+                cutoffs[product_id] = (-ranked[k - 1][0], ranked[k - 1][1])
+        return cutoffs
+
+    def similarity_change_mark(self):
+        return len(self.changes) or None
+
+    def iter_ingredient_index(self):
+        product_ids = sorted(self.products)
+        for start in range(0, len(product_ids), 25):
+            yield self.get_ingredient_index_rows(product_ids[start:start + 25])
+
+    def replace_similarity_table(self, similarities):
+        self.pairs = {}
+        for first, second, score in similarities:
+            self.pairs[(first, second)] = score
+        return {'written': len(self.pairs), 'errors': []}
+
+    def get_ingredient_index_rows(self, product_ids):
+        return [
+            (product_id, ingredient_id, position)
+            for product_id in product_ids
+            for position, ingredient_id in enumerate(sorted(self.products[product_id]))
+        ]
+
+    def get_ingredient_frequencies(self, ingredient_ids):
+        frequencies = {
+            ingredient_id: sum(ingredient_id in ingredients for ingredients in self.products.values())
+            for ingredient_id in ingredient_ids
+        }
+        return frequencies, sum(bool(ingredients) for ingredients in self.products.values())
+
+    def replace_similarities(self, product_ids, similarities):
+        self.pairs = {pair: score for pair, score in self.pairs.items() if not set(pair) & set(product_ids)}
+        written = 0
+        for first, second, score in similarities:
+            self.pairs[(first, second)] = score
+            written += 1
+        return written
+
+class TestSimilarityMatrix(unittest.TestCase):
+
+    def setUp(self):
+        generator = random.Random(7)
+        self.products = {
+            product_id: set(generator.sample(range(100, 140), generator.randint(3, 12)))
+            for product_id in range(10, 70)
+        }
+        self.index_rows = [
+            (product_id, ingredient_id, position)
+            for product_id, ingredients in self.products.items()
+            for position, ingredient_id in enumerate(sorted(ingredients))
+        ]
+
+    def brute_force(self, threshold):
+        pairs = {}
+        for first in self.products:
+            for second in self.products:
+                if first < second:
+                    a, b = self.products[first], self.products[second]
+                    score = len(a & b) / len(a | b)
+                    if score >= threshold:
+                        pairs[(first, second)] = score
+        return pairs
+
+    def test_chunked_jaccard_matches_brute_force(self):
+        product_ids, matrix = build_ingredient_matrix(self.index_rows)
+        self.assertEqual(matrix.shape[0], 60)
+        pairs = {
+            (first, second): score
+            for first, second, score in similar_pairs(product_ids, matrix, threshold=0.2, top_k=0, chunk_size=7)
+        }
+        expected = self.brute_force(0.2)
+        self.assertEqual(set(pairs), set(expected))
+        for pair, score in expected.items():
+            self.assertAlmostEqual(pairs[pair], score)
+
+    def test_top_k_keeps_best_neighbours(self):
+        product_ids, matrix = build_ingredient_matrix(self.index_rows)
+        pairs = list(similar_pairs(product_ids, matrix, threshold=0.0, top_k=2, chunk_size=16))
+        expected = self.brute_force(0.0)
+        for product_id in self.products:
+            neighbours = sorted(
+                (score for pair, score in expected.items() if product_id in pair), reverse=True
+            )[:2]
+            kept = {(first, second) for first, second, _ in pairs if product_id in (first, second)}
+            self.assertGreaterEqual(len(kept), min(2, len(neighbours)))
+            best = max(score for pair, score in expected.items() if pair in kept) if kept else None
+            if neighbours:
+                self.assertAlmostEqual(best, neighbours[0])
+
+    def test_weighted_jaccard_and_unknown_metric(self):
+        product_ids, matrix = build_ingredient_matrix([(1, 5, 0), (1, 6, 1), (2, 5, 0), (3, 5, 0), (3, 7, 1)])
+        pairs = list(similar_pairs(product_ids, matrix, metric='weighted_jaccard', threshold=0.0, top_k=0))
+        scores = {(first, second): score for first, second, score in pairs}
+        # Ingredient 5 is in every product, so sharing only it scores below plain Jaccard (1/2)
+        self.assertLess(scores[(1, 2)], 0.5)
+        with self.assertRaises(ValueError):
+            list(similar_pairs(product_ids, matrix, metric='cosine'))
+
+    def test_build_similarity_table_streams_into_table_replacement(self):
+        db_manager = MagicMock()
+        db_manager.iter_ingredient_index.return_value = iter([self.index_rows[:40], self.index_rows[40:]])
+        db_manager.replace_similarity_table.side_effect = lambda pairs: {'written': len(list(pairs)), 'errors': []}
+        report = build_similarity_table(db_manager, threshold=0.2, top_k=0)
+        self.assertEqual(report['products'], 60)
+        self.assertEqual(report['written'], len(self.brute_force(0.2)))
+        db_manager.insert_similarities_bulk.assert_not_called()
+
+    def test_streamed_matrix_matches_single_pass(self):
+        chunks = [self.index_rows[start:start + 25] for start in range(0, len(self.index_rows), 25)]
+        product_ids, ingredient_ids, matrix = ingredient_matrix_from_chunks(iter(chunks))
+        expected_ids, expected = build_ingredient_matrix(self.index_rows)
+        self.assertEqual(product_ids.tolist(), expected_ids.tolist())
+        self.assertEqual((matrix != expected).nnz, 0)
+        self.assertEqual(len(ingredient_ids), matrix.shape[1])
+
+    def test_update_similarity_table_rescores_changed_products(self):
+        db_manager = FakeSimilarityDatabase(self.products)
+        product_ids, matrix = build_ingredient_matrix(self.index_rows)
+        db_manager.pairs = {
+            (first, second): score
+            for first, second, score in similar_pairs(product_ids, matrix, threshold=0.2, top_k=0)
+        }
+        db_manager.edit(12, {100, 101, 102})
+        db_manager.edit(40, {100, 101, 102, 103})
+        db_manager.edit(55, set())
+        self.products = db_manager.products
+        report = update_similarity_table(db_manager, threshold=0.2, top_k=0, chunk_size=2)
+        self.assertEqual(report['products'], 3)
+        self.assertEqual(db_manager.changes, [])
+        expected = {pair: score for pair, score in self.brute_force(0.2).items() if 55 not in pair}
+        self.assertEqual(set(db_manager.pairs), set(expected))
+        for pair, score in expected.items():
+            self.assertAlmostEqual(db_manager.pairs[pair], score)
+        # Nothing left to do on a second run
+        self.assertEqual(update_similarity_table(db_manager, threshold=0.2, top_k=0), {'products': 0, 'written': 0})
+
+    def test_update_similarity_table_matches_a_full_build(self):
+        for seed in range(30):
+            generator = random.Random(seed)
+            db_manager = FakeSimilarityDatabase(self.products)
+            build_similarity_table(db_manager, threshold=0.2, top_k=5)
+            db_manager.changes = []
+            for product_id in generator.sample(sorted(self.products), 5):
+                ingredients = set(generator.sample(range(100, 140), generator.randint(0, 12)))
+                db_manager.edit(product_id, ingredients)
+            update_similarity_table(db_manager, threshold=0.2, top_k=5, chunk_size=2)
+            rebuilt = FakeSimilarityDatabase(db_manager.products)
+            build_similarity_table(rebuilt, threshold=0.2, top_k=5)
+            self.assertEqual(set(db_manager.pairs), set(rebuilt.pairs), f"seed {seed}")
+            for pair, score in rebuilt.pairs.items():
+                self.assertAlmostEqual(db_manager.pairs[pair], score)
+
+    def test_reindexing_an_unchanged_product_keeps_the_table(self):
+        db_manager = FakeSimilarityDatabase(self.products)
+        build_similarity_table(db_manager, threshold=0.2, top_k=3)
+        before = dict(db_manager.pairs)
+        db_manager.changes = []
+        db_manager.edit(12, self.products[12])
+        update_similarity_table(db_manager, threshold=0.2, top_k=3)
+        self.assertEqual(db_manager.pairs, before)
+
+    def test_prefix_filtering_skips_common_ingredients(self):
+        products = {product_id: {100, 200 + product_id} for product_id in range(1, 30)}
+        products[1] = {100, 101, 102}
+        products[2] = {100, 101, 103}
+        frequencies = {ingredient_id: sum(ingredient_id in ingredients for ingredients in products.values()) for ingredient_id in range(100, 240)}
+        rows = [(1, ingredient_id, position) for position, ingredient_id in enumerate(sorted(products[1]))]
+        # Jaccard 0.5 needs two of product 1's three ingredients, so one of the two rarest must be shared
+        self.assertEqual(prefix_ingredient_ids(rows, frequencies, len(products), threshold=0.5), [101, 102])
+        self.assertEqual(prefix_ingredient_ids(rows, frequencies, len(products), threshold=0.0), [100, 101, 102])
+        self.assertEqual(len(prefix_ingredient_ids(rows, frequencies, len(products), metric='weighted_jaccard', threshold=0.6)), 1)
+        db_manager = FakeSimilarityDatabase(products)
+        db_manager.edit(1, products[1])
+        update_similarity_table(db_manager, threshold=0.4, top_k=0)
+        self.assertNotIn(100, db_manager.looked_up)
+        self.assertEqual(db_manager.pairs, {(1, 2): 0.5})
+
+    def test_update_similarity_table_weighted_uses_catalog_frequencies(self):
+        db_manager = FakeSimilarityDatabase(self.products)
+        db_manager.edit(10, self.products[10])
+        update_similarity_table(db_manager, metric='weighted_jaccard', threshold=0.0, top_k=0)
+        product_ids, matrix = build_ingredient_matrix(self.index_rows)
+        expected = {
+            (first, second): score
+            for first, second, score in similar_pairs(product_ids, matrix, metric='weighted_jaccard', threshold=0.0, top_k=0)
+            if 10 in (first, second)
+        }
+        self.assertEqual(set(db_manager.pairs), set(expected))
+        for pair, score in expected.items():
+            self.assertAlmostEqual(db_manager.pairs[pair], score)
+
+if __name__ == '__main__':
+    unittest.main()
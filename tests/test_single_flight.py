@@ -0,0 +1,59 @@
+import unittest
+import sys
+import os
+import asyncio
+import threading
+import time
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from utils.single_flight import SingleFlight
+
+class TestSingleFlight(unittest.TestCase):
+
+    def setUp(self):
+        self.flight = SingleFlight()
+        self.upstream = []
+
+    def slow_lookup(self, name):
+        self.upstream.append(name)
+        time.sleep(0.2)
+        return {'name': name}
+
+    def test_threaded_callers_share_one_call(self):
+        results = []
+        threads = [
+            threading.Thread(target=lambda: results.append(self.flight.do('glycerin', self.slow_lookup, 'Glycerin')))
+            for _ in range(5)
+        ]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        self.assertEqual(self.upstream, ['Glycerin'])
+        self.assertEqual(results, [{'name': 'Glycerin'}] * 5)
+        self.assertEqual(self.flight.stats(), {'calls': 5, 'upstream_calls': 1, 'saved': 4, 'in_flight': 0})
+
+    def test_async_and_threaded_callers_share_one_call(self):
+        thread_result = []
+        thread = threading.Thread(target=lambda: thread_result.append(self.flight.do('aqua', self.slow_lookup, 'Aqua')))
+        thread.start()
+        time.sleep(0.05)
+
+        async def run():
+            return await asyncio.gather(*(self.flight.do_async('aqua', self.slow_lookup, 'Aqua') for _ in range(3)))
+
+        results = asyncio.run(run())
+        thread.join()
+        self.assertEqual(self.upstream, ['Aqua'])
+        self.assertEqual(results, thread_result * 3)
+        self.assertEqual(self.flight.stats()['saved'], 3)
+
+    def test_exceptions_are_shared_and_not_cached(self):
+        def failing():
+            self.upstream.append('fail')
+            raise ValueError('upstream down')
+        with self.assertRaises(ValueError):
+            self.flight.do('x', failing)
+        self.assertEqual(self.flight.do('x', lambda: 'ok'), 'ok')
+
+if __name__ == '__main__':
+    unittest.main()
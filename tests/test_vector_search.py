@@ -0,0 +1,107 @@
+import unittest
+from unittest.mock import patch
+import sys
+import os
+import tempfile
+import numpy as np
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from analysis import vector_search
+from analysis.embedding_store import EmbeddingStore
+from analysis.vector_search import IVFIndex, VectorSearch, exact_top_k, normalize_rows
+
+class TestVectorSearch(unittest.TestCase):
+
+    def setUp(self):
+        self.tmpdir = tempfile.TemporaryDirectory()
+        generator = np.random.RandomState(3)
+        centers = generator.normal(size=(20, 16))
+        self.vectors = (centers[generator.randint(0, 20, size=2000)] + 0.1 * generator.normal(size=(2000, 16))).astype(np.float32)
+        self.queries = self.vectors[generator.choice(2000, size=20, replace=False)] + 0.05
+
+    def tearDown(self):
+        self.tmpdir.cleanup()
+
+    def brute_force(self, query, k):
+        scores = normalize_rows(self.vectors) @ normalize_rows(query)[0]
+        return set(np.argsort(-scores)[:k])
+
+    def test_chunked_exact_search_matches_brute_force(self):
+        for query in self.queries[:5]:
+            rows, scores = exact_top_k(query, self.vectors, 10, chunk_size=300)
+            self.assertEqual(set(rows), self.brute_force(query, 10))
+            self.assertTrue(np.all(np.diff(scores) <= 0))
+
+    def test_ivf_recall_improves_with_nprobe(self):
+        index = IVFIndex.build(self.vectors, nlist=40)
+        recalls = []
+        for nprobe in (1, 40):
+            hits = 0
+            for query in self.queries:
+                rows, _ = index.search(query, self.vectors, 10, nprobe=nprobe)
+                hits += len(set(rows) & self.brute_force(query, 10))
+            recalls.append(hits / (10 * len(self.queries)))
+        self.assertGreater(recalls[0], 0.5)
+        self.assertEqual(recalls[1], 1.0)
+
+    def test_index_is_persisted_and_covers_new_rows(self):
+        path = os.path.join(self.tmpdir.name, 'ivf.npz')
+        search = VectorSearch(path)
+        search.search(self.queries[0], self.vectors[:1900], 5, exact=False)
+        self.assertEqual(IVFIndex.load(path).rows, 1900)
+        # Rows appended since the build are searched exactly, without a rebuild
+        with patch.object(IVFIndex, 'build') as mock_build:
+            rows, scores = VectorSearch(path).search(self.vectors[1950], self.vectors, 1, exact=False)
+            mock_build.assert_not_called()
+        self.assertEqual(rows[0], 1950)
+        self.assertAlmostEqual(scores[0], 1.0, places=5)
+
+    def test_rows_overwritten_in_place_are_reassigned(self):
+        store = EmbeddingStore(os.path.join(self.tmpdir.name, 'store'))
+        store.put_many((str(row), 'text', vector) for row, vector in enumerate(self.vectors))
+        path = os.path.join(self.tmpdir.name, 'ivf.npz')
+        search = VectorSearch(path)
+        _, vectors = store.matrix()
+        search.search(self.queries[0], vectors, 5, nprobe=1, exact=False, store=store)
+        # Move row 7 to the far side of the space; its old cell no longer fits it
+        target = -self.vectors[100]
+        store.put('7', 'changed', target)
+        _, vectors = store.matrix()
+        with patch.object(IVFIndex, 'build') as mock_build:
+            rows, _ = search.search(target, vectors, 1, nprobe=1, exact=False, store=store)
+            mock_build.assert_not_called()
+        self.assertEqual(rows[0], 7)
+        saved = IVFIndex.load(path)
+        self.assertEqual((saved.generation, saved.reassigned), (store.generation, 1))
+        self.assertEqual(sorted(saved.order), list(range(2000)))
+
+    def test_reassigning_leaves_an_index_in_use_untouched(self):
+        index = IVFIndex.build(self.vectors, nlist=40)
+        order, offsets = index.order.copy(), index.offsets.copy()
+        vectors = self.vectors.copy()
+        vectors[7] = -self.vectors[100]
+        updated = index.reassign(vectors, np.array([7]), 1)
+        # A search still holding the old index sees its lists exactly as they were
+        np.testing.assert_array_equal(index.order, order)
+        np.testing.assert_array_equal(index.offsets, offsets)
+        self.assertEqual((index.generation, index.reassigned), (0, 0))
+        self.assertEqual((updated.generation, updated.reassigned), (1, 1))
+        rows, _ = updated.search(vectors[7], vectors, 1, nprobe=1)
+        self.assertEqual(rows[0], 7)
+
+    def test_shared_searches_are_keyed_by_namespace(self):
+        with patch.dict(vector_search.VECTOR_SEARCH_CONFIG, {'path': os.path.join(self.tmpdir.name, 'ivf.npz')}):
+            with patch.dict(vector_search._shared_searches, clear=True):
+                first = vector_search.get_vector_search('encoder-a')
+                self.assertIs(vector_search.get_vector_search('encoder-a'), first)
+                self.assertNotEqual(vector_search.get_vector_search('encoder-b').path, first.path)
+        self.assertEqual(first.path, os.path.join(self.tmpdir.name, 'encoder-a', 'ivf.npz'))
+
+    def test_small_catalogs_use_exact_search(self):
+        with patch.dict(vector_search.VECTOR_SEARCH_CONFIG, {'exact_max_rows': 5000}):
+            with patch.object(IVFIndex, 'build') as mock_build:
+                rows, _ = VectorSearch(os.path.join(self.tmpdir.name, 'unused.npz')).search(self.queries[0], self.vectors, 3)
+                mock_build.assert_not_called()
+        self.assertEqual(set(rows), self.brute_force(self.queries[0], 3))
+
+if __name__ == '__main__':
+    unittest.main()
@@ -1,4 +1,8 @@
 import requests
+import sys
+import os
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from utils.http_client import get_http_client
 
 class BarcodeLookup:
     def __init__(self, api_key):
@@ -15,7 +19,7 @@ class BarcodeLookup:
             'barcode': barcode
         }
 
-        response = requests.get(self.api_url, headers=headers, params=params)
+        response = get_http_client().get(self.api_url, headers=headers, params=params)
         
         if response.status_code == 200:
             return response.json()
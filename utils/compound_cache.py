@@ -0,0 +1,148 @@
+import json
+import os
+import sqlite3
+import sys
+import threading
+import time
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from analysis.ingredient_normalizer import normalize_ingredient_name
+
+COMPOUND_CACHE_CONFIG = {
+    'path': os.path.join(os.path.expanduser('~'), '.skincare', 'compound_cache.sqlite3'),
+    'ttl': 30 * 24 * 3600,  # seconds a found compound stays fresh
+    'negative_ttl': 24 * 3600  # seconds a "not found" answer stays fresh
+}
+
+# Returned by CompoundCache.get when nothing fresh is stored for a key
+MISS = object()
+
+def cache_key(namespace, key):
+    """Build the stored key: names are normalized, CIDs are stringified."""
+    if namespace == 'cid':
+        return str(int(key))
+    return normalize_ingredient_name(str(key))
+
+class CompoundCache:
+    """
+    SQLite-backed cache for PubChem lookups, keyed by namespace ('name', 'cid', 'pug_json', ...)
+    and normalized key. A stored value of None records a negative (not found) answer.
+    """
+    def __init__(self, path=None, ttl=None, negative_ttl=None):
+        self.path = path or COMPOUND_CACHE_CONFIG['path']
+        self.ttl = ttl if ttl is not None else COMPOUND_CACHE_CONFIG['ttl']
+        self.negative_ttl = negative_ttl if negative_ttl is not None else COMPOUND_CACHE_CONFIG['negative_ttl']
+        if self.path != ':memory:':
+            os.makedirs(os.path.dirname(os.path.abspath(self.path)), exist_ok=True)
+        self._connection = sqlite3.connect(self.path, check_same_thread=False)
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        with self._lock:
+            self._connection.execute("""
+            CREATE TABLE IF NOT EXISTS compound_cache (
+                namespace TEXT NOT NULL,
+                key TEXT NOT NULL,
+                value TEXT,
+                found INTEGER NOT NULL,
+                stored_at REAL NOT NULL,
+                PRIMARY KEY (namespace, key)
+            )
+            """)
+            self._connection.commit()
+
+    def get(self, namespace, key):
+        """
+        Look up a cached answer.
+        Returns:
+            The cached value (None for a cached "not found"), or MISS if absent or expired.
+        """
+        with self._lock:
+            row = self._connection.execute(
+                "SELECT value, found, stored_at FROM compound_cache WHERE namespace = ? AND key = ?",
+                (namespace, cache_key(namespace, key))
+            ).fetchone()
+            if row is not None:
+                value, found, stored_at = row
+                ttl = self.ttl if found else self.negative_ttl
+                if time.time() - stored_at <= ttl:
+                    self.hits += 1
+                    return json.loads(value) if found else None
+            self.misses += 1
+            return MISS
+
+    def put(self, namespace, key, value):
+        """Store a value; None is stored as a negative answer with the shorter TTL."""
+        with self._lock:
+            self._connection.execute(
+                "INSERT OR REPLACE INTO compound_cache (namespace, key, value, found, stored_at) VALUES (?, ?, ?, ?, ?)",
+                (namespace, cache_key(namespace, key),
+                 json.dumps(value) if value is not None else None,
+                 int(value is not None), time.time())
+            )
+            self._connection.commit()
+
+    def purge_expired(self):
+        """Delete expired entries and return how many were removed."""
+        now = time.time()
+        with self._lock:
+            cursor = self._connection.execute(
+                "DELETE FROM compound_cache WHERE (found = 1 AND stored_at < ?) OR (found = 0 AND stored_at < ?)",
+                (now - self.ttl, now - self.negative_ttl)
+            )
+            self._connection.commit()
+            return cursor.rowcount
+
+    def clear(self):
+        """Delete every entry."""
+        with self._lock:
+            self._connection.execute("DELETE FROM compound_cache")
+            self._connection.commit()
+
+    def stats(self):
+        """
+        Report the cache size, hit rate and entry ages.
+        Returns:
+            dict: entries, negative_entries, per-namespace counts, bytes on disk,
+            hits, misses, hit_rate and the oldest/newest entry age in seconds.
+        """
+        now = time.time()
+        with self._lock:
+            entries, negative, oldest, newest = self._connection.execute(
+                "SELECT COUNT(*), COALESCE(SUM(1 - found), 0), MIN(stored_at), MAX(stored_at) FROM compound_cache"
+            ).fetchone()
+            namespaces = dict(self._connection.execute(
+                "SELECT namespace, COUNT(*) FROM compound_cache GROUP BY namespace"
+            ).fetchall())
+            lookups = self.hits + self.misses
+            return {
+                'entries': entries,
+                'negative_entries': negative,
+                'namespaces': namespaces,
+                'bytes': os.path.getsize(self.path) if self.path != ':memory:' else None,
+                'hits': self.hits,
+                'misses': self.misses,
+                'hit_rate': self.hits / lookups if lookups else 0.0,
+                'oldest_age': now - oldest if oldest is not None else None,
+                'newest_age': now - newest if newest is not None else None
+            }
+
+    def close(self):
+        with self._lock:
+            self._connection.close()
+
+_shared_cache = None
+_shared_cache_lock = threading.Lock()
+
+def get_compound_cache():
+    """Return the process-wide CompoundCache, opening it on first use."""
+    global _shared_cache
+    with _shared_cache_lock:
+        if _shared_cache is None:
+            _shared_cache = CompoundCache()
+        return _shared_cache
+
+def set_compound_cache(cache):
+    """Replace the process-wide CompoundCache, e.g. with a temporary one in tests."""
+    global _shared_cache
+    with _shared_cache_lock:
+        _shared_cache = cache
@@ -0,0 +1,210 @@
+import argparse
+import csv
+import gzip
+import hashlib
+import json
+import mmap
+import os
+import struct
+import sys
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from analysis.ingredient_normalizer import normalize_ingredient_name
+
+SNAPSHOT_MAGIC = b'SKSNAP01'
+
+# magic, compound count, name count, CID index offset, name index offset
+_HEADER = struct.Struct('<8sIIQQ')
+# cid, record offset, record length
+_CID_ENTRY = struct.Struct('<IQI')
+# name hash, name offset, name length, cid
+_NAME_ENTRY = struct.Struct('<QQII')
+
+SNAPSHOT_CONFIG = {
+    'max_synonyms': 20  # synonyms stored (and indexed) per compound
+}
+
+# Property extract columns (PUG REST property table names) and the compound_info keys they map to
+PROPERTY_COLUMNS = {
+    'CID': 'CID',
+    'IUPACName': 'Name',
+    'MolecularFormula': 'Molecular_Formula',
+    'MolecularWeight': 'Molecular_Weight',
+    'InChI': 'InChI',
+    'InChIKey': 'InChIKey',
+    'CanonicalSMILES': 'Canonical_SMILES',
+    'ConnectivitySMILES': 'Canonical_SMILES'
+}
+
+def name_hash(name):
+    """64-bit hash of a normalized name, used to order and search the name index."""
+    return int.from_bytes(hashlib.blake2b(name.encode('utf-8'), digest_size=8).digest(), 'little')
+
+def _open_text(path):
+    if path.endswith('.gz'):
+        return gzip.open(path, 'rt', encoding='utf-8', newline='')
+    return open(path, 'r', encoding='utf-8', newline='')
+
+def read_properties(path):
+    """
+    Read a property extract (CSV, or TSV if the file name contains '.tsv') with a header row.
+    Returns:
+        dict: A mapping of CID to a compound_info dictionary.
+    """
+    compounds = {}
+    delimiter = '\t' if '.tsv' in path else ','
+    with _open_text(path) as file:
+        for row in csv.DictReader(file, delimiter=delimiter):
+            compound_info = {
+                key: row[column] for column, key in PROPERTY_COLUMNS.items()
+                if row.get(column) not in (None, '')
+            }
+            if 'CID' not in compound_info:
+                continue
+            compound_info['CID'] = int(compound_info['CID'])
+            compound_info['Synonyms'] = []
+            compounds[compound_info['CID']] = compound_info
+    return compounds
+
+def read_synonyms(path, compounds, max_synonyms):
+    """Attach synonyms from a PubChem CID-Synonym file (cid<TAB>synonym per line) to known compounds."""
+    with _open_text(path) as file:
+        for line in file:
+            cid, _, synonym = line.rstrip('\n').partition('\t')
+            compound_info = compounds.get(int(cid)) if cid.isdigit() else None
+            if compound_info is not None and synonym and len(compound_info['Synonyms']) < max_synonyms:
+                compound_info['Synonyms'].append(synonym)
+
+def build_snapshot(properties_path, output_path, synonyms_path=None, max_synonyms=None):
+    """
+    Build a snapshot file from a property extract and an optional CID-Synonym extract.
+    Every compound is indexed by CID and by the normalized form of its IUPAC name and synonyms.
+    Parameters:
+        properties_path (str): CSV/TSV property extract (optionally gzipped).
+        output_path (str): Where to write the snapshot.
+        synonyms_path (str): PubChem CID-Synonym extract (optionally gzipped).
+        max_synonyms (int): Synonyms kept per compound (defaults to SNAPSHOT_CONFIG['max_synonyms']).
+    Returns:
+        dict: The number of compounds and names written.
+    """
+    max_synonyms = max_synonyms or SNAPSHOT_CONFIG['max_synonyms']
+    compounds = read_properties(properties_path)
+    if synonyms_path:
+        read_synonyms(synonyms_path, compounds, max_synonyms)
+
+    blob = bytearray()
+    cid_entries = []
+    names = {}
+    for cid in sorted(compounds):
+        compound_info = compounds[cid]
+        record = json.dumps(compound_info, separators=(',', ':')).encode('utf-8')
+        cid_entries.append((cid, len(blob), len(record)))
+        blob += record
+        for name in [compound_info.get('Name')] + compound_info['Synonyms']:
+            normalized = normalize_ingredient_name(name)
+            # The first compound to claim a name keeps it (synonym files list the best match first)
+            if normalized and normalized not in names:
+                names[normalized] = cid
+    name_entries = []
+    for name, cid in names.items():
+        encoded = name.encode('utf-8')
+        name_entries.append((name_hash(name), encoded, cid))
+    name_entries.sort()
+
+    cid_index_offset = _HEADER.size
+    name_index_offset = cid_index_offset + len(cid_entries) * _CID_ENTRY.size
+    blob_offset = name_index_offset + len(name_entries) * _NAME_ENTRY.size
+    with open(output_path, 'wb') as file:
+        file.write(_HEADER.pack(SNAPSHOT_MAGIC, len(cid_entries), len(name_entries), cid_index_offset, name_index_offset))
+        for cid, offset, length in cid_entries:
+            file.write(_CID_ENTRY.pack(cid, blob_offset + offset, length))
+        names_offset = blob_offset + len(blob)
+        for hashed, encoded, cid in name_entries:
+            file.write(_NAME_ENTRY.pack(hashed, names_offset, len(encoded), cid))
+            names_offset += len(encoded)
+        file.write(blob)
+        for _, encoded, _ in name_entries:
+            file.write(encoded)
+    return {'compounds': len(cid_entries), 'names': len(name_entries)}
+
+class CompoundSnapshot:
+    """
+    Read-only, memory-mapped compound snapshot. Lookups are binary searches over the
+    fixed-size CID and name-hash indexes, so they touch only a few pages of the file.
+    """
+    def __init__(self, path):
+        self.path = path
+        self._file = open(path, 'rb')
+        self._map = mmap.mmap(self._file.fileno(), 0, access=mmap.ACCESS_READ)
+        magic, self.compound_count, self.name_count, self._cid_index, self._name_index = _HEADER.unpack_from(self._map, 0)
+        if magic != SNAPSHOT_MAGIC:
+            self.close()
+            raise ValueError(f"{path} is not a compound snapshot")
+
+    def __len__(self):
+        return self.compound_count
+
+    def _record(self, offset, length):
+        return json.loads(self._map[offset:offset + length])
+
+    def get_by_cid(self, cid):
+        """Return the compound_info dictionary for cid, or None if it is not in the snapshot."""
+        cid = int(cid)
+        low, high = 0, self.compound_count
+        while low < high:
+            middle = (low + high) // 2
+            entry_cid, offset, length = _CID_ENTRY.unpack_from(self._map, self._cid_index + middle * _CID_ENTRY.size)
+            if entry_cid < cid:
+                low = middle + 1
+            elif entry_cid > cid:
+                high = middle
+            else:
+                return self._record(offset, length)
+        return None
+
+    def get_cid_by_name(self, name):
+        """Return the CID for a (normalized) name, or None if it is not in the snapshot."""
+        normalized = normalize_ingredient_name(name)
+        if not normalized:
+            return None
+        hashed = name_hash(normalized)
+        encoded = normalized.encode('utf-8')
+        low, high = 0, self.name_count
+        while low < high:
+            middle = (low + high) // 2
+            entry_hash = _NAME_ENTRY.unpack_from(self._map, self._name_index + middle * _NAME_ENTRY.size)[0]
+            if entry_hash < hashed:
+                low = middle + 1
+            else:
+                high = middle
+        # Entries sharing a hash are adjacent; compare the stored names to rule out collisions
+        while low < self.name_count:
+            entry_hash, offset, length, cid = _NAME_ENTRY.unpack_from(self._map, self._name_index + low * _NAME_ENTRY.size)
+            if entry_hash != hashed:
+                break
+            if self._map[offset:offset + length] == encoded:
+                return cid
+            low += 1
+        return None
+
+    def get_by_name(self, name):
+        """Return the compound_info dictionary for a name, or None if it is not in the snapshot."""
+        cid = self.get_cid_by_name(name)
+        return self.get_by_cid(cid) if cid is not None else None
+
+    def close(self):
+        self._map.close()
+        self._file.close()
+
+def main():
+    """Command-line entry point: build a snapshot from downloaded PubChem extracts."""
+    parser = argparse.ArgumentParser(description="Build an offline compound snapshot from PubChem extracts.")
+    parser.add_argument('--properties', required=True, help="CSV/TSV property table with a CID column (may be gzipped)")
+    parser.add_argument('--synonyms', help="PubChem CID-Synonym file (may be gzipped)")
+    parser.add_argument('--output', required=True, help="Snapshot file to write")
+    parser.add_argument('--max-synonyms', type=int, default=SNAPSHOT_CONFIG['max_synonyms'])
+    args = parser.parse_args()
+    stats = build_snapshot(args.properties, args.output, args.synonyms, args.max_synonyms)
+    print(f"Snapshot written to {args.output}: {stats['compounds']} compounds, {stats['names']} names")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,105 @@
+import random
+import threading
+import time
+import requests
+from requests.adapters import HTTPAdapter
+
+HTTP_CONFIG = {
+    'pool_connections': 10,  # number of hosts kept in the connection pool
+    'pool_maxsize': 20,  # keep-alive connections per host
+    'connect_timeout': 5.0,
+    'read_timeout': 30.0,
+    'max_retries': 3,
+    'backoff_factor': 0.5,  # first retry waits up to 0.5s, then 1s, 2s, ...
+    'backoff_max': 30.0,
+    'retry_statuses': (429, 500, 502, 503, 504)
+}
+
+class RateLimitTimeout(requests.exceptions.Timeout):
+    """Raised when no rate-limiter token became available within limiter_timeout."""
+
+class HTTPClient:
+    """
+    Shared HTTP client: one pooled keep-alive session, connect/read timeouts, and retries
+    with jittered exponential backoff for transient failures (429/5xx and connection errors).
+    """
+    def __init__(self, **config):
+        self.config = dict(HTTP_CONFIG, **config)
+        self.session = requests.Session()
+        adapter = HTTPAdapter(
+            pool_connections=self.config['pool_connections'],
+            pool_maxsize=self.config['pool_maxsize'],
+            max_retries=0
+        )
+        self.session.mount('https://', adapter)
+        self.session.mount('http://', adapter)
+
+    def backoff(self, attempt, response=None):
+        """Seconds to wait before retry number attempt (0-based), honoring Retry-After when given."""
+        retry_after = response.headers.get('Retry-After') if response is not None else None
+        if retry_after:
+            try:
+                return min(float(retry_after), self.config['backoff_max'])
+            except ValueError:
+                pass
+        ceiling = min(self.config['backoff_max'], self.config['backoff_factor'] * (2 ** attempt))
+        return random.uniform(0, ceiling)
+
+    def request(self, method, url, limiter=None, limiter_timeout=None, **kwargs):
+        """
+        Send a request, retrying transient failures.
+        Parameters:
+            method (str): The HTTP method.
+            url (str): The request URL.
+            limiter (TokenBucket): If given, one token is taken before every attempt, retries
+                included, so retrying a throttled request cannot exceed the upstream rate limit.
+            limiter_timeout (float): Maximum seconds to wait for each token (None waits indefinitely).
+            **kwargs: Passed to requests.Session.request; timeout defaults to (connect_timeout, read_timeout).
+        Returns:
+            requests.Response: The final response (possibly a non-2xx one once retries are exhausted).
+        Raises:
+            RateLimitTimeout: If a token could not be taken within limiter_timeout.
+        """
+        kwargs.setdefault('timeout', (self.config['connect_timeout'], self.config['read_timeout']))
+        max_retries = self.config['max_retries']
+        for attempt in range(max_retries + 1):
+            if limiter is not None and not limiter.acquire(timeout=limiter_timeout):
+                raise RateLimitTimeout(f"Rate limit wait timed out for {url}")
+            try:
+                response = self.session.request(method, url, **kwargs)
+            except (requests.exceptions.ConnectionError, requests.exceptions.Timeout):
+                if attempt == max_retries:
+                    raise
+                time.sleep(self.backoff(attempt))
+                continue
+            if response.status_code in self.config['retry_statuses'] and attempt < max_retries:
+                time.sleep(self.backoff(attempt, response))
+                response.close()
+                continue
+            return response
+
+    def get(self, url, **kwargs):
+        return self.request('GET', url, **kwargs)
+
+    def post(self, url, **kwargs):
+        return self.request('POST', url, **kwargs)
+
+    def close(self):
+        self.session.close()
+
+_shared_client = None
+_shared_client_lock = threading.Lock()
+
+def get_http_client():
+    """Return the process-wide HTTPClient, creating it on first use."""
+    global _shared_client
+    with _shared_client_lock:
+        if _shared_client is None:
+            _shared_client = HTTPClient()
+        return _shared_client
+
+def set_http_client(client):
+    """Replace the process-wide HTTPClient, e.g. with one using different settings."""
+    global _shared_client
+    with _shared_client_lock:
+        _shared_client = client
@@ -1,31 +1,212 @@
 import pubchempy as pcp
+import requests
 import json
+import re
+import sys
+import os
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from utils.compound_cache import get_compound_cache, MISS
+from utils.rate_limiter import pubchem_limiter
+from utils.http_client import get_http_client
+from utils.compound_snapshot import CompoundSnapshot
+
+PUBCHEM_REST_URL = "https://pubchem.ncbi.nlm.nih.gov/rest/pug"
+
+# Maximum number of CIDs sent in one PUG REST list request
+PUBCHEM_BATCH_SIZE = 100
+
+PUG_VIEW_URL = "https://pubchem.ncbi.nlm.nih.gov/rest/pug_view"
+
+# GHS hazard codes for fatal, carcinogenic, mutagenic or reprotoxic effects
+SEVERE_HAZARD_CODES = {'H300', 'H310', 'H330', 'H340', 'H350', 'H360'}
+
+_HAZARD_CODE = re.compile(r'\bH\d{3}\b')
+
+# Properties requested in slim mode instead of the full compound record
+SLIM_PROPERTIES = ('MolecularFormula', 'MolecularWeight', 'InChIKey', 'CanonicalSMILES')
+
+class CompoundRecord:
+    """
+    Compact compound record holding only the properties the analysis uses.
+    Synonyms are not part of the record; they are fetched (and cached) on first access.
+    """
+    __slots__ = ('cid', 'molecular_formula', 'molecular_weight', 'inchikey', 'canonical_smiles', '_synonyms')
+
+    def __init__(self, cid, molecular_formula=None, molecular_weight=None, inchikey=None, canonical_smiles=None):
+        self.cid = cid
+        self.molecular_formula = molecular_formula
+        self.molecular_weight = molecular_weight
+        self.inchikey = inchikey
+        self.canonical_smiles = canonical_smiles
+        self._synonyms = None
+
+    @classmethod
+    def from_properties(cls, properties):
+        """Build a record from one row of a PUG REST PropertyTable."""
+        return cls(
+            properties['CID'],
+            properties.get('MolecularFormula'),
+            properties.get('MolecularWeight'),
+            properties.get('InChIKey'),
+            # PubChem now reports canonical SMILES as ConnectivitySMILES
+            properties.get('CanonicalSMILES') or properties.get('ConnectivitySMILES')
+        )
+
+    @classmethod
+    def from_dict(cls, compound_info):
+        """Build a record from the dictionary produced by to_dict (or by compound_to_info)."""
+        return cls(
+            compound_info['CID'],
+            compound_info.get('Molecular_Formula'),
+            compound_info.get('Molecular_Weight'),
+            compound_info.get('InChIKey'),
+            compound_info.get('Canonical_SMILES')
+        )
+
+    def to_dict(self):
+        """Return the record using the same keys as compound_to_info, without InChI and synonyms."""
+        return {
+            'CID': self.cid,
+            'Molecular_Formula': self.molecular_formula,
+            'Molecular_Weight': self.molecular_weight,
+            'InChIKey': self.inchikey,
+            'Canonical_SMILES': self.canonical_smiles
+        }
+
+    @property
+    def synonyms(self):
+        if self._synonyms is None:
+            self._synonyms = get_synonyms(self.cid)
+        return self._synonyms
+
+    def __repr__(self):
+        return f"CompoundRecord(cid={self.cid}, formula={self.molecular_formula!r})"
+
+    def __eq__(self, other):
+        return isinstance(other, CompoundRecord) and self.to_dict() == other.to_dict()
+
+# Offline snapshot consulted before the cache and the network; see use_compound_snapshot
+_snapshot = None
+
+def use_compound_snapshot(path):
+    """
+    Serve lookups from an offline compound snapshot (built with utils/compound_snapshot.py),
+    falling back to the cache and the network only for compounds it does not contain.
+    The previous snapshot is not closed here, since other threads may still be reading it;
+    its file and mapping are released once the last of them drops its reference.
+    Parameters:
+        path (str): The snapshot file, or None to stop using a snapshot.
+    """
+    global _snapshot
+    _snapshot = CompoundSnapshot(path) if path else None
+
+def get_snapshot_compound(name):
+    """
+    Look a compound up by name in the offline snapshot only.
+    Returns:
+        dict: The snapshot's compound_info, or None if no snapshot is in use or it lacks the name.
+    """
+    snapshot = _snapshot
+    return snapshot.get_by_name(name) if snapshot is not None else None
+
+def get_snapshot_compound_by_cid(cid):
+    """
+    Look a compound up by CID in the offline snapshot only.
+    Returns:
+        dict: The snapshot's compound_info, or None if no snapshot is in use or it lacks the CID.
+    """
+    snapshot = _snapshot
+    return snapshot.get_by_cid(cid) if snapshot is not None else None
+
+def _pug_rest(identifier, namespace, operation=None):
+    """
+    POST a PUG REST compound request through the shared HTTP client and rate limiter.
+    Parameters:
+        identifier (str, int or list): The identifier(s); lists are sent comma-separated.
+        namespace (str): The input namespace, e.g. 'name' or 'cid'.
+        operation (str): The operation path, e.g. 'synonyms' or 'property/MolecularFormula'.
+    Returns:
+        dict: The parsed JSON response, or None if PubChem answered 404.
+    """
+    if not isinstance(identifier, (str, int)):
+        identifier = ','.join(str(item) for item in identifier)
+    url = '/'.join(filter(None, [PUBCHEM_REST_URL, 'compound', namespace, operation, 'JSON']))
+    try:
+        response = get_http_client().post(url, data={namespace: identifier}, limiter=pubchem_limiter)
+    except requests.exceptions.RequestException as e:
+        raise pcp.PubChemPyError(f"Request to {url} failed: {e}") from e
+    if response.status_code == 404:
+        return None
+    if response.status_code != 200:
+        raise pcp.PubChemPyError(f"PubChem returned status {response.status_code} for {url}")
+    return response.json()
+
+def _get_compounds(identifier, namespace):
+    results = _pug_rest(identifier, namespace)
+    return [pcp.Compound(record) for record in results['PC_Compounds']] if results else []
+
+def _get_properties(properties, identifier, namespace):
+    results = _pug_rest(identifier, namespace, 'property/' + ','.join(properties))
+    return results['PropertyTable']['Properties'] if results else []
+
+def _get_cids(name):
+    results = _pug_rest(name, 'name', 'cids')
+    return results['IdentifierList']['CID'] if results else []
+
+def _get_synonym_lists(cids):
+    """Return {cid: [synonyms]} for one or more CIDs with a single request."""
+    results = _pug_rest(cids, 'cid', 'synonyms')
+    return {
+        information['CID']: information.get('Synonym', [])
+        for information in (results or {}).get('InformationList', {}).get('Information', [])
+    }
+
+def compound_to_info(compound, synonyms=None):
+    """
+    Convert a pubchempy Compound into the compound information dictionary.
+    Parameters:
+        compound (pcp.Compound): The compound returned by PubChemPy.
+        synonyms (list): Synonyms fetched in bulk; if None they are requested for this compound.
+    Returns:
+        dict: A dictionary containing compound information.
+    """
+    return {
+        'CID': compound.cid,
+        'Name': compound.iupac_name,
+        'Molecular_Formula': compound.molecular_formula,
+        'Molecular_Weight': compound.molecular_weight,
+        'InChI': compound.inchi,
+        'InChIKey': compound.inchikey,
+        'Canonical_SMILES': compound.canonical_smiles,
+        'Synonyms': synonyms if synonyms is not None else get_synonyms(compound.cid)
+    }
 
 def get_compound_by_name(name):
     """
     Retrieve compound information by name from PubChem.
+    Answers (including "not found") are kept in the shared compound cache.
     Parameters:
         name (str): The name of the compound to search for.
     Returns:
         dict: A dictionary containing compound information.
     """
+    compound_info = get_snapshot_compound(name)
+    if compound_info is not None:
+        return compound_info
+    cache = get_compound_cache()
+    cached = cache.get('name', name)
+    if cached is not MISS:
+        return cached
     try:
-        compounds = pcp.get_compounds(name, namespace='name')
+        compounds = _get_compounds(name, 'name')
         if compounds:
-            compound = compounds[0]
-            compound_info = {
-                'CID': compound.cid,
-                'Name': compound.iupac_name,
-                'Molecular_Formula': compound.molecular_formula,
-                'Molecular_Weight': compound.molecular_weight,
-                'InChI': compound.inchi,
-                'InChIKey': compound.inchikey,
-                'Canonical_SMILES': compound.canonical_smiles,
-                'Synonyms': compound.synonyms
-            }
+            compound_info = compound_to_info(compounds[0])
+            cache.put('name', name, compound_info)
+            cache.put('cid', compound_info['CID'], compound_info)
             return compound_info
         else:
             print(f"No compound found for name '{name}'")
+            cache.put('name', name, None)
             return None
     except pcp.PubChemPyError as e:
         print(f"Error retrieving compound by name: {e}")
@@ -39,23 +220,297 @@ def get_compound_by_cid(cid):
     Returns:
         dict: A dictionary containing compound information.
     """
+    compound_info = get_snapshot_compound_by_cid(cid)
+    if compound_info is not None:
+        return compound_info
+    cache = get_compound_cache()
+    cached = cache.get('cid', cid)
+    if cached is not MISS:
+        return cached
     try:
-        compound = pcp.Compound.from_cid(cid)
-        compound_info = {
-            'CID': compound.cid,
-            'Name': compound.iupac_name,
-            'Molecular_Formula': compound.molecular_formula,
-            'Molecular_Weight': compound.molecular_weight,
-            'InChI': compound.inchi,
-            'InChIKey': compound.inchikey,
-            'Canonical_SMILES': compound.canonical_smiles,
-            'Synonyms': compound.synonyms
-        }
+        compounds = _get_compounds(cid, 'cid')
+        if not compounds:
+            print(f"No compound found for CID '{cid}'")
+            cache.put('cid', cid, None)
+            return None
+        compound_info = compound_to_info(compounds[0])
+        cache.put('cid', cid, compound_info)
         return compound_info
     except pcp.PubChemPyError as e:
         print(f"Error retrieving compound by CID: {e}")
         return None
 
+def _fetch_compound_chunk(cids):
+    """
+    Fetch full records and synonyms for a list of CIDs with one request each.
+    Returns:
+        dict: A mapping of CID to compound information for the CIDs PubChem returned.
+    """
+    compounds = _get_compounds(cids, 'cid')
+    if not compounds:
+        return {}
+    synonyms = _get_synonym_lists([compound.cid for compound in compounds])
+    return {
+        compound.cid: compound_to_info(compound, synonyms.get(compound.cid, []))
+        for compound in compounds
+    }
+
+def get_compounds_by_cids(cids):
+    """
+    Retrieve compound information for many CIDs using as few PubChem requests as possible.
+    Cached CIDs are served locally; the rest are fetched in comma-separated list requests
+    of up to PUBCHEM_BATCH_SIZE. Only CIDs missing from a batch response (or from a batch
+    that failed) fall back to get_compound_by_cid.
+    Parameters:
+        cids (iterable): The CIDs to look up.
+    Returns:
+        dict: A mapping of each CID to its compound information (None if not found), in input order.
+    """
+    cids = list(dict.fromkeys(int(cid) for cid in cids))
+    cache = get_compound_cache()
+    snapshot = _snapshot  # one snapshot for the whole batch, even if it is swapped meanwhile
+    results = {}
+    missing = []
+    for cid in cids:
+        if snapshot is not None:
+            compound_info = snapshot.get_by_cid(cid)
+            if compound_info is not None:
+                results[cid] = compound_info
+                continue
+        cached = cache.get('cid', cid)
+        if cached is MISS:
+            missing.append(cid)
+        else:
+            results[cid] = cached
+    for start in range(0, len(missing), PUBCHEM_BATCH_SIZE):
+        chunk = missing[start:start + PUBCHEM_BATCH_SIZE]
+        try:
+            fetched = _fetch_compound_chunk(chunk)
+        except pcp.PubChemPyError as e:
+            print(f"Error retrieving compounds by CID list, retrying individually: {e}")
+            fetched = {}
+        for cid, compound_info in fetched.items():
+            cache.put('cid', cid, compound_info)
+        results.update(fetched)
+        for cid in chunk:
+            if cid not in results:
+                results[cid] = get_compound_by_cid(cid)
+    return {cid: results.get(cid) for cid in cids}
+
+def get_compounds_by_names(names):
+    """
+    Retrieve compound information for many names using as few PubChem requests as possible.
+    PUG REST cannot take a list of names in one request, so each uncached name is resolved
+    to its CID with the lightweight 'cids' operation; the full records are then fetched for
+    all new CIDs together through get_compounds_by_cids. Names sharing a CID (e.g. 'Aqua'
+    and 'Water') cost a single record fetch. Names that cannot be resolved this way fall
+    back to get_compound_by_name.
+    Parameters:
+        names (iterable): The compound names to look up.
+    Returns:
+        dict: A mapping of each name to its compound information (None if not found), in input order.
+    """
+    names = list(dict.fromkeys(names))
+    cache = get_compound_cache()
+    snapshot = _snapshot  # one snapshot for the whole batch, even if it is swapped meanwhile
+    results = {}
+    name_cids = {}
+    for name in names:
+        if snapshot is not None:
+            compound_info = snapshot.get_by_name(name)
+            if compound_info is not None:
+                results[name] = compound_info
+                continue
+        cached = cache.get('name', name)
+        if cached is not MISS:
+            results[name] = cached
+            continue
+        try:
+            cids = _get_cids(name)
+        except pcp.PubChemPyError as e:
+            print(f"Error resolving CID for name '{name}', retrying individually: {e}")
+            results[name] = get_compound_by_name(name)
+            continue
+        if cids:
+            name_cids[name] = cids[0]
+        else:
+            print(f"No compound found for name '{name}'")
+            cache.put('name', name, None)
+            results[name] = None
+    compounds = get_compounds_by_cids(name_cids.values())
+    for name, cid in name_cids.items():
+        compound_info = compounds.get(cid)
+        if compound_info is None:
+            compound_info = get_compound_by_name(name)
+        else:
+            cache.put('name', name, compound_info)
+        results[name] = compound_info
+    return {name: results.get(name) for name in names}
+
+def get_synonyms(cid):
+    """
+    Retrieve the synonym list of a compound, through the shared compound cache.
+    Parameters:
+        cid (int): The CID of the compound.
+    Returns:
+        list: The synonyms (empty if none are known).
+    """
+    cache = get_compound_cache()
+    cached = cache.get('synonyms', cid)
+    if cached is not MISS:
+        return cached or []
+    try:
+        synonyms = _get_synonym_lists(cid).get(int(cid), [])
+    except pcp.PubChemPyError as e:
+        print(f"Error retrieving synonyms for CID {cid}: {e}")
+        return []
+    cache.put('synonyms', cid, synonyms)
+    return synonyms
+
+def get_compound_record_by_name(name):
+    """
+    Retrieve a slim CompoundRecord by name, requesting only SLIM_PROPERTIES from PubChem.
+    Parameters:
+        name (str): The name of the compound to search for.
+    Returns:
+        CompoundRecord: The compound record, or None if not found.
+    """
+    compound_info = get_snapshot_compound(name)
+    if compound_info is not None:
+        return CompoundRecord.from_dict(compound_info)
+    cache = get_compound_cache()
+    cached = cache.get('props', name)
+    if cached is not MISS:
+        return CompoundRecord.from_dict(cached) if cached is not None else None
+    try:
+        properties = _get_properties(SLIM_PROPERTIES, name, 'name')
+    except pcp.PubChemPyError as e:
+        print(f"Error retrieving compound properties by name: {e}")
+        return None
+    if not properties:
+        print(f"No compound found for name '{name}'")
+        cache.put('props', name, None)
+        return None
+    record = CompoundRecord.from_properties(properties[0])
+    cache.put('props', name, record.to_dict())
+    return record
+
+def get_compound_records_by_cids(cids):
+    """
+    Retrieve slim CompoundRecords for many CIDs with batched property-table requests.
+    Parameters:
+        cids (iterable): The CIDs to look up.
+    Returns:
+        dict: A mapping of each CID to its CompoundRecord (None if not found), in input order.
+    """
+    cids = list(dict.fromkeys(int(cid) for cid in cids))
+    cache = get_compound_cache()
+    records = {}
+    missing = []
+    for cid in cids:
+        cached = cache.get('props_cid', cid)
+        if cached is MISS:
+            missing.append(cid)
+        elif cached is not None:
+            records[cid] = CompoundRecord.from_dict(cached)
+    for start in range(0, len(missing), PUBCHEM_BATCH_SIZE):
+        chunk = missing[start:start + PUBCHEM_BATCH_SIZE]
+        try:
+            properties = _get_properties(SLIM_PROPERTIES, chunk, 'cid')
+        except pcp.PubChemPyError as e:
+            print(f"Error retrieving compound properties by CID list: {e}")
+            continue
+        for row in properties:
+            record = CompoundRecord.from_properties(row)
+            cache.put('props_cid', record.cid, record.to_dict())
+            records[record.cid] = record
+        for cid in chunk:
+            if cid not in records:
+                cache.put('props_cid', cid, None)
+    return {cid: records.get(cid) for cid in cids}
+
+def _ghs_information(section):
+    """Yield the Information entries below every 'GHS Classification' heading of a PUG-View record."""
+    for child in section.get('Section', []):
+        if child.get('TOCHeading') == 'GHS Classification':
+            yield from child.get('Information', [])
+        else:
+            yield from _ghs_information(child)
+
+def parse_ghs_classification(record):
+    """
+    Extract GHS signal word, hazard codes and pictograms from a PUG-View record.
+    Parameters:
+        record (dict): The 'Record' object of a PUG-View response.
+    Returns:
+        dict: 'Signal', 'Hazard_Codes' and 'Pictograms', plus the derived 'Toxicity' and 'Safety'.
+    """
+    signal = None
+    hazard_codes = set()
+    pictograms = set()
+    classified = False
+    for information in _ghs_information(record):
+        classified = True
+        value = information.get('Value', {})
+        for item in value.get('StringWithMarkup', []):
+            text = item.get('String', '')
+            if information.get('Name') == 'Signal' and signal is None:
+                signal = text.strip() or None
+            elif information.get('Name') == 'GHS Hazard Statements':
+                hazard_codes.update(_HAZARD_CODE.findall(text))
+            for markup in item.get('Markup', []):
+                if markup.get('Type') == 'Icon' and markup.get('Extra'):
+                    pictograms.add(markup['Extra'])
+    if not classified:
+        toxicity = 'Unknown'
+    elif hazard_codes & SEVERE_HAZARD_CODES:
+        toxicity = 'Very High'
+    elif signal == 'Danger':
+        toxicity = 'High'
+    elif signal == 'Warning':
+        toxicity = 'Medium'
+    else:
+        toxicity = 'Low'
+    return {
+        'Signal': signal,
+        'Hazard_Codes': sorted(hazard_codes),
+        'Pictograms': sorted(pictograms),
+        'Toxicity': toxicity,
+        'Safety': signal or ('Not Classified' if classified else 'Unknown')
+    }
+
+def get_ghs_classification(cid):
+    """
+    Retrieve the GHS classification of a compound with a single PUG-View request.
+    Parameters:
+        cid (int): The CID of the compound.
+    Returns:
+        dict: The parsed classification (see parse_ghs_classification), or None on a request error.
+    """
+    cache = get_compound_cache()
+    cached = cache.get('ghs', cid)
+    if cached is not MISS:
+        return cached if cached is not None else parse_ghs_classification({})
+    try:
+        response = get_http_client().get(
+            f"{PUG_VIEW_URL}/data/compound/{int(cid)}/JSON",
+            params={'heading': 'GHS Classification'},
+            limiter=pubchem_limiter
+        )
+    except requests.exceptions.RequestException as e:
+        print(f"Error retrieving GHS classification for CID {cid}: {e}")
+        return None
+    if response.status_code == 404:
+        # PUG-View answers 404 when the compound has no GHS section
+        cache.put('ghs', cid, None)
+        return parse_ghs_classification({})
+    if response.status_code != 200:
+        print(f"Unexpected status code {response.status_code} retrieving GHS classification for CID {cid}")
+        return None
+    classification = parse_ghs_classification(response.json().get('Record', {}))
+    cache.put('ghs', cid, classification)
+    return classification
+
 def get_safety_and_toxicity_info(cid):
     """
     Retrieve safety and toxicity information for a compound from PubChem.
@@ -64,21 +519,28 @@ def get_safety_and_toxicity_info(cid):
     Returns:
         dict: A dictionary containing safety and toxicity information.
     """
-    try:
-        # Retrieve compound information (for reference)
-        compound = pcp.Compound.from_cid(cid)
-        
-        # Example placeholders for safety and toxicity information
-        # Note: Actual retrieval may require different API calls or additional data sources
-        safety_info = {
-            'CID': compound.cid,
-            'Toxicity': "Not directly available in PubChemPy API",
-            'Safety': "Not directly available in PubChemPy API"
-        }
-        return safety_info
-    except pcp.PubChemPyError as e:
-        print(f"Error retrieving safety and toxicity info: {e}")
+    classification = get_ghs_classification(cid)
+    if classification is None:
+        return None
+    return dict(classification, CID=cid)
+
+def get_compound_safety(name):
+    """
+    Resolve a compound's identity and safety data together.
+    Identity comes from the slim property lookup and the hazard data from one PUG-View
+    request per CID; both are cached, so an ingredient seen before costs no requests.
+    Parameters:
+        name (str): The ingredient or compound name.
+    Returns:
+        dict: The slim compound fields merged with the GHS classification, or None if not found.
+    """
+    record = get_compound_record_by_name(name)
+    if record is None:
+        return None
+    classification = get_ghs_classification(record.cid)
+    if classification is None:
         return None
+    return dict(record.to_dict(), **classification)
 
 def save_compound_info_to_json(compound_info, filename):
     """
@@ -0,0 +1,61 @@
+import threading
+import time
+
+# PubChem PUG REST allows at most 5 requests per second per client
+PUBCHEM_RATE_LIMIT = {
+    'rate': 5.0,  # tokens added per second
+    'capacity': 5  # burst size
+}
+
+class TokenBucket:
+    """
+    Thread-safe token-bucket rate limiter.
+    Tokens refill continuously at `rate` per second up to `capacity`; each request takes one.
+    """
+    def __init__(self, rate, capacity):
+        self.rate = float(rate)
+        self.capacity = float(capacity)
+        self._tokens = float(capacity)
+        self._updated = time.monotonic()
+        self._lock = threading.Lock()
+
+    def _refill(self, now):
+        self._tokens = min(self.capacity, self._tokens + (now - self._updated) * self.rate)
+        self._updated = now
+
+    def try_acquire(self, tokens=1):
+        """Take tokens if available right now. Returns True on success."""
+        with self._lock:
+            self._refill(time.monotonic())
+            if self._tokens >= tokens:
+                self._tokens -= tokens
+                return True
+            return False
+
+    def acquire(self, tokens=1, timeout=None):
+        """
+        Block until tokens are available.
+        Parameters:
+            tokens (int): Number of tokens to take.
+            timeout (float): Maximum seconds to wait, or None to wait indefinitely.
+        Returns:
+            bool: True if the tokens were taken, False if the timeout expired first.
+        """
+        deadline = None if timeout is None else time.monotonic() + timeout
+        while True:
+            with self._lock:
+                now = time.monotonic()
+                self._refill(now)
+                if self._tokens >= tokens:
+                    self._tokens -= tokens
+                    return True
+                wait = (tokens - self._tokens) / self.rate
+            if deadline is not None:
+                remaining = deadline - now
+                if remaining <= 0:
+                    return False
+                wait = min(wait, remaining)
+            time.sleep(wait)
+
+# Shared by every caller that talks to PubChem
+pubchem_limiter = TokenBucket(PUBCHEM_RATE_LIMIT['rate'], PUBCHEM_RATE_LIMIT['capacity'])
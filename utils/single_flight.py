@@ -0,0 +1,84 @@
+import asyncio
+import functools
+import threading
+import weakref
+
+class _Call:
+    __slots__ = ('event', 'result', 'error')
+
+    def __init__(self):
+        self.event = threading.Event()
+        self.result = None
+        self.error = None
+
+class SingleFlight:
+    """
+    Deduplicate concurrent calls by key: while a call for a key is in flight, other callers
+    wait for it and share its result (or exception) instead of starting their own.
+    Threaded callers use do(); asyncio callers use do_async(), which runs the call on the
+    loop's default executor and joins the same in-flight calls as threaded callers.
+    """
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._calls = {}
+        self._async_calls = weakref.WeakKeyDictionary()
+        self.calls = 0
+        self.upstream_calls = 0
+
+    def do(self, key, fn, *args, **kwargs):
+        """Call fn(*args, **kwargs) unless a call for key is already running, then share its outcome."""
+        with self._lock:
+            self.calls += 1
+            call = self._calls.get(key)
+            leader = call is None
+            if leader:
+                call = _Call()
+                self._calls[key] = call
+                self.upstream_calls += 1
+        if leader:
+            try:
+                call.result = fn(*args, **kwargs)
+            except BaseException as e:
+                call.error = e
+            finally:
+                with self._lock:
+                    del self._calls[key]
+                call.event.set()
+        else:
+            call.event.wait()
+        if call.error is not None:
+            raise call.error
+        return call.result
+
+    async def do_async(self, key, fn, *args, **kwargs):
+        """Awaitable variant of do(); fn is a blocking callable run in the default executor."""
+        loop = asyncio.get_running_loop()
+        with self._lock:
+            pending = self._async_calls.setdefault(loop, {})
+            future = pending.get(key)
+            if future is None:
+                future = loop.run_in_executor(None, functools.partial(self.do, key, fn, *args, **kwargs))
+                pending[key] = future
+                future.add_done_callback(functools.partial(self._forget_async, pending, key))
+            else:
+                self.calls += 1
+        return await asyncio.shield(future)
+
+    def _forget_async(self, pending, key, future):
+        with self._lock:
+            if pending.get(key) is future:
+                del pending[key]
+
+    def stats(self):
+        """
+        Report how many upstream calls were saved.
+        Returns:
+            dict: calls, upstream_calls, saved and in_flight.
+        """
+        with self._lock:
+            return {
+                'calls': self.calls,
+                'upstream_calls': self.upstream_calls,
+                'saved': self.calls - self.upstream_calls,
+                'in_flight': len(self._calls)
+            }